@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+API Server
+Headless HTTP/JSON API over the Database layer for web shops and handheld
+scanners.
+
+    python api_server.py --port 8080 --pool-size 8
+
+Endpoints:
+    GET  /products?search=&category=&page=&per_page=
+    GET  /products/<id>
+    GET  /categories
+    GET  /locations
+    GET  /transactions?product_id=&location_id=&limit=
+    POST /transactions      {"product_id", "type", "quantity", "notes", "user", "location_id"}
+    GET  /low-stock?location_id=
+    GET  /stats
+    POST /batch             {"requests": [{"method": "GET", "path": "/products/1"}, ...]}
+
+Catalogue reads (products, categories) carry an ETag and honour If-None-Match.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import sys
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from urllib.parse import parse_qs, urlsplit
+
+from async_database import AsyncDatabase
+from config import DEFAULTS
+from database import DatabaseUnavailableError, InsufficientStockError
+from settings import Settings, SettingsError, load_settings
+
+
+logger = logging.getLogger("inventory.api")
+
+MAX_PER_PAGE = 500
+MAX_BATCH = 50
+MAX_BODY = 1024 * 1024
+STATUS_TEXT = {
+    200: "OK", 201: "Created", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class ApiError(Exception):
+    """An error that maps directly to an HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def to_json(value):
+    """JSON encoder fallback for values coming back from MySQL"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", "replace")
+    return str(value)
+
+
+# ==================== API ====================
+
+class InventoryApi:
+    """Routes requests to Database operations"""
+
+    def __init__(self, pool, version_ttl=1.0, cache_size=256, page_size=DEFAULTS["items_per_page"]):
+        self.pool = pool
+        self.page_size = page_size
+        self.version_ttl = version_ttl
+        self.cache_size = cache_size
+        self._version = None
+        self._version_at = 0.0
+        self._version_lock = asyncio.Lock()
+        self._cache = OrderedDict()
+        self.routes = [
+            ("GET", ("products",), self.list_products, True),
+            ("GET", ("products", None), self.get_product, True),
+            ("GET", ("categories",), self.list_categories, True),
+            ("GET", ("locations",), self.list_locations, False),
+            ("GET", ("transactions",), self.list_transactions, False),
+            ("POST", ("transactions",), self.create_transaction, False),
+            ("GET", ("low-stock",), self.low_stock, False),
+            ("GET", ("stats",), self.stats, False),
+            ("POST", ("batch",), self.batch, False),
+        ]
+
+    async def catalogue_version(self):
+        """Catalogue fingerprint, refreshed at most once per TTL"""
+        async with self._version_lock:
+            if self._version is None or time.monotonic() - self._version_at > self.version_ttl:
+                self._version = await self.pool.read("get_catalogue_version")
+                self._version_at = time.monotonic()
+            return self._version
+
+    def match(self, method, path):
+        parts = tuple(p for p in path.strip("/").split("/") if p)
+        allowed = False
+        for route_method, pattern, handler, cacheable in self.routes:
+            if len(pattern) != len(parts):
+                continue
+            args = []
+            for expected, actual in zip(pattern, parts):
+                if expected is None:
+                    args.append(actual)
+                elif expected != actual:
+                    break
+            else:
+                if route_method == method:
+                    return handler, args, cacheable
+                allowed = True
+        raise ApiError(405 if allowed else 404, "Method not allowed" if allowed else "Not found")
+
+    async def dispatch(self, method, target, headers, body):
+        """Handle one request and return (status, extra headers, payload bytes)"""
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            handler, args, cacheable = self.match(method, url.path)
+            if not cacheable:
+                return await self._respond(handler, args, query, body)
+
+            # Conditional GET: the ETag only depends on the catalogue version and URL
+            version = await self.catalogue_version()
+            etag = '"' + hashlib.sha1(f"{version}|{target}".encode()).hexdigest() + '"'
+            if headers.get("if-none-match") == etag:
+                return 304, {"ETag": etag}, b""
+            cached = self._cache.get(etag)
+            if cached is None:
+                status, extra, cached = await self._respond(handler, args, query, body)
+                if status != 200:
+                    return status, extra, cached
+                self._cache[etag] = cached
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            else:
+                self._cache.move_to_end(etag)
+            return 200, {"ETag": etag, "Cache-Control": "no-cache"}, cached
+        except ApiError as e:
+            return e.status, {}, self.encode({"error": e.message})
+        except DatabaseUnavailableError:
+            # Never cached: the read is retried against the database on the next request
+            return 503, {"Retry-After": "1"}, self.encode({"error": "Database unavailable"})
+        except Exception:
+            logger.exception("Unhandled error for %s %s", method, target)
+            return 500, {}, self.encode({"error": "Internal server error"})
+
+    async def _respond(self, handler, args, query, body):
+        status, payload = await handler(*args, query=query, body=body)
+        return status, {}, self.encode(payload)
+
+    @staticmethod
+    def encode(payload):
+        return json.dumps(payload, default=to_json, separators=(",", ":")).encode("utf-8")
+
+    # ---------- helpers ----------
+
+    @staticmethod
+    def int_param(query, name, default=None, minimum=None, maximum=None):
+        value = query.get(name)
+        if value in (None, ""):
+            return default
+        try:
+            number = int(value)
+        except ValueError:
+            raise ApiError(400, f"'{name}' must be an integer")
+        if minimum is not None and number < minimum:
+            raise ApiError(400, f"'{name}' must be at least {minimum}")
+        if maximum is not None:
+            number = min(number, maximum)
+        return number
+
+    @staticmethod
+    def json_body(body):
+        try:
+            return json.loads(body or b"{}")
+        except ValueError:
+            raise ApiError(400, "Request body must be valid JSON")
+
+    # ---------- handlers ----------
+
+    async def list_products(self, query, body):
+        page = self.int_param(query, "page", 1, minimum=1)
+        per_page = self.int_param(query, "per_page", self.page_size, minimum=1, maximum=MAX_PER_PAGE)
+        rows = await self.pool.read(
+            "get_all_products",
+            search_term=query.get("search") or None,
+            category=self.int_param(query, "category"),
+            limit=per_page + 1,
+            offset=(page - 1) * per_page,
+        )
+        return 200, {
+            "items": rows[:per_page],
+            "page": page,
+            "per_page": per_page,
+            "has_more": len(rows) > per_page,
+        }
+
+    async def get_product(self, product_id, query, body):
+        try:
+            product_id = int(product_id)
+        except ValueError:
+            raise ApiError(404, "Not found")
+        product = await self.pool.read("get_product_by_id", product_id)
+        if not product:
+            raise ApiError(404, "Product not found")
+        return 200, product
+
+    async def list_categories(self, query, body):
+        return 200, {"items": await self.pool.read("get_all_categories")}
+
+    async def list_locations(self, query, body):
+        return 200, {"items": await self.pool.read("get_all_locations")}
+
+    async def list_transactions(self, query, body):
+        rows = await self.pool.read(
+            "get_transactions",
+            product_id=self.int_param(query, "product_id"),
+            limit=self.int_param(query, "limit", 100, minimum=1, maximum=1000),
+            location_id=self.int_param(query, "location_id"),
+        )
+        return 200, {"items": rows}
+
+    async def create_transaction(self, query, body):
+        data = self.json_body(body)
+        movement = str(data.get("type", "")).upper()
+        if movement not in ("IN", "OUT"):
+            raise ApiError(400, "'type' must be IN or OUT")
+        try:
+            product_id = int(data["product_id"])
+            quantity = int(data["quantity"])
+        except (KeyError, TypeError, ValueError):
+            raise ApiError(400, "'product_id' and 'quantity' are required integers")
+        if quantity <= 0:
+            raise ApiError(400, "'quantity' must be positive")
+        location_id = data.get("location_id")
+        if location_id is not None:
+            try:
+                location_id = int(location_id)
+            except (TypeError, ValueError):
+                raise ApiError(400, "'location_id' must be an integer")
+            locations = await self.pool.read("get_all_locations")
+            if not any(location['id'] == location_id for location in locations):
+                raise ApiError(400, f"Location {location_id} does not exist")
+        if not await self.pool.read("get_product_by_id", product_id):
+            raise ApiError(400, f"Product {product_id} does not exist")
+        try:
+            transaction_id = await self.pool.call(
+                "add_transaction", product_id, movement, quantity,
+                data.get("notes", ""), data.get("user", "API"), location_id
+            )
+        except InsufficientStockError as e:
+            raise ApiError(409, str(e))
+        if not transaction_id:
+            raise ApiError(503, "Could not record the transaction")
+        return 201, {"id": transaction_id}
+
+    async def low_stock(self, query, body):
+        rows = await self.pool.read("get_low_stock_products", self.int_param(query, "location_id"))
+        return 200, {"items": rows}
+
+    async def stats(self, query, body):
+        stats = await self.pool.get_dashboard_stats()
+        if not stats:
+            raise ApiError(503, "Could not fetch stats")
+        return 200, stats
+
+    async def batch(self, query, body):
+        """Run several sub-requests concurrently and return all responses together"""
+        requests = self.json_body(body).get("requests")
+        if not isinstance(requests, list) or not requests:
+            raise ApiError(400, "'requests' must be a non-empty list")
+        if len(requests) > MAX_BATCH:
+            raise ApiError(413, f"At most {MAX_BATCH} requests per batch")
+
+        async def run(item):
+            method = str(item.get("method", "GET")).upper()
+            path = str(item.get("path", ""))
+            if path.strip("/").startswith("batch"):
+                return {"status": 400, "body": {"error": "Nested batches are not allowed"}}
+            sub_body = json.dumps(item["body"]).encode() if "body" in item else b""
+            status, extra, payload = await self.dispatch(method, path, {}, sub_body)
+            return {"status": status, "headers": extra, "body": json.loads(payload) if payload else None}
+
+        return 200, {"responses": await asyncio.gather(*(run(item) for item in requests))}
+
+
+# ==================== HTTP ====================
+
+async def read_request(reader):
+    """Read one HTTP/1.1 request; returns None when the client closed the connection"""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, target, version = request_line.decode("latin-1").split()
+    except ValueError:
+        raise ApiError(400, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise ApiError(400, "Invalid Content-Length")
+    if length < 0:
+        raise ApiError(400, "Invalid Content-Length")
+    if length > MAX_BODY:
+        raise ApiError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, version, headers, body
+
+
+def build_response(status, headers, payload, keep_alive):
+    lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, 'OK')}"]
+    headers = dict(headers)
+    if status != 304:
+        headers.setdefault("Content-Type", "application/json")
+    headers["Content-Length"] = str(len(payload))
+    headers["Connection"] = "keep-alive" if keep_alive else "close"
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + payload
+
+
+async def handle_client(api, reader, writer):
+    """Serve requests on one connection until the client closes it"""
+    try:
+        while True:
+            try:
+                request = await read_request(reader)
+            except ApiError as e:
+                writer.write(build_response(e.status, {}, api.encode({"error": e.message}), False))
+                break
+            if request is None:
+                break
+            method, target, version, headers, body = request
+            keep_alive = headers.get("connection", "").lower() != "close" and version != "HTTP/1.0"
+            status, extra, payload = await api.dispatch(method, target, headers, body)
+            writer.write(build_response(status, extra, payload, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host, port, pool_size, db_config, settings=None):
+    settings = settings or Settings()
+    pool = AsyncDatabase(pool_size, **db_config)
+    if not await pool.open():
+        logger.error("Could not connect to the database")
+        return
+    tuning = settings.tuning
+    api = InventoryApi(pool, tuning.catalogue_ttl_s, tuning.response_cache_size, tuning.page_size)
+    server = await asyncio.start_server(lambda r, w: handle_client(api, r, w), host, port, backlog=512)
+    logger.info("Serving inventory API on http://%s:%s with %d connections", host, port, pool_size)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await pool.close()
+
+
+def main(argv=None):
+    try:
+        settings = load_settings()
+    except SettingsError as e:
+        print(e)
+        return 2
+    database = settings.database
+
+    parser = argparse.ArgumentParser(description="HTTP/JSON API for the inventory database")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--pool-size", type=int, default=database.pool_size, help="database connections")
+    parser.add_argument("--db-host", default=database.host)
+    parser.add_argument("--db-user", default=database.user)
+    parser.add_argument("--db-password", default=database.password)
+    parser.add_argument("--db-name", default=database.database)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    db_config = {
+        "host": args.db_host, "user": args.db_user, "password": args.db_password, "database": args.db_name,
+        "allow_negative_stock": settings.app.allow_negative_stock,
+        "max_retries": database.max_retries,
+        "retry_backoff": database.retry_backoff,
+        "chunk_size": settings.tuning.fetch_chunk_size,
+        "statement_cache_size": database.statement_cache_size,
+    }
+    try:
+        asyncio.run(serve(args.host, args.port, args.pool_size, db_config, settings))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Ledger Archive
+Moves closed months of the transactions ledger into the compressed,
+month-partitioned transactions_archive table and rolls them up into
+transaction_summaries. Safe to run from cron while the tills are in use.
+
+Example:
+    python archive_ledger.py --keep-months 12
+"""
+
+import argparse
+import sys
+import time
+
+from database import Database
+from settings import SettingsError, load_settings
+
+
+def main(argv=None):
+    try:
+        settings = load_settings()
+    except SettingsError as e:
+        print(e)
+        return 2
+    database = settings.database
+
+    parser = argparse.ArgumentParser(description="Archive old inventory ledger rows")
+    parser.add_argument("--keep-months", type=int, default=12, help="whole months to keep in the hot ledger")
+    parser.add_argument("--chunk-size", type=int, default=settings.tuning.archive_chunk_size, help="rows moved per transaction")
+    parser.add_argument("--host", default=database.host)
+    parser.add_argument("--user", default=database.user)
+    parser.add_argument("--password", default=database.password)
+    parser.add_argument("--database", default=database.database)
+    args = parser.parse_args(argv)
+
+    database.host, database.user, database.password, database.database = args.host, args.user, args.password, args.database
+    db = Database.from_settings(settings)
+    if not db.connect():
+        print("Could not connect to the database")
+        return 2
+
+    started = time.time()
+    moved = db.archive_transactions(args.keep_months, args.chunk_size)
+    db.disconnect()
+    if moved is None:
+        print("Archiving failed; see the log for details")
+        return 1
+    print(f"Archived {moved} ledger rows in {time.time() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""
+Async Database Module
+asyncio access to the Database operations for services and other non-GUI
+consumers.
+
+The MySQL operations live in the blocking Database class, so AsyncDatabase
+bridges them onto a bounded pool of connections, each used by one worker
+thread at a time. Independent queries (the dashboard figures, preloading
+several views) are fanned out across the pool and awaited together.
+
+    adb = AsyncDatabase(size=8, **DB_CONFIG)
+    await adb.open()
+    stats = await adb.get_dashboard_stats()
+    products, categories = await adb.gather(("get_all_products",), ("get_all_categories",))
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from database import Database, DatabaseUnavailableError
+
+
+logger = logging.getLogger("inventory.db")
+
+# Connections idle for longer than this are pinged before use; the server may have closed them
+PING_AFTER_S = 30.0
+
+
+# Database methods exposed as coroutines with the same signature
+BRIDGED_METHODS = (
+    "get_all_products", "get_product_by_id", "add_product", "update_product", "delete_product",
+    "update_stock", "get_low_stock_products", "get_catalogue_version",
+    "get_all_locations", "add_location", "update_location", "delete_location",
+    "get_stock_by_location", "get_location_products", "transfer_stock",
+    "get_all_categories", "add_category", "update_category", "delete_category",
+    "add_transaction", "get_transactions", "get_transaction_summaries", "get_dashboard_stat",
+    "get_inventory_valuation", "preview_bulk_edit", "bulk_edit_products", "undo_bulk_edit", "get_bulk_edits",
+    "get_category_totals", "get_movement_series",
+)
+
+
+def _bridge(name):
+    async def method(self, *args, **kwargs):
+        return await self.call(name, *args, **kwargs)
+    method.__name__ = name
+    method.__doc__ = getattr(Database, name).__doc__
+    return method
+
+
+class AsyncDatabase:
+    """Async facade over a bounded pool of Database connections"""
+
+    def __init__(self, size=4, **db_config):
+        self.size = size
+        self.db_config = db_config
+        self.executor = None
+        self.idle = None
+        self.connections = []
+        self.last_used = {}
+
+    async def open(self):
+        """Open all pooled connections; returns False if any connection fails"""
+        self.executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="db")
+        self.idle = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        databases = [Database(**self.db_config) for _ in range(self.size)]
+        results = await asyncio.gather(*(loop.run_in_executor(self.executor, db.connect) for db in databases))
+        for db, connected in zip(databases, results):
+            if connected:
+                self.connections.append(db)
+                self.idle.put_nowait(db)
+        if len(self.connections) < self.size:
+            await self.close()
+            return False
+        return True
+
+    async def close(self):
+        """Close all connections and stop the worker threads"""
+        for db in self.connections:
+            db.disconnect()
+        self.connections = []
+        self.last_used = {}
+        if self.executor:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    async def __aenter__(self):
+        if not await self.open():
+            raise ConnectionError("Could not connect to the database")
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def call(self, method, *args, **kwargs):
+        """Run a Database method on the next free connection"""
+        return (await self._call(method, args, kwargs))[0]
+
+    async def read(self, method, *args, **kwargs):
+        """Run a read and raise DatabaseUnavailableError if it failed rather than return its empty fallback"""
+        result, failed = await self._call(method, args, kwargs)
+        if failed:
+            raise DatabaseUnavailableError(f"{method} failed")
+        return result
+
+    async def _call(self, method, args, kwargs):
+        db = await self.idle.get()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self._run, db, method, args, kwargs)
+        finally:
+            self.idle.put_nowait(db)
+
+    def _run(self, db, method, args, kwargs):
+        """Returns (result, whether any statement failed during the call)"""
+        if time.monotonic() - self.last_used.get(db, 0.0) > PING_AFTER_S:
+            self._reconnect_if_dropped(db)
+        errors = db.error_count
+        failed = True
+        try:
+            result = getattr(db, method)(*args, **kwargs)
+            failed = db.error_count > errors
+            return result, failed
+        finally:
+            # Reads leave a REPEATABLE READ snapshot open; end it so the next call sees newer commits
+            try:
+                db.connection.rollback()
+            except Exception:
+                # Not raised over the call's own outcome; a dead connection is replaced below
+                logger.warning("Rollback after %s failed", method, exc_info=True)
+                failed = True
+            if failed:
+                self._reconnect_if_dropped(db)
+            self.last_used[db] = time.monotonic()
+
+    @staticmethod
+    def _reconnect_if_dropped(db):
+        """Replace a pooled connection the server or network has closed"""
+        try:
+            if db.connection.is_connected():
+                return
+        except Exception:
+            pass
+        logger.warning("Reconnecting a dropped pooled database connection")
+        try:
+            db.disconnect()
+        except Exception:
+            pass
+        if not db.connect():
+            logger.error("Could not reconnect a pooled database connection")
+
+    async def gather(self, *calls):
+        """Run several (method, *args) calls concurrently and return their results in order"""
+        return await asyncio.gather(*(self.call(name, *args) for name, *args in calls))
+
+    async def get_dashboard_stats(self):
+        """Get dashboard statistics, running each figure's query in parallel"""
+        names = list(Database.DASHBOARD_STAT_QUERIES)
+        values = await self.gather(*(("get_dashboard_stat", name) for name in names))
+        if any(value is None for value in values):
+            return {}
+        return dict(zip(names, values))
+
+    async def preload(self, views=("products", "categories", "low_stock", "transactions", "stats")):
+        """Fetch the data behind several views at once"""
+        loaders = {
+            "products": self.get_all_products(),
+            "categories": self.get_all_categories(),
+            "locations": self.get_all_locations(),
+            "low_stock": self.get_low_stock_products(),
+            "transactions": self.get_transactions(limit=100),
+            "stats": self.get_dashboard_stats(),
+        }
+        selected = [view for view in views if view in loaders]
+        for view in set(loaders) - set(selected):
+            loaders[view].close()
+        results = await asyncio.gather(*(loaders[view] for view in selected))
+        return dict(zip(selected, results))
+
+
+for _name in BRIDGED_METHODS:
+    setattr(AsyncDatabase, _name, _bridge(_name))
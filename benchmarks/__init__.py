@@ -0,0 +1,9 @@
+"""
+Benchmarks Package
+Synthetic data generation and reproducible timing of the Database API and
+InventoryGUI load paths.
+
+    python -m benchmarks.datagen --products 100000 --transactions 5000000
+    python -m benchmarks.run --save-baseline
+    python -m benchmarks.run --compare
+"""
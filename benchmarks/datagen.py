@@ -0,0 +1,190 @@
+"""
+Synthetic Data Generator
+Seeds a benchmark database with a catalogue and ledger of configurable size.
+
+Product popularity follows a Zipf-like distribution, so a few SKUs carry most
+of the movements, as on a real shop floor. Prices are log-normal and stock
+levels are derived from the generated ledger, so on-hand quantities always
+match the transactions table. The same --seed always produces the same data.
+"""
+
+import argparse
+import bisect
+import itertools
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import mysql.connector
+from mysql.connector import Error
+
+from config import DB_CONFIG
+from database import Database
+
+
+BENCH_DATABASE = "inventory_bench"
+WORDS = [
+    "Steel", "Copper", "Plastic", "Wooden", "Glass", "Compact", "Heavy", "Mini",
+    "Bolt", "Screw", "Cable", "Bracket", "Panel", "Valve", "Filter", "Switch",
+    "Adapter", "Sensor", "Hinge", "Clamp", "Pipe", "Washer", "Bearing", "Spring",
+]
+
+
+def create_database(host, user, password, database):
+    """Create the benchmark database if it does not exist"""
+    connection = mysql.connector.connect(host=host, user=user, password=password)
+    cursor = connection.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{database}`")
+    cursor.close()
+    connection.close()
+
+
+def zipf_cumulative(count, exponent):
+    """Cumulative weights for a Zipf distribution over count items"""
+    total = 0.0
+    cumulative = []
+    for rank in range(1, count + 1):
+        total += 1.0 / (rank ** exponent)
+        cumulative.append(total)
+    return cumulative
+
+
+def insert_rows(db, query, rows, batch_size):
+    """Insert rows in batches, one commit per batch"""
+    inserted = 0
+    iterator = iter(rows)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            break
+        db.cursor.executemany(query, batch)
+        db.connection.commit()
+        inserted += len(batch)
+    return inserted
+
+
+def generate(db, products, transactions, categories=50, locations=3, skew=1.1,
+             days=730, seed=42, batch_size=5000, progress=True):
+    """Fill an empty database with synthetic data"""
+    rng = random.Random(seed)
+    started = time.time()
+
+    def report(message):
+        if progress:
+            print(f"[{time.time() - started:7.1f}s] {message}")
+
+    # Categories and locations
+    insert_rows(db, "INSERT INTO categories (name, description) VALUES (%s, %s)",
+                ((f"Category {i:03d}", f"Synthetic category {i}") for i in range(1, categories + 1)), batch_size)
+    db.cursor.execute("SELECT id FROM categories ORDER BY id")
+    category_ids = [row['id'] for row in db.cursor.fetchall()]
+    for i in range(1, locations + 1):
+        db.add_location(f"Warehouse {i}", "Synthetic location")
+    location_ids = [row['id'] for row in db.get_all_locations()]
+    report(f"{len(category_ids)} categories, {len(location_ids)} locations")
+
+    # Products; category sizes are skewed as well
+    category_weights = zipf_cumulative(len(category_ids), 0.8)
+
+    def product_rows():
+        for i in range(1, products + 1):
+            name = f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}"
+            category_id = category_ids[bisect.bisect(category_weights, rng.random() * category_weights[-1])]
+            price = round(min(rng.lognormvariate(2.5, 1.0), 99999), 2)
+            yield (name, f"SKU-{i:08d}", f"Synthetic product {i}", category_id, 0, price, rng.choice([5, 10, 20, 50]))
+
+    insert_rows(db, """
+        INSERT INTO products (name, sku, description, category_id, quantity, price, min_stock_level)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """, product_rows(), batch_size)
+    db.cursor.execute("SELECT id FROM products ORDER BY id")
+    product_ids = [row['id'] for row in db.cursor.fetchall()]
+    report(f"{len(product_ids)} products")
+
+    # Ledger; movement counts follow product popularity
+    popularity = zipf_cumulative(len(product_ids), skew)
+    rng.shuffle(product_ids)
+    on_hand = {}
+    per_location = {}
+    start_time = datetime.now() - timedelta(days=days)
+    step = timedelta(seconds=days * 86400 / max(transactions, 1))
+
+    def ledger_rows():
+        created_at = start_time
+        for _ in range(transactions):
+            product_id = product_ids[bisect.bisect(popularity, rng.random() * popularity[-1])]
+            location_id = rng.choice(location_ids)
+            key = (product_id, location_id)
+            held = per_location.get(key, 0)
+            quantity = max(1, int(rng.expovariate(1 / 8.0)))
+            if held >= quantity and rng.random() < 0.45:
+                movement = "OUT"
+                change = -quantity
+            else:
+                movement = "IN"
+                change = quantity
+            per_location[key] = held + change
+            on_hand[product_id] = on_hand.get(product_id, 0) + change
+            created_at += step
+            yield (product_id, movement, quantity, "synthetic", "bench", location_id, created_at)
+
+    count = insert_rows(db, """
+        INSERT INTO transactions (product_id, transaction_type, quantity, notes, user, location_id, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """, ledger_rows(), batch_size)
+    report(f"{count} ledger rows")
+
+    # Stock levels derived from the ledger
+    insert_rows(db, "UPDATE products SET quantity = %s WHERE id = %s",
+                ((quantity, product_id) for product_id, quantity in on_hand.items()), batch_size)
+    insert_rows(db, "INSERT INTO product_stock (product_id, location_id, quantity) VALUES (%s, %s, %s)",
+                ((p, l, q) for (p, l), q in per_location.items()), batch_size)
+    db.cursor.execute("""
+        UPDATE locations l
+        SET total_units = (SELECT COALESCE(SUM(quantity), 0) FROM product_stock WHERE location_id = l.id),
+            sku_count = (SELECT COUNT(*) FROM product_stock WHERE location_id = l.id AND quantity <> 0)
+    """)
+    db.connection.commit()
+    report("stock levels written")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed a benchmark database with synthetic inventory data")
+    parser.add_argument("--products", type=int, default=1000, help="catalogue size (1k to 1M)")
+    parser.add_argument("--transactions", type=int, default=50000, help="ledger rows (up to 100M)")
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--locations", type=int, default=3)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for SKU popularity")
+    parser.add_argument("--days", type=int, default=730, help="history length for ledger timestamps")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--host", default=DB_CONFIG["host"])
+    parser.add_argument("--user", default=DB_CONFIG["user"])
+    parser.add_argument("--password", default=DB_CONFIG["password"])
+    parser.add_argument("--database", default=BENCH_DATABASE)
+    args = parser.parse_args(argv)
+
+    try:
+        create_database(args.host, args.user, args.password, args.database)
+    except Error as e:
+        print(f"Error creating benchmark database: {e}")
+        return 2
+
+    db = Database(host=args.host, user=args.user, password=args.password, database=args.database)
+    if not db.connect():
+        return 2
+
+    db.cursor.execute("SELECT COUNT(*) AS count FROM products")
+    if db.cursor.fetchone()['count']:
+        print(f"Database '{args.database}' already has products; drop it to reseed")
+        return 2
+
+    generate(db, args.products, args.transactions, args.categories, args.locations,
+             args.skew, args.days, args.seed, args.batch_size)
+    db.disconnect()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
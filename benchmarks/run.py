@@ -0,0 +1,286 @@
+"""
+Benchmark Runner
+Times every Database method and the InventoryGUI load paths against a seeded
+benchmark database, writes the results as JSON and compares them with a saved
+baseline. Exits with status 1 when any case regresses beyond the tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from config import DB_CONFIG
+from database import Database, InsufficientStockError
+from benchmarks.datagen import BENCH_DATABASE
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+BASELINE_FILE = os.path.join(RESULTS_DIR, "baseline.json")
+
+
+# ==================== CASES ====================
+
+def database_cases(ctx):
+    """(name, callable) pairs covering the Database API"""
+    rng = random.Random(7)
+    product_id = ctx['hot_product_id']
+    location_ids = ctx['location_ids']
+    counter = iter(range(10 ** 9))
+
+    def add_and_delete_product(db):
+        n = next(counter)
+        new_id = db.add_product(f"Bench {n}", f"BENCH-{os.getpid()}-{n}", "", None, 0, 1.0)
+        db.delete_product(new_id)
+
+    def add_and_delete_category(db):
+        new_id = db.add_category(f"Bench category {next(counter)}", "")
+        db.delete_category(new_id)
+
+    def update_product(db):
+        product = db.get_product_by_id(product_id)
+        db.update_product(product_id, product['name'], product['sku'], product['description'],
+                          product['category_id'], product['quantity'], product['price'],
+                          product['min_stock_level'], version=product['version'])
+
+    def add_transaction(db):
+        try:
+            db.add_transaction(product_id, rng.choice(["IN", "OUT"]), 1, "bench", "bench")
+        except InsufficientStockError:
+            pass
+
+    def apply_movements(db):
+        db.apply_movements([{
+            'key': f"bench-{os.getpid()}-{next(counter)}", 'product_id': product_id, 'transaction_type': "IN",
+            'quantity': 0, 'notes': "bench", 'user': "bench", 'location_id': None, 'created_at': None,
+        }])
+
+    def transfer_stock(db):
+        if len(location_ids) < 2:
+            return
+        source, target = rng.sample(location_ids, 2)
+        try:
+            db.transfer_stock(product_id, source, target, 1)
+        except InsufficientStockError:
+            pass
+
+    return [
+        ("db.get_all_products", lambda db: db.get_all_products()),
+        ("db.get_all_products.search", lambda db: db.get_all_products(search_term="Steel")),
+        ("db.get_all_products.category", lambda db: db.get_all_products(category=ctx['category_id'])),
+        ("db.get_product_by_id", lambda db: db.get_product_by_id(product_id)),
+        ("db.add_delete_product", add_and_delete_product),
+        ("db.update_product", update_product),
+        ("db.update_stock", lambda db: db.update_stock(product_id, 0)),
+        ("db.get_low_stock_products", lambda db: db.get_low_stock_products()),
+        ("db.get_low_stock_products.location", lambda db: db.get_low_stock_products(location_ids[0]) if location_ids else None),
+        ("db.get_all_locations", lambda db: db.get_all_locations()),
+        ("db.get_stock_by_location", lambda db: db.get_stock_by_location(product_id)),
+        ("db.get_location_products", lambda db: db.get_location_products(location_ids[0]) if location_ids else None),
+        ("db.transfer_stock", transfer_stock),
+        ("db.get_all_categories", lambda db: db.get_all_categories()),
+        ("db.add_delete_category", add_and_delete_category),
+        ("db.add_transaction", add_transaction),
+        ("db.apply_movements", apply_movements),
+        ("db.get_transactions", lambda db: db.get_transactions(limit=100)),
+        ("db.get_transactions.since", lambda db: db.get_transactions(limit=10, since_id=max(0, ctx['transactions'] - 10))),
+        ("db.get_transactions.range", lambda db: db.get_transactions(limit=100, start=datetime.now() - timedelta(days=30))),
+        ("db.get_transactions.product", lambda db: db.get_transactions(product_id=product_id, limit=100)),
+        ("db.get_sku_index", lambda db: db.get_sku_index()),
+        ("db.get_dashboard_stats", lambda db: db.get_dashboard_stats()),
+        ("db.get_changes", lambda db: db.get_changes(max(0, (db.get_latest_change_id() or 0) - 500))),
+        ("db.get_products_by_ids", lambda db: db.get_products_by_ids(ctx['sample_product_ids'])),
+        ("db.get_movement_series.product", lambda db: db.get_movement_series(
+            "day", datetime.now() - timedelta(days=730), datetime.now(), product_id=product_id)),
+        ("db.get_movement_series.category", lambda db: db.get_movement_series(
+            "day", datetime.now() - timedelta(days=90), datetime.now(), category_id=ctx['category_id'])),
+        ("db.get_movement_series.all", lambda db: db.get_movement_series(
+            "week", datetime.now() - timedelta(days=730), datetime.now())),
+    ]
+
+
+def gui_cases():
+    """(name, method name) pairs covering the InventoryGUI load paths"""
+    return [
+        ("gui.show_dashboard", "show_dashboard"),
+        ("gui.show_products", "show_products"),
+        ("gui.show_categories", "show_categories"),
+        ("gui.show_locations", "show_locations"),
+        ("gui.show_transactions", "show_transactions"),
+        ("gui.show_low_stock", "show_low_stock"),
+        ("gui.show_scan_mode", "show_scan_mode"),
+        ("gui.show_charts", "show_charts"),
+    ]
+
+
+# ==================== TIMING ====================
+
+def time_case(func, repeat, warmup):
+    """Run func repeatedly and return timing statistics in milliseconds"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        'median_ms': round(statistics.median(samples), 3),
+        'min_ms': round(min(samples), 3),
+        'max_ms': round(max(samples), 3),
+        'runs': repeat,
+    }
+
+
+def run_gui_cases(db, repeat, warmup):
+    """Time the GUI load paths on a hidden Tk root; skipped when no display is available"""
+    try:
+        import tkinter as tk
+        from gui import InventoryGUI
+        root = tk.Tk()
+    except Exception as e:
+        print(f"Skipping GUI benchmarks: {e}")
+        return {}
+
+    root.withdraw()
+    results = {}
+    try:
+        app = InventoryGUI(root, db)
+        for name, method in gui_cases():
+            def render(method=method):
+                getattr(app, method)()
+                root.update_idletasks()
+            results[name] = time_case(render, repeat, warmup)
+            print(f"{name:<40}{results[name]['median_ms']:>10.2f} ms")
+    finally:
+        root.destroy()
+    return results
+
+
+def collect_context(db):
+    """Pick stable inputs for the cases from the seeded data"""
+    db.cursor.execute("""
+        SELECT product_id, COUNT(*) AS movements
+        FROM transactions GROUP BY product_id ORDER BY movements DESC LIMIT 1
+    """)
+    row = db.cursor.fetchone()
+    if row is None:
+        db.cursor.execute("SELECT MIN(id) AS product_id FROM products")
+        row = db.cursor.fetchone()
+    db.cursor.execute("SELECT COUNT(*) AS count FROM products")
+    products = db.cursor.fetchone()['count']
+    db.cursor.execute("SELECT COUNT(*) AS count FROM transactions")
+    transactions = db.cursor.fetchone()['count']
+    categories = db.get_all_categories()
+    db.cursor.execute("SELECT id FROM products ORDER BY id LIMIT 100")
+    sample_product_ids = [r['id'] for r in db.cursor.fetchall()]
+    return {
+        'sample_product_ids': sample_product_ids,
+        'hot_product_id': row['product_id'],
+        'category_id': categories[0]['id'] if categories else None,
+        'location_ids': [l['id'] for l in db.get_all_locations()],
+        'products': products,
+        'transactions': transactions,
+    }
+
+
+# ==================== BASELINE ====================
+
+def compare(results, baseline, tolerance, noise_floor_ms):
+    """Return a list of regressions against the baseline"""
+    regressions = []
+    for name, current in results['results'].items():
+        previous = baseline['results'].get(name)
+        if not previous:
+            continue
+        limit = previous['median_ms'] * (1 + tolerance)
+        if current['median_ms'] > limit and current['median_ms'] - previous['median_ms'] > noise_floor_ms:
+            regressions.append((name, previous['median_ms'], current['median_ms']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the inventory Database API and GUI load paths")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--only", default="", help="run only cases whose name contains this text")
+    parser.add_argument("--no-gui", action="store_true", help="skip the InventoryGUI load paths")
+    parser.add_argument("--output", default="", help="results file (default: results/<timestamp>.json)")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="fail if results regress against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown, e.g. 0.25 = 25%%")
+    parser.add_argument("--noise-floor", type=float, default=1.0, help="ignore regressions smaller than this (ms)")
+    parser.add_argument("--host", default=DB_CONFIG["host"])
+    parser.add_argument("--user", default=DB_CONFIG["user"])
+    parser.add_argument("--password", default=DB_CONFIG["password"])
+    parser.add_argument("--database", default=BENCH_DATABASE)
+    args = parser.parse_args(argv)
+
+    db = Database(host=args.host, user=args.user, password=args.password, database=args.database)
+    if not db.connect():
+        return 2
+
+    ctx = collect_context(db)
+    print(f"Benchmarking '{args.database}': {ctx['products']} products, {ctx['transactions']} ledger rows\n")
+
+    timings = {}
+    for name, func in database_cases(ctx):
+        if args.only and args.only not in name:
+            continue
+        timings[name] = time_case(lambda: func(db), args.repeat, args.warmup)
+        print(f"{name:<40}{timings[name]['median_ms']:>10.2f} ms")
+
+    if not args.no_gui and (not args.only or "gui" in args.only):
+        timings.update(run_gui_cases(db, args.repeat, args.warmup))
+    db.disconnect()
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec="seconds"),
+            'python': platform.python_version(),
+            'machine': platform.node(),
+            'database': args.database,
+            'products': ctx['products'],
+            'transactions': ctx['transactions'],
+            'repeat': args.repeat,
+        },
+        'results': timings,
+    }
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}; run with --save-baseline first")
+            return 2
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['meta'].get('products') != ctx['products']:
+            print("Warning: baseline was recorded on a different catalogue size")
+        regressions = compare(results, baseline, args.tolerance, args.noise_floor)
+        if regressions:
+            print(f"\nREGRESSION: {len(regressions)} case(s) slower than baseline by more than {args.tolerance:.0%}")
+            for name, before, after in regressions:
+                print(f"  {name:<40}{before:>10.2f} ms -> {after:>10.2f} ms")
+            return 1
+        print("No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,416 @@
+"""
+Catalogue Snapshot Module
+Memory-mapped, columnar copy of the product catalogue for instant start-up.
+
+The snapshot file holds products and categories as fixed-width int64 columns
+plus one UTF-8 string heap addressed by offset columns:
+
+    header (64 bytes): magic, version, created, change id, product and category counts
+    products:   id, category_id, quantity, min_stock_level, price in cents
+                sku offsets, name offsets (count + 1 each)
+    categories: id, name offsets (count + 1)
+    string heap
+
+The file is mapped read-only, so opening it costs no more than reading the
+header and every process on the host shares the same pages. Rows are decoded
+only when they are looked at. The change log id stored in the header is a
+high-water mark: on open, Catalogue replays change log events after it and
+re-reads just the products and categories they touched. The file is only
+ever replaced whole, by writing a new one and renaming it over the old.
+"""
+
+import logging
+import mmap
+import os
+import struct
+import time
+from array import array
+from bisect import bisect_right
+from collections.abc import Sequence
+from decimal import Decimal
+
+from change_feed import MAX_TRACKED_GAP, changed_ids, fetch_products
+
+
+logger = logging.getLogger("inventory.catalogue")
+
+MAGIC = b"INVCAT01"
+VERSION = 1
+HEADER = struct.Struct("<8sIIdqqq")
+HEADER_SIZE = 64
+PRODUCT_INT_COLUMNS = ("id", "category_id", "quantity", "min_stock_level", "price")
+PRODUCT_STR_COLUMNS = ("sku", "name")
+
+# Catch-up re-reads changed products in chunks of this many ids
+FETCH_CHUNK = 1000
+# Replaying more than this share of the catalogue costs more than reloading it
+REBUILD_FRACTION = 0.25
+# Changed rows kept as an overlay before the file is rewritten
+REWRITE_ROWS = 1000
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is missing, truncated or of another format"""
+
+
+def _layout(products, categories):
+    """Byte offsets of every section for the given row counts"""
+    offsets = {}
+    position = HEADER_SIZE
+    for name in PRODUCT_INT_COLUMNS:
+        offsets[name] = position
+        position += 8 * products
+    for name in PRODUCT_STR_COLUMNS:
+        offsets[name] = position
+        position += 8 * (products + 1)
+    offsets['category_id_col'] = position
+    position += 8 * categories
+    offsets['category_name'] = position
+    position += 8 * (categories + 1)
+    offsets['heap'] = position
+    return offsets
+
+
+def _cents(price):
+    return int(round(Decimal(price or 0) * 100))
+
+
+def write_snapshot(path, products, categories, change_id):
+    """Write products and categories to path as a new snapshot, replacing any old one"""
+    heap = bytearray()
+
+    def strings(values):
+        offsets = array("q", [len(heap)])
+        for value in values:
+            heap.extend((value or "").encode("utf-8"))
+            offsets.append(len(heap))
+        return offsets
+
+    columns = [
+        array("q", (p['id'] for p in products)),
+        array("q", (p['category_id'] or 0 for p in products)),
+        array("q", (p['quantity'] for p in products)),
+        array("q", (p['min_stock_level'] for p in products)),
+        array("q", (_cents(p['price']) for p in products)),
+        strings(p['sku'] for p in products),
+        strings(p['name'] for p in products),
+        array("q", (c['id'] for c in categories)),
+        strings(c['name'] for c in categories),
+    ]
+
+    header = HEADER.pack(MAGIC, VERSION, 0, time.time(), change_id, len(products), len(categories))
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        for column in columns:
+            if column.itemsize != 8:
+                raise SnapshotError("int64 arrays are not available on this platform")
+            f.write(column.tobytes())
+        f.write(heap)
+        f.flush()
+        os.fsync(f.fileno())
+    # Processes that still map the old file keep reading it until they reopen
+    os.replace(temp, path)
+
+
+class CatalogueSnapshot:
+    """Read-only view of a snapshot file; rows are decoded on access"""
+
+    def __init__(self, path):
+        self.path = path
+        self.view = None
+        self.columns = {}
+        self._positions = None
+        with open(path, "rb") as f:
+            try:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise SnapshotError(f"{path} is empty")
+        try:
+            self._parse()
+        except SnapshotError:
+            self.close()
+            raise
+
+    def _parse(self):
+        if len(self.map) < HEADER_SIZE:
+            raise SnapshotError(f"{self.path} is truncated")
+        magic, version, _, self.created, self.change_id, self.count, categories = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise SnapshotError(f"{self.path} is not a version {VERSION} catalogue snapshot")
+        offsets = _layout(self.count, categories)
+        if len(self.map) < offsets['heap']:
+            raise SnapshotError(f"{self.path} is truncated")
+
+        self.view = memoryview(self.map)
+        self.columns = {}
+        for name in PRODUCT_INT_COLUMNS:
+            self.columns[name] = self._ints(offsets[name], self.count)
+        for name in PRODUCT_STR_COLUMNS:
+            self.columns[name] = self._ints(offsets[name], self.count + 1)
+        self.heap = offsets['heap']
+        category_ids = self._ints(offsets['category_id_col'], categories)
+        category_names = self._ints(offsets['category_name'], categories + 1)
+        try:
+            # The last string written ends the heap
+            if len(self.map) < self.heap + category_names[-1]:
+                raise SnapshotError(f"{self.path} is truncated")
+            self.categories = {
+                category_ids[i]: self._string(category_names, i) for i in range(categories)
+            }
+        finally:
+            category_ids.release()
+            category_names.release()
+
+    def _ints(self, offset, count):
+        return self.view[offset:offset + 8 * count].cast("q")
+
+    def _string(self, offsets, i):
+        return str(self.map[self.heap + offsets[i]:self.heap + offsets[i + 1]], "utf-8")
+
+    def __len__(self):
+        return self.count
+
+    def product_id(self, i):
+        return self.columns['id'][i]
+
+    def positions(self):
+        """Row position of every product id, built on first use"""
+        if self._positions is None:
+            self._positions = {product_id: i for i, product_id in enumerate(self.columns['id'])}
+        return self._positions
+
+    def product(self, i):
+        """Row i as a dict with the product fields the catalogue keeps"""
+        columns = self.columns
+        return {
+            'id': columns['id'][i],
+            'sku': self._string(columns['sku'], i),
+            'name': self._string(columns['name'], i),
+            'category_id': columns['category_id'][i] or None,
+            'quantity': columns['quantity'][i],
+            'min_stock_level': columns['min_stock_level'][i],
+            'price': Decimal(columns['price'][i]).scaleb(-2),
+        }
+
+    def close(self):
+        # Every exported buffer has to go before the map can be closed
+        for column in self.columns.values():
+            column.release()
+        self.columns = {}
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+        self.map.close()
+
+
+class ProductRows(Sequence):
+    """Products newest first, as get_all_products returns them, decoded lazily"""
+
+    def __init__(self, catalogue):
+        self.catalogue = catalogue
+        self.added = [catalogue.with_category(p) for p in catalogue.added]
+        snapshot = catalogue.snapshot
+        self.count = len(snapshot)
+        # Kept rows before each deleted snapshot row, ascending, to map an index past the deleted rows
+        skipped = []
+        if catalogue.deleted:
+            positions = snapshot.positions()
+            skipped = sorted(positions[i] for i in catalogue.deleted if i in positions)
+        self.kept_before = [position - n for n, position in enumerate(skipped)]
+
+    def __len__(self):
+        return len(self.added) + self.count - len(self.kept_before)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[n] for n in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if i < len(self.added):
+            return self.added[i]
+        i -= len(self.added)
+        if not 0 <= i < len(self) - len(self.added):
+            raise IndexError(i)
+        return self.catalogue.row_at(i + bisect_right(self.kept_before, i))
+
+
+class Catalogue:
+    """The catalogue snapshot plus the changes made since it was written"""
+
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+        self.snapshot = None
+        self.categories = {}
+        self.change_id = 0
+        # Products changed since the snapshot, by id, and those created since (newest first)
+        self.changed = {}
+        self.added = []
+        self.deleted = set()
+
+    def open(self):
+        """Map the snapshot and bring it up to date, rebuilding it when it cannot be used
+
+        Returns False only when there is neither a snapshot nor a database to build one from.
+        """
+        try:
+            self.snapshot = CatalogueSnapshot(self.path)
+        except (OSError, SnapshotError) as e:
+            logger.info("Building catalogue snapshot: %s", e)
+            return self.rebuild()
+        self.categories = dict(self.snapshot.categories)
+        self.change_id = self.snapshot.change_id
+
+        caught_up = self.catch_up()
+        if caught_up is None:
+            return self.rebuild()
+        if len(self.changed) + len(self.added) + len(self.deleted) > REWRITE_ROWS:
+            self.save()
+        return True
+
+    def catch_up(self):
+        """Apply change log events newer than the snapshot
+
+        Returns False if the database could not be reached (the snapshot stays
+        usable as it is) and None if the snapshot is too old to catch up.
+        """
+        latest = self.db.get_latest_change_id()
+        if latest is None:
+            logger.warning("Using the catalogue snapshot without checking for changes")
+            return False
+        if latest < self.change_id:
+            # The change log is behind the snapshot: it belongs to another database
+            return None
+        if latest == self.change_id:
+            return True
+        oldest = self.db.get_oldest_change_id()
+        if oldest is None or oldest > self.change_id + 1:
+            # Events after the high-water mark have been purged
+            return None
+
+        # Events just below the mark may have committed after the snapshot was taken
+        events = []
+        since = max(0, self.change_id - MAX_TRACKED_GAP)
+        while True:
+            rows = self.db.get_changes(since, FETCH_CHUNK)
+            events.extend(e for e in rows if e['entity'] in ("product", "category"))
+            if len(rows) < FETCH_CHUNK:
+                break
+            since = rows[-1]['id']
+        if len({e['entity_id'] for e in events if e['entity'] == "product"}) > REBUILD_FRACTION * len(self.snapshot):
+            return None
+        self.apply_changes(events)
+        self.change_id = max(latest, self.change_id)
+        return True
+
+    def apply_changes(self, events, products=None):
+        """Change feed subscriber: re-read the products and categories that changed
+
+        products, when given, holds the changed products already read by the caller, by id.
+        """
+        if any(e['entity'] == "category" for e in events):
+            self.categories = {c['id']: c['name'] for c in self.db.get_all_categories()}
+
+        upserted, deleted = changed_ids(events, "product")
+        if products is None:
+            products = fetch_products(self.db, upserted, FETCH_CHUNK)
+        fetched = {product_id: products[product_id] for product_id in upserted if product_id in products}
+        # Upserted but gone by now: deleted by a later event
+        deleted |= upserted - set(fetched)
+
+        added = {p['id'] for p in self.added}
+        for product_id in deleted:
+            self.changed.pop(product_id, None)
+            self.deleted.add(product_id)
+        if deleted & added:
+            self.added = [p for p in self.added if p['id'] not in deleted]
+
+        in_snapshot = self.snapshot.positions() if self.snapshot else {}
+        for product_id, product in sorted(fetched.items()):
+            row = {name: product[name] for name in ('id', 'sku', 'name', 'category_id', 'quantity',
+                                                    'min_stock_level', 'price')}
+            if product_id in added:
+                self.added = [row if p['id'] == product_id else p for p in self.added]
+                continue
+            if product_id not in self.changed and product_id not in self.deleted:
+                if product_id not in in_snapshot:
+                    self.added.insert(0, row)
+                    continue
+            self.deleted.discard(product_id)
+            self.changed[product_id] = row
+        if events:
+            self.change_id = max(self.change_id, max(e['id'] for e in events))
+
+    def with_category(self, product):
+        product = dict(product)
+        product['category_name'] = self.categories.get(product['category_id'])
+        return product
+
+    def row_at(self, position):
+        """Snapshot row at position, with any later change applied"""
+        product_id = self.snapshot.product_id(position)
+        product = self.changed.get(product_id)
+        if product is None:
+            product = self.snapshot.product(position)
+        return self.with_category(product)
+
+    def products(self):
+        """All products, newest first, without a database round trip"""
+        if self.snapshot is None:
+            return [self.with_category(p) for p in self.added]
+        return ProductRows(self)
+
+    def rebuild(self):
+        """Reload the whole catalogue from the database and write a fresh snapshot"""
+        change_id = self.db.get_latest_change_id()
+        if change_id is None:
+            return False
+        # Read after the high-water mark: anything committed in between is replayed next time
+        products = self.db.get_all_products()
+        categories = self.db.get_all_categories()
+        try:
+            write_snapshot(self.path, products, categories, change_id)
+        except OSError as e:
+            logger.error("Could not write catalogue snapshot: %s", e)
+            self.snapshot = None
+            self.categories = {c['id']: c['name'] for c in categories}
+            self.added = [{name: p[name] for name in ('id', 'sku', 'name', 'category_id', 'quantity',
+                                                      'min_stock_level', 'price')} for p in products]
+            self.change_id = change_id
+            return True
+        self._remap()
+        return True
+
+    def save(self):
+        """Fold the changes into a new snapshot file; returns False if it could not be written"""
+        if not (self.changed or self.added or self.deleted) and self.snapshot \
+                and self.snapshot.change_id == self.change_id:
+            return True
+        products = list(self.products())
+        categories = [{'id': i, 'name': name} for i, name in self.categories.items()]
+        try:
+            write_snapshot(self.path, products, categories, self.change_id)
+        except OSError as e:
+            logger.error("Could not write catalogue snapshot: %s", e)
+            return False
+        self._remap()
+        return True
+
+    def _remap(self):
+        if self.snapshot:
+            self.snapshot.close()
+        self.snapshot = CatalogueSnapshot(self.path)
+        self.categories = dict(self.snapshot.categories)
+        self.change_id = self.snapshot.change_id
+        self.changed = {}
+        self.added = []
+        self.deleted = set()
+
+    def close(self, save=True):
+        """Save pending changes for the next start and unmap the file"""
+        if save and self.snapshot is not None:
+            self.save()
+        if self.snapshot:
+            self.snapshot.close()
+            self.snapshot = None
@@ -0,0 +1,164 @@
+"""
+Change Feed Module
+Tails the change_log table so consumers (the GUI, caches, exporters) can
+apply deltas instead of reloading whole tables.
+
+Every mutating Database method appends a compact event to change_log in the
+same database transaction as the change itself, so event ids give a single
+ordering of all changes. Ids come from AUTO_INCREMENT, though, and a
+transaction that started earlier can commit a smaller id after a larger one is
+already visible. ChangeFeed remembers such holes and re-checks them on each
+poll, delivering late events when they appear and giving up on a hole (a
+rolled back insert) after gap_timeout seconds.
+"""
+
+import time
+from datetime import date
+
+
+# Holes wider than this are not waited for
+MAX_TRACKED_GAP = 1000
+
+
+class ChangeFeed:
+    """Delivers each committed change log event once, from a resumable cursor"""
+
+    def __init__(self, db, since_id=None, batch_size=500, gap_timeout=10.0):
+        self.db = db
+        self.batch_size = batch_size
+        self.gap_timeout = gap_timeout
+        if since_id is None:
+            since_id = db.get_latest_change_id() or 0
+        self.high = since_id
+        self.gaps = {}
+        self.subscribers = []
+
+    @property
+    def cursor(self):
+        """Id below which every event has been delivered; safe to persist and resume from"""
+        return min(self.gaps) - 1 if self.gaps else self.high
+
+    def subscribe(self, callback, entities=None):
+        """Call callback(events) with each non-empty batch, optionally filtered by entity"""
+        self.subscribers.append((callback, set(entities) if entities else None))
+
+    def poll(self):
+        """Fetch newly committed events and dispatch them; returns the new events"""
+        events = []
+        if self.gaps:
+            late = self.db.get_changes(ids=sorted(self.gaps))
+            for row in late:
+                self.gaps.pop(row['id'], None)
+            events.extend(late)
+
+        while True:
+            rows = self.db.get_changes(self.high, self.batch_size)
+            self._track(rows)
+            events.extend(rows)
+            if len(rows) < self.batch_size:
+                break
+
+        # Holes that stayed empty past the timeout were rolled back and will never appear
+        now = time.monotonic()
+        for missing, first_seen in list(self.gaps.items()):
+            if now - first_seen > self.gap_timeout:
+                del self.gaps[missing]
+
+        if events:
+            for callback, entities in self.subscribers:
+                selected = events if entities is None else [e for e in events if e['entity'] in entities]
+                if selected:
+                    callback(selected)
+        return events
+
+    def _track(self, rows):
+        """Advance the high-water mark and note any holes left behind it"""
+        now = time.monotonic()
+        for row in rows:
+            # Very large jumps come from purged history, not in-flight transactions
+            if row['id'] - self.high <= MAX_TRACKED_GAP:
+                for missing in range(self.high + 1, row['id']):
+                    self.gaps.setdefault(missing, now)
+            self.high = max(self.high, row['id'])
+
+
+def changed_ids(events, entity):
+    """Split events for one entity into (upserted ids, deleted ids), latest op wins"""
+    upserted = set()
+    deleted = set()
+    for event in events:
+        if event['entity'] != entity:
+            continue
+        if event['op'] == "delete":
+            deleted.add(event['entity_id'])
+            upserted.discard(event['entity_id'])
+        else:
+            upserted.add(event['entity_id'])
+            deleted.discard(event['entity_id'])
+    return upserted, deleted
+
+
+def fetch_products(db, product_ids, chunk=1000):
+    """Re-read products by id in chunks, as {id: row}; ids missing from the result no longer exist"""
+    ids = sorted(product_ids)
+    products = {}
+    for start in range(0, len(ids), chunk):
+        for product in db.get_products_by_ids(ids[start:start + chunk]):
+            products[product['id']] = product
+    return products
+
+
+def _stock_value(figures):
+    return float(figures['quantity'] or 0) * float(figures['price'] or 0)
+
+
+def _low_stock(figures):
+    return int(figures['quantity'] <= figures['min_stock_level'])
+
+
+def _made_today(payload):
+    """Movements replayed from the journal or scan queue carry the date they were recorded"""
+    created_at = payload.get('created_at')
+    return created_at is None or str(created_at)[:10] == date.today().isoformat()
+
+
+def stat_deltas(events):
+    """Work out the change to each dashboard figure implied by a batch of events
+
+    Returns None when an event lacks the figures needed (events logged before
+    they carried them), in which case the caller should reload the stats.
+    """
+    deltas = dict.fromkeys(
+        ("total_products", "total_categories", "total_locations", "stock_value",
+         "low_stock_count", "today_transactions"), 0
+    )
+    counted = {"product": "total_products", "category": "total_categories", "location": "total_locations"}
+    for event in events:
+        entity, op, payload = event['entity'], event['op'], event.get('payload') or {}
+        if entity in counted and op in ("insert", "delete"):
+            deltas[counted[entity]] += 1 if op == "insert" else -1
+        if entity != "product":
+            continue
+
+        if op == "transfer":
+            # Two ledger rows; on-hand totals are unchanged
+            deltas['today_transactions'] += 2
+            continue
+        if op == "stock":
+            if payload.get('quantity') is None or 'delta' not in payload:
+                return None
+            old = dict(payload, quantity=payload['quantity'] - payload['delta'])
+            new = payload
+            if payload.get('transaction_id') and _made_today(payload):
+                deltas['today_transactions'] += 1
+        else:
+            old = None if op == "insert" else payload.get('old')
+            new = None if op == "delete" else payload
+            if (op != "insert" and old is None) or (new is not None and 'quantity' not in new):
+                return None
+
+        for figures, sign in ((new, 1), (old, -1)):
+            if figures:
+                deltas['stock_value'] += sign * _stock_value(figures)
+                deltas['low_stock_count'] += sign * _low_stock(figures)
+    return deltas
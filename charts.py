@@ -0,0 +1,176 @@
+"""
+Charts Module
+Time-series charts of stock movements drawn on a Tkinter Canvas.
+
+The database groups ledger rows into hour, day or week buckets, so a chart
+only ever receives one row per bucket. Stock levels are worked back from the
+current quantity through those bucket totals. Each series is then reduced
+with Largest-Triangle-Three-Buckets (LTTB) to about one point per horizontal
+pixel, which keeps the shape of spikes and dips that plain averaging would
+flatten, and drawn as a single polyline.
+"""
+
+import tkinter as tk
+from datetime import datetime
+
+
+def lttb(points, threshold):
+    """Downsample [(x, y)] sorted by x to at most threshold points, keeping the first and last"""
+    if threshold >= len(points) or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    every = (len(points) - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third corner of the triangle
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, len(points))
+        span = points[next_start:next_end]
+        avg_x = sum(p[0] for p in span) / len(span)
+        avg_y = sum(p[1] for p in span) / len(span)
+
+        # Keep the point of this bucket that makes the largest triangle with a and the average
+        ax, ay = points[a]
+        best, best_area = None, -1.0
+        for j in range(int(i * every) + 1, next_start):
+            x, y = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+    sampled.append(points[-1])
+    return sampled
+
+
+def stock_levels(buckets, quantity, net_after=0, start=None, end=None):
+    """Stock on hand after each bucket, as [(time, level)] oldest first
+
+    quantity is the stock on hand now and net_after the net movement since
+    end, so the level at end is quantity - net_after. Each bucket's net is
+    taken off going backwards. start and end add opening and closing points.
+    """
+    level = quantity - net_after
+    levels = []
+    for row in reversed(buckets):
+        levels.append((row['bucket'], level))
+        level -= row['in_quantity'] - row['out_quantity']
+    levels.reverse()
+    if start is not None:
+        levels.insert(0, (start, level))
+    if end is not None and levels:
+        levels.append((end, levels[-1][1]))
+    return levels
+
+
+def _timestamp(value):
+    return value.timestamp() if isinstance(value, datetime) else float(value)
+
+
+class TimeSeriesChart:
+    """Stock level (upper panel) and IN/OUT volume (lower panel) over time on one Canvas"""
+
+    PADDING = (60, 15, 20, 30)  # left, top, right, bottom
+    GAP = 25
+    COLORS = {'level': "#2196F3", 'in': "#4CAF50", 'out': "#F44336", 'axis': "#9E9E9E", 'text': "#424242"}
+
+    def __init__(self, parent, height=420):
+        self.canvas = tk.Canvas(parent, bg="white", height=height, highlightthickness=0)
+        self.canvas.bind("<Configure>", lambda event: self.redraw())
+        self.levels = []
+        self.volumes = []
+        self.start = None
+        self.end = None
+        self.drawn_points = 0
+
+    def pack(self, **kwargs):
+        self.canvas.pack(**kwargs)
+
+    def set_data(self, levels, volumes, start, end):
+        """levels is [(time, level)], volumes [(time, in_quantity, out_quantity)]; both oldest first"""
+        self.levels = [(_timestamp(t), level) for t, level in levels]
+        self.volumes = [(_timestamp(t), inward, outward) for t, inward, outward in volumes]
+        self.start = _timestamp(start)
+        self.end = _timestamp(end)
+        self.redraw()
+
+    def redraw(self):
+        canvas = self.canvas
+        canvas.delete("all")
+        width, height = canvas.winfo_width(), canvas.winfo_height()
+        left, top, right, bottom = self.PADDING
+        plot_width = width - left - right
+        panel_height = (height - top - bottom - self.GAP) / 2
+        self.drawn_points = 0
+        if plot_width < 10 or panel_height < 10 or self.start is None:
+            return
+        if not self.levels and not self.volumes:
+            canvas.create_text(width / 2, height / 2, text="No movements in this period", fill=self.COLORS['text'])
+            return
+
+        span = max(self.end - self.start, 1.0)
+
+        def x_of(t):
+            return left + (t - self.start) / span * plot_width
+
+        # Upper panel: stock level as a step line
+        level_top, level_bottom = top, top + panel_height
+        points = lttb(self.levels, plot_width)
+        low = min(min(level for _, level in points), 0)
+        high = max(max(level for _, level in points), low + 1)
+
+        def y_of(level):
+            return level_bottom - (level - low) / (high - low) * panel_height
+
+        line = []
+        for i, (t, level) in enumerate(points):
+            if i:
+                line.extend((x_of(t), line[-1]))
+            line.extend((x_of(t), y_of(level)))
+        if len(line) >= 4:
+            canvas.create_line(*line, fill=self.COLORS['level'], width=2)
+        self.drawn_points += len(points)
+        self._axis(left, level_top, plot_width, panel_height, low, high, "Stock")
+        if low < 0:
+            canvas.create_line(left, y_of(0), left + plot_width, y_of(0), fill=self.COLORS['axis'], dash=(2, 2))
+
+        # Lower panel: IN above the baseline, OUT below it
+        volume_top = level_bottom + self.GAP
+        baseline = volume_top + panel_height / 2
+        peak = max([max(inward, outward) for _, inward, outward in self.volumes] + [1])
+        scale = panel_height / 2 / peak
+        for index, color, sign in ((1, self.COLORS['in'], -1), (2, self.COLORS['out'], 1)):
+            series = lttb([(row[0], row[index]) for row in self.volumes], plot_width)
+            if not series:
+                continue
+            # Spikes from the baseline: down to it between buckets, out to the volume at each bucket
+            line = [x_of(series[0][0]), baseline]
+            for t, volume in series:
+                x = x_of(t)
+                line.extend((x, baseline, x, baseline + sign * volume * scale))
+            line.extend((line[-2], baseline))
+            canvas.create_line(*line, fill=color)
+            self.drawn_points += len(series)
+        canvas.create_line(left, baseline, left + plot_width, baseline, fill=self.COLORS['axis'])
+        self._axis(left, volume_top, plot_width, panel_height, -peak, peak, "In / Out", absolute=True)
+        self._time_axis(left, volume_top + panel_height, plot_width)
+
+    def _axis(self, left, top, width, height, low, high, title, absolute=False):
+        canvas = self.canvas
+        canvas.create_rectangle(left, top, left + width, top + height, outline=self.COLORS['axis'])
+        for value, y in ((high, top), (low, top + height)):
+            canvas.create_text(left - 5, y, text=f"{abs(value) if absolute else value:,.0f}", anchor=tk.E,
+                               fill=self.COLORS['text'], font=("Helvetica", 8))
+        canvas.create_text(left - 5, top + height / 2, text=title, anchor=tk.E, fill=self.COLORS['text'],
+                           font=("Helvetica", 8, "bold"))
+
+    def _time_axis(self, left, y, width):
+        span = self.end - self.start
+        fmt = "%d %b %H:%M" if span <= 3 * 86400 else "%d %b %Y"
+        ticks = 5
+        for i in range(ticks + 1):
+            t = self.start + span * i / ticks
+            anchor = tk.NW if i == 0 else tk.NE if i == ticks else tk.N
+            self.canvas.create_text(left + width * i / ticks, y + 5, text=datetime.fromtimestamp(t).strftime(fmt),
+                                    anchor=anchor, fill=self.COLORS['text'], font=("Helvetica", 8))
@@ -1,23 +1,128 @@
-
+"""
 Database Module
 Handles all MySQL database operations for the Inventory Management System
+"""
 
-
+import json
+import logging
+import random
+import time
 import mysql.connector
 from mysql.connector import Error
-from datetime import datetime
+from datetime import date, datetime
+from decimal import Decimal
+from config import USER_SETTINGS
+from instrumentation import InstrumentedCursor, QueryStats, instrumented
+from schema import ensure_schema
+from statements import Query, StatementCache
+
+
+logger = logging.getLogger("inventory.db")
+
+
+# MySQL error numbers that are safe to retry: deadlock and lock wait timeout
+RETRYABLE_ERRORS = (1213, 1205)
+
+
+def is_transient_error(e):
+    """True for lock conflicts and connection failures, which a later retry can get past
+    
+    Anything else (data too long, out of range, missing parent row) fails the
+    same way however often it is retried.
+    """
+    return e.errno in RETRYABLE_ERRORS or isinstance(e, (mysql.connector.InterfaceError,
+                                                         mysql.connector.OperationalError))
+
+# Default rows per statement for bulk writes and chunked reads
+STOCK_TAKE_CHUNK = 1000
+
+# Ledger columns copied to transactions_archive
+LEDGER_COLUMNS = "id, product_id, transaction_type, quantity, notes, user, created_at, location_id, idempotency_key"
+
+# Chart buckets: SQL for the start of the hour, day or week (from Monday) of a ledger row
+SERIES_BUCKETS = {
+    "hour": "TIMESTAMP(DATE(t.created_at), MAKETIME(HOUR(t.created_at), 0, 0))",
+    "day": "TIMESTAMP(DATE(t.created_at))",
+    "week": "TIMESTAMP(DATE(t.created_at) - INTERVAL WEEKDAY(t.created_at) DAY)",
+}
 
+# Bulk edit rules: SQL for the new value, taking one parameter
+BULK_PRICE_RULES = {
+    "percent": "GREATEST(ROUND(p.price * (100 + %s) / 100, 2), 0)",
+    "amount": "GREATEST(ROUND(p.price + %s, 2), 0)",
+    "set": "%s",
+}
+BULK_MIN_STOCK_RULES = {
+    "amount": "GREATEST(p.min_stock_level + %s, 0)",
+    "set": "%s",
+}
 
+
+class ConcurrentUpdateError(Exception):
+    """Raised when a row was changed by another terminal since it was loaded"""
+
+
+class InsufficientStockError(Exception):
+    """Raised when a stock decrement would take quantity below zero"""
+
+
+class StockTakeClosedError(Exception):
+    """Raised when counting into or posting a stock take that is no longer open"""
+
+
+class DatabaseUnavailableError(Exception):
+    """Raised instead of a read's empty fallback result when its query failed"""
+
+
+@instrumented
 class Database:
     """MySQL Database connection and operations class"""
     
-    def __init__(self, host="localhost", user="root", password="password", database="inventory_db"):
+    def __init__(self, host="localhost", user="root", password="password", database="inventory_db",
+                 allow_negative_stock=None, max_retries=3, retry_backoff=0.05, stats=None,
+                 chunk_size=STOCK_TAKE_CHUNK, statement_cache_size=64):
         self.host = host
         self.user = user
         self.password = password
         self.database = database
         self.connection = None
         self.cursor = None
+        self.statements = None
+        if allow_negative_stock is None:
+            allow_negative_stock = USER_SETTINGS["allow_negative_stock"]
+        self.allow_negative_stock = allow_negative_stock
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.stats = stats or QueryStats()
+        self.chunk_size = chunk_size
+        self.statement_cache_size = statement_cache_size
+    
+    @classmethod
+    def from_settings(cls, settings, stats=None):
+        """Create a Database from a settings.Settings object"""
+        return cls(
+            allow_negative_stock=settings.app.allow_negative_stock,
+            max_retries=settings.database.max_retries,
+            retry_backoff=settings.database.retry_backoff,
+            stats=stats or QueryStats(slow_query_ms=settings.database.slow_query_ms),
+            chunk_size=settings.tuning.fetch_chunk_size,
+            statement_cache_size=settings.database.statement_cache_size,
+            **settings.database.connection()
+        )
+    
+    def apply_settings(self, settings):
+        """Take up reloaded values without reconnecting"""
+        self.allow_negative_stock = settings.app.allow_negative_stock
+        self.max_retries = settings.database.max_retries
+        self.retry_backoff = settings.database.retry_backoff
+        self.stats.slow_query_ms = settings.database.slow_query_ms
+        self.chunk_size = settings.tuning.fetch_chunk_size
+    
+    @property
+    def error_count(self):
+        """Statements that have failed on this connection; a method failed if it went up during the call"""
+        # Prepared statement failures are counted on the cursor too
+        return self.cursor.total_errors if self.cursor else 0
     
     def connect(self):
         """Establish database connection"""
@@ -29,49 +134,97 @@ class Database:
                 database=self.database
             )
             if self.connection.is_connected():
-                self.cursor = self.connection.cursor(dictionary=True)
+                self.cursor = InstrumentedCursor(self.connection.cursor(dictionary=True), self.stats)
+                # Hot statements run as server-side prepared statements
+                self.statements = StatementCache(self.connection, self.stats, self.statement_cache_size, self.cursor)
+                ensure_schema(self.connection)
                 return True
         except Error as e:
-            print(f"Error connecting to MySQL: {e}")
+            logger.error(f"Error connecting to MySQL: {e}")
             return False
     
     def disconnect(self):
         """Close database connection"""
+        if self.statements:
+            self.statements.close()
         if self.cursor:
             self.cursor.close()
         if self.connection and self.connection.is_connected():
             self.connection.close()
     
+    def _run_in_transaction(self, work, *args):
+        """Run work(*args) and commit, retrying with backoff on deadlock or lock timeout"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = work(*args)
+                self.connection.commit()
+                return result
+            except Error as e:
+                self.connection.rollback()
+                if e.errno not in RETRYABLE_ERRORS or attempt == self.max_retries:
+                    raise
+                # Exponential backoff with jitter so contending terminals spread out
+                time.sleep(self.retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+            except Exception:
+                self.connection.rollback()
+                raise
+    
+    def _log_change(self, entity, entity_id, op, payload=None):
+        """Append an event to the change log inside the current transaction"""
+        self.statements.execute(
+            "INSERT INTO change_log (entity, entity_id, op, payload) VALUES (%s, %s, %s, %s)",
+            (entity, entity_id, op, json.dumps(payload or {}, default=str))
+        )
+    
+    def _write_and_log(self, query, params, entity, op, entity_id=None, payload=None):
+        """Run one write statement and log it to the change feed without committing
+        
+        Returns the affected entity id (the new row id for inserts), or None when
+        no row was affected.
+        """
+        self.cursor.execute(query, params)
+        if entity_id is None:
+            entity_id = self.cursor.lastrowid
+        if self.cursor.rowcount == 0:
+            return None
+        self._log_change(entity, entity_id, op, payload)
+        return entity_id
+    
     # ==================== PRODUCT OPERATIONS ====================
     
-    def get_all_products(self, search_term=None, category=None):
-        """Get all products with optional filtering"""
+    def get_all_products(self, search_term=None, category=None, limit=None, offset=0):
+        """Get all products with optional filtering and paging"""
         try:
-            query = """
+            query = Query("""
                 SELECT p.*, c.name as category_name 
                 FROM products p 
                 LEFT JOIN categories c ON p.category_id = c.id
-                WHERE 1=1
-            """
-            params = []
+            """)
             
             if search_term:
-                query += " AND (p.name LIKE %s OR p.sku LIKE %s OR p.description LIKE %s)"
                 search_pattern = f"%{search_term}%"
-                params.extend([search_pattern, search_pattern, search_pattern])
+                query.where("(p.name LIKE %s OR p.sku LIKE %s OR p.description LIKE %s)",
+                            search_pattern, search_pattern, search_pattern)
             
             if category:
-                query += " AND p.category_id = %s"
-                params.append(category)
+                query.where("p.category_id = %s", category)
             
-            query += " ORDER BY p.created_at DESC"
+            query.order_by("p.created_at DESC, p.id DESC")
             
-            self.cursor.execute(query, params)
-            return self.cursor.fetchall()
+            if limit is not None:
+                query.limit(limit, offset)
+            
+            return self.statements.fetchall(*query.build())
         except Error as e:
-            print(f"Error fetching products: {e}")
+            logger.error(f"Error fetching products: {e}")
             return []
     
+    def get_catalogue_version(self):
+        """Get a cheap fingerprint that changes whenever products or categories change"""
+        # Every catalogue write appends to the change log, so its newest id is the version
+        version = self.get_latest_change_id()
+        return None if version is None else str(version)
+    
     def get_product_by_id(self, product_id):
         """Get a single product by ID"""
         try:
@@ -81,85 +234,344 @@ class Database:
                 LEFT JOIN categories c ON p.category_id = c.id
                 WHERE p.id = %s
             """
-            self.cursor.execute(query, (product_id,))
-            return self.cursor.fetchone()
+            return self.statements.fetchone(query, (product_id,))
         except Error as e:
-            print(f"Error fetching product: {e}")
+            logger.error(f"Error fetching product: {e}")
             return None
     
-    def add_product(self, name, sku, description, category_id, quantity, price, min_stock=10):
-        """Add a new product"""
+    def add_product(self, name, sku, description, category_id, quantity, price, min_stock=10, unit_cost=None):
+        """Add a new product; unit_cost values its opening stock (zero when unknown)"""
         try:
             query = """
                 INSERT INTO products (name, sku, description, category_id, quantity, price, min_stock_level)
                 VALUES (%s, %s, %s, %s, %s, %s, %s)
             """
-            self.cursor.execute(query, (name, sku, description, category_id, quantity, price, min_stock))
-            self.connection.commit()
-            return self.cursor.lastrowid
+            payload = {'category_id': category_id, 'quantity': quantity, 'price': price, 'min_stock_level': min_stock}
+            return self._run_in_transaction(
+                self._insert_product_row,
+                query, (name, sku, description, category_id, quantity, price, min_stock), quantity, unit_cost, payload
+            )
         except Error as e:
-            print(f"Error adding product: {e}")
+            logger.error(f"Error adding product: {e}")
             return None
     
-    def update_product(self, product_id, name, sku, description, category_id, quantity, price, min_stock):
-        """Update an existing product"""
+    def _insert_product_row(self, query, params, quantity, unit_cost, payload):
+        """Insert a product and record its opening quantity for the ledger verifier and costing"""
+        product_id = self._write_and_log(query, params, "product", "insert", None, payload)
+        # Opening stock has no ledger row; the verifier starts from this instead
+        self.cursor.execute(
+            "INSERT INTO stock_baselines (product_id, opening_quantity, quantity) VALUES (%s, %s, %s)",
+            (product_id, quantity, quantity)
+        )
+        self._seed_product_costs(product_id, quantity, unit_cost)
+        self._apply_category_changes([(None, payload)])
+        return product_id
+    
+    def update_product(self, product_id, name, sku, description, category_id, quantity, price, min_stock, version=None):
+        """Update an existing product
+        
+        When version is given the update only applies if the row still has that
+        version; otherwise ConcurrentUpdateError is raised.
+        """
         try:
-            query = """
-                UPDATE products 
-                SET name = %s, sku = %s, description = %s, category_id = %s, 
-                    quantity = %s, price = %s, min_stock_level = %s, updated_at = %s
-                WHERE id = %s
-            """
-            self.cursor.execute(query, (name, sku, description, category_id, quantity, price, min_stock, datetime.now(), product_id))
-            self.connection.commit()
-            return True
+            return self._run_in_transaction(
+                self._update_product_row,
+                product_id, name, sku, description, category_id, quantity, price, min_stock, version
+            )
         except Error as e:
-            print(f"Error updating product: {e}")
+            logger.error(f"Error updating product: {e}")
             return False
     
+    def _update_product_row(self, product_id, name, sku, description, category_id, quantity, price, min_stock, version):
+        """Write a product row, checking the row version when given"""
+        old = self._product_figures(product_id, lock=True)
+        query = """
+            UPDATE products 
+            SET name = %s, sku = %s, description = %s, category_id = %s, 
+                quantity = %s, price = %s, min_stock_level = %s, updated_at = %s,
+                version = version + 1
+            WHERE id = %s
+        """
+        params = [name, sku, description, category_id, quantity, price, min_stock, datetime.now(), product_id]
+        if version is not None:
+            query += " AND version = %s"
+            params.append(version)
+        
+        self.cursor.execute(query, params)
+        if self.cursor.rowcount == 0:
+            raise ConcurrentUpdateError(f"Product {product_id} was changed or deleted by another user")
+        if old and quantity != old['quantity']:
+            change = int(quantity) - old['quantity']
+            self._apply_cost(product_id, "IN" if change > 0 else "OUT", abs(change), delta=change)
+        new = {'category_id': category_id, 'quantity': quantity, 'price': price, 'min_stock_level': min_stock}
+        self._apply_category_changes([(old, new)])
+        self._log_change("product", product_id, "update", dict(new, old=old))
+        return True
+    
     def delete_product(self, product_id):
         """Delete a product"""
         try:
-            query = "DELETE FROM products WHERE id = %s"
-            self.cursor.execute(query, (product_id,))
-            self.connection.commit()
+            self._run_in_transaction(self._delete_product_row, product_id)
             return True
         except Error as e:
-            print(f"Error deleting product: {e}")
+            logger.error(f"Error deleting product: {e}")
             return False
     
-    def update_stock(self, product_id, quantity_change):
-        """Update product stock quantity"""
+    def _delete_product_row(self, product_id):
+        """Delete a product and log its last figures without committing"""
+        old = self._product_figures(product_id, lock=True)
+        # The cascade drops the product's product_stock rows; take them off their locations first
+        self.cursor.execute(
+            "SELECT location_id, quantity FROM product_stock WHERE product_id = %s ORDER BY location_id FOR UPDATE",
+            (product_id,)
+        )
+        stock = self.cursor.fetchall()
+        if stock:
+            # Location rows are locked in id order, as in transfers
+            self.cursor.executemany(
+                "UPDATE locations SET total_units = total_units - %s, sku_count = sku_count - %s WHERE id = %s",
+                [(row['quantity'], int(row['quantity'] != 0), row['location_id']) for row in stock]
+            )
+        query = "DELETE FROM products WHERE id = %s"
+        deleted = self._write_and_log(query, (product_id,), "product", "delete", product_id, {'old': old})
+        if deleted:
+            self._apply_category_changes([(old, None)])
+        return deleted
+    
+    def _product_figures(self, product_id, lock=False):
+        """Get the fields delta consumers need (quantity, price, min level, category)"""
+        query = "SELECT quantity, price, min_stock_level, category_id FROM products WHERE id = %s"
+        if lock:
+            query += " FOR UPDATE"
+        return self.statements.fetchone(query, (product_id,))
+    
+    def update_stock(self, product_id, quantity_change, location_id=None):
+        """Update product stock quantity, optionally at a specific location"""
         try:
-            query = """
-                UPDATE products 
-                SET quantity = quantity + %s, updated_at = %s
-                WHERE id = %s
-            """
-            self.cursor.execute(query, (quantity_change, datetime.now(), product_id))
-            self.connection.commit()
+            return self._run_in_transaction(self._adjust_stock, product_id, quantity_change, location_id)
+        except Error as e:
+            logger.error(f"Error updating stock: {e}")
+            return False
+    
+    def _adjust_stock(self, product_id, quantity_change, location_id=None):
+        """Apply a stock change without a ledger row and log it, without committing"""
+        self._apply_stock_change(product_id, quantity_change, location_id)
+        if quantity_change:
+            self._apply_cost(product_id, "IN" if quantity_change > 0 else "OUT", abs(quantity_change))
+        self._log_stock_change(product_id, quantity_change, location_id)
+        return True
+    
+    def _log_stock_change(self, product_id, quantity_change, location_id=None, transaction_id=None,
+                          created_at=None):
+        """Log a product stock change with the row's new figures for delta consumers
+        
+        created_at is the ledger row's date when it was recorded earlier (offline
+        or queued), so consumers do not count it as a movement made today.
+        """
+        row = self._product_figures(product_id) or {}
+        # The category totals are kept here, where every stock change already reads the new figures
+        if row and quantity_change:
+            self._apply_category_changes([(dict(row, quantity=row['quantity'] - quantity_change), row)])
+        payload = {
+            'delta': quantity_change,
+            'quantity': row.get('quantity'),
+            'price': row.get('price'),
+            'min_stock_level': row.get('min_stock_level'),
+            'category_id': row.get('category_id'),
+            'location_id': location_id,
+            'transaction_id': transaction_id,
+        }
+        if created_at is not None:
+            payload['created_at'] = created_at
+        self._log_change("product", product_id, "stock", payload)
+    
+    def _apply_stock_change(self, product_id, quantity_change, location_id=None):
+        """Apply a stock change to the product total and location without committing
+        
+        Decrements are conditional on enough stock unless negative stock is
+        allowed, so concurrent OUT movements can never oversell.
+        """
+        query = """
+            UPDATE products 
+            SET quantity = quantity + %s, updated_at = %s, version = version + 1
+            WHERE id = %s
+        """
+        params = [quantity_change, datetime.now(), product_id]
+        guarded = quantity_change < 0 and not self.allow_negative_stock
+        if guarded:
+            query += " AND quantity >= %s"
+            params.append(-quantity_change)
+        
+        cursor, _ = self.statements.execute(query, params)
+        if guarded and cursor.rowcount == 0:
+            raise InsufficientStockError(f"Not enough stock for product {product_id}")
+        
+        if location_id:
+            self._apply_location_change(product_id, location_id, quantity_change)
+        return True
+    
+    def _apply_location_change(self, product_id, location_id, quantity_change):
+        """Apply a stock change to one location and its maintained totals without committing"""
+        # One upsert, so two first stockings of the same row cannot deadlock on the gap or collide
+        self.statements.execute(
+            "INSERT INTO product_stock (product_id, location_id, quantity) VALUES (%s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE quantity = quantity + VALUES(quantity)",
+            (product_id, location_id, quantity_change)
+        )
+        # The row is now locked by this transaction, so this reads its own write
+        new_quantity = self.statements.fetchone(
+            "SELECT quantity FROM product_stock WHERE product_id = %s AND location_id = %s",
+            (product_id, location_id)
+        )['quantity']
+        old_quantity = new_quantity - quantity_change
+        
+        # sku_count tracks products with non-zero stock at the location
+        if new_quantity < 0 and not self.allow_negative_stock:
+            raise InsufficientStockError(f"Not enough stock for product {product_id} at location {location_id}")
+        sku_change = int(new_quantity != 0) - int(old_quantity != 0)
+        
+        self.statements.execute(
+            "UPDATE locations SET total_units = total_units + %s, sku_count = sku_count + %s WHERE id = %s",
+            (quantity_change, sku_change, location_id)
+        )
+    
+    def get_low_stock_products(self, location_id=None):
+        """Get products with stock below minimum level, overall or at one location"""
+        try:
+            if location_id:
+                query = """
+                    SELECT p.id, p.sku, p.name, p.category_id, p.price, p.min_stock_level,
+                           ps.quantity, c.name as category_name
+                    FROM product_stock ps
+                    JOIN products p ON ps.product_id = p.id
+                    LEFT JOIN categories c ON p.category_id = c.id
+                    WHERE ps.location_id = %s AND ps.quantity <= p.min_stock_level
+                    ORDER BY ps.quantity ASC
+                """
+                self.cursor.execute(query, (location_id,))
+            else:
+                query = """
+                    SELECT p.*, c.name as category_name 
+                    FROM products p 
+                    LEFT JOIN categories c ON p.category_id = c.id
+                    WHERE p.quantity <= p.min_stock_level
+                    ORDER BY p.quantity ASC
+                """
+                self.cursor.execute(query)
+            return self.cursor.fetchall()
+        except Error as e:
+            logger.error(f"Error fetching low stock products: {e}")
+            return []
+    
+    # ==================== LOCATION OPERATIONS ====================
+    
+    def get_all_locations(self):
+        """Get all locations with their maintained stock totals"""
+        try:
+            query = "SELECT * FROM locations ORDER BY name"
+            self.cursor.execute(query)
+            return self.cursor.fetchall()
+        except Error as e:
+            logger.error(f"Error fetching locations: {e}")
+            return []
+    
+    def add_location(self, name, description=""):
+        """Add a new location"""
+        try:
+            query = "INSERT INTO locations (name, description) VALUES (%s, %s)"
+            return self._run_in_transaction(self._write_and_log, query, (name, description), "location", "insert")
+        except Error as e:
+            logger.error(f"Error adding location: {e}")
+            return None
+    
+    def update_location(self, location_id, name, description):
+        """Update a location"""
+        try:
+            query = "UPDATE locations SET name = %s, description = %s WHERE id = %s"
+            self._run_in_transaction(
+                self._write_and_log, query, (name, description, location_id), "location", "update", location_id
+            )
             return True
         except Error as e:
-            print(f"Error updating stock: {e}")
+            logger.error(f"Error updating location: {e}")
+            return False
+    
+    def delete_location(self, location_id):
+        """Delete a location that holds no stock"""
+        try:
+            query = "DELETE FROM locations WHERE id = %s AND total_units = 0"
+            deleted = self._run_in_transaction(
+                self._write_and_log, query, (location_id,), "location", "delete", location_id
+            )
+            return deleted is not None
+        except Error as e:
+            logger.error(f"Error deleting location: {e}")
             return False
     
-    def get_low_stock_products(self):
-        """Get products with stock below minimum level"""
+    def get_stock_by_location(self, product_id):
+        """Get a product's stock broken down by location"""
         try:
             query = """
-                SELECT p.*, c.name as category_name 
-                FROM products p 
+                SELECT l.id as location_id, l.name as location_name, ps.quantity
+                FROM product_stock ps
+                JOIN locations l ON ps.location_id = l.id
+                WHERE ps.product_id = %s
+                ORDER BY l.name
+            """
+            self.cursor.execute(query, (product_id,))
+            return self.cursor.fetchall()
+        except Error as e:
+            logger.error(f"Error fetching stock by location: {e}")
+            return []
+    
+    def get_location_products(self, location_id):
+        """Get all products stocked at a location"""
+        try:
+            query = """
+                SELECT p.id, p.sku, p.name, p.price, p.min_stock_level,
+                       ps.quantity, c.name as category_name
+                FROM product_stock ps
+                JOIN products p ON ps.product_id = p.id
                 LEFT JOIN categories c ON p.category_id = c.id
-                WHERE p.quantity <= p.min_stock_level
-                ORDER BY p.quantity ASC
+                WHERE ps.location_id = %s
+                ORDER BY p.name
             """
-            self.cursor.execute(query)
+            self.cursor.execute(query, (location_id,))
             return self.cursor.fetchall()
         except Error as e:
-            print(f"Error fetching low stock products: {e}")
+            logger.error(f"Error fetching location products: {e}")
             return []
     
-  ===== CATEGORY OPERATIONS ===
+    def transfer_stock(self, product_id, from_location_id, to_location_id, quantity, notes="", user="Admin"):
+        """Move stock between two locations atomically"""
+        if from_location_id == to_location_id or quantity <= 0:
+            return None
+        if not notes:
+            notes = f"Transfer {from_location_id} -> {to_location_id}"
+        try:
+            return self._run_in_transaction(
+                self._record_transfer, product_id, from_location_id, to_location_id, quantity, notes, user
+            )
+        except Error as e:
+            logger.error(f"Error transferring stock: {e}")
+            return None
+    
+    def _record_transfer(self, product_id, from_location_id, to_location_id, quantity, notes, user):
+        """Write both legs of a transfer without committing"""
+        out_id = self._insert_ledger_row(product_id, "OUT", quantity, notes, user, from_location_id)
+        in_id = self._insert_ledger_row(product_id, "IN", quantity, notes, user, to_location_id)
+        
+        # Lock location rows in a fixed order so opposite transfers cannot deadlock
+        changes = sorted([(from_location_id, -quantity), (to_location_id, quantity)])
+        for location_id, change in changes:
+            self._apply_location_change(product_id, location_id, change)
+        self._log_change("product", product_id, "transfer", {
+            'from_location_id': from_location_id, 'to_location_id': to_location_id,
+            'quantity': quantity, 'transaction_ids': [out_id, in_id]
+        })
+        return out_id, in_id
+    
+    # ==================== CATEGORY OPERATIONS ====================
     
     def get_all_categories(self):
         """Get all categories"""
@@ -168,128 +580,1448 @@ class Database:
             self.cursor.execute(query)
             return self.cursor.fetchall()
         except Error as e:
-            print(f"Error fetching categories: {e}")
+            logger.error(f"Error fetching categories: {e}")
             return []
     
     def add_category(self, name, description=""):
         """Add a new category"""
         try:
             query = "INSERT INTO categories (name, description) VALUES (%s, %s)"
-            self.cursor.execute(query, (name, description))
-            self.connection.commit()
-            return self.cursor.lastrowid
+            return self._run_in_transaction(self._write_and_log, query, (name, description), "category", "insert")
         except Error as e:
-            print(f"Error adding category: {e}")
+            logger.error(f"Error adding category: {e}")
             return None
     
     def update_category(self, category_id, name, description):
         """Update a category"""
         try:
             query = "UPDATE categories SET name = %s, description = %s WHERE id = %s"
-            self.cursor.execute(query, (name, description, category_id))
-            self.connection.commit()
+            self._run_in_transaction(
+                self._write_and_log, query, (name, description, category_id), "category", "update", category_id
+            )
             return True
         except Error as e:
-            print(f"Error updating category: {e}")
+            logger.error(f"Error updating category: {e}")
             return False
     
+    def _apply_category_changes(self, changes):
+        """Update the maintained category totals for (old figures, new figures) pairs without committing
+        
+        Either side is None for an inserted or deleted product. Figures are a
+        product's quantity, price, min level and category; products without a
+        category are not counted anywhere.
+        """
+        deltas = {}
+        for old, new in changes:
+            for figures, sign in ((new, 1), (old, -1)):
+                if not figures or not figures.get('category_id'):
+                    continue
+                quantity = int(figures['quantity'] or 0)
+                delta = deltas.setdefault(int(figures['category_id']), [0, 0, Decimal(0), 0])
+                delta[0] += sign
+                delta[1] += sign * quantity
+                delta[2] += sign * quantity * Decimal(str(figures['price'] or 0))
+                delta[3] += sign * int(quantity <= int(figures['min_stock_level'] or 0))
+        rows = [tuple(delta) + (category_id,) for category_id, delta in sorted(deltas.items()) if any(delta)]
+        if rows:
+            # Sorted by id, so concurrent writers lock category rows in the same order
+            self.cursor.executemany("""
+                UPDATE categories
+                SET product_count = product_count + %s, total_units = total_units + %s,
+                    stock_value = stock_value + %s, low_stock_count = low_stock_count + %s
+                WHERE id = %s
+            """, rows)
+    
+    def get_category_totals(self):
+        """Get every category with its maintained product count, units, stock value and low stock count"""
+        try:
+            self.cursor.execute("""
+                SELECT id, name, product_count, total_units, stock_value, low_stock_count
+                FROM categories
+                ORDER BY name
+            """)
+            return self.cursor.fetchall()
+        except Error as e:
+            logger.error(f"Error fetching category totals: {e}")
+            return []
+    
+    def rebuild_category_totals(self):
+        """Recompute the category totals from the products table
+        
+        A safety net for writes that bypass Database (imports, manual SQL).
+        Returns the number of categories whose totals had drifted, or None on
+        error.
+        """
+        try:
+            return self._run_in_transaction(self._rebuild_category_totals)
+        except Error as e:
+            logger.error(f"Error rebuilding category totals: {e}")
+            return None
+    
+    def _rebuild_category_totals(self):
+        """Overwrite drifted category totals without committing"""
+        self.cursor.execute("""
+            UPDATE categories c
+            LEFT JOIN (
+                SELECT category_id, COUNT(*) as products, SUM(quantity) as units, SUM(quantity * price) as value,
+                       SUM(quantity <= min_stock_level) as low
+                FROM products
+                WHERE category_id IS NOT NULL
+                GROUP BY category_id
+            ) t ON t.category_id = c.id
+            SET c.product_count = COALESCE(t.products, 0), c.total_units = COALESCE(t.units, 0),
+                c.stock_value = COALESCE(t.value, 0), c.low_stock_count = COALESCE(t.low, 0)
+            WHERE NOT (c.product_count <=> COALESCE(t.products, 0) AND c.total_units <=> COALESCE(t.units, 0)
+                       AND c.stock_value <=> COALESCE(t.value, 0) AND c.low_stock_count <=> COALESCE(t.low, 0))
+        """)
+        drifted = self.cursor.rowcount
+        if drifted:
+            logger.warning(f"Rebuilt totals for {drifted} categories that had drifted")
+        return drifted
+    
     def delete_category(self, category_id):
         """Delete a category"""
         try:
             query = "DELETE FROM categories WHERE id = %s"
-            self.cursor.execute(query, (category_id,))
-            self.connection.commit()
+            self._run_in_transaction(self._write_and_log, query, (category_id,), "category", "delete", category_id)
             return True
         except Error as e:
-            print(f"Error deleting category: {e}")
+            logger.error(f"Error deleting category: {e}")
             return False
     
-    # ===== TRANSACTION OPERATIONS ======
+    # ==================== TRANSACTION OPERATIONS ====================
     
-    def add_transaction(self, product_id, transaction_type, quantity, notes="", user="Admin"):
-        """Add a stock transaction (in/out)"""
+    def add_transaction(self, product_id, transaction_type, quantity, notes="", user="Admin", location_id=None,
+                        unit_cost=None):
+        """Add a stock transaction (in/out), optionally at a specific location
+        
+        unit_cost is the purchase cost of an IN movement; without it the stock
+        is received at the product's current average cost. Raises
+        InsufficientStockError when an OUT movement would oversell and
+        negative stock is not allowed.
+        """
         try:
-            query = """
-                INSERT INTO transactions (product_id, transaction_type, quantity, notes, user)
-                VALUES (%s, %s, %s, %s, %s)
-            """
-            self.cursor.execute(query, (product_id, transaction_type, quantity, notes, user))
+            return self._run_in_transaction(
+                self._record_movement, product_id, transaction_type, quantity, notes, user, location_id,
+                None, None, unit_cost
+            )
+        except Error as e:
+            logger.error(f"Error adding transaction: {e}")
+            return None
+    
+    def apply_movements(self, movements):
+        """Apply movements recorded elsewhere (the offline journal) in one transaction
+        
+        Each movement is a dict with key, product_id, transaction_type, quantity,
+        notes, user, location_id and created_at. The key is stored with the ledger
+        row, so a movement that was already applied is skipped rather than applied
+        twice. Movements that cannot be applied (not enough stock, product or
+        location gone, values the columns do not accept) are rejected without
+        affecting the rest of the batch.
+        
+        Returns (applied keys, {key: reason} for rejected movements), or None on
+        a lock conflict or connection failure so the caller can retry the whole
+        batch.
+        """
+        try:
+            return self._run_in_transaction(self._apply_movements, movements)
+        except Error as e:
+            logger.error(f"Error applying movements: {e}")
+            return None
+    
+    def _apply_movements(self, movements):
+        """Apply a batch of keyed movements without committing"""
+        if not movements:
+            return [], {}
+        keys = [m['key'] for m in movements]
+        placeholders = ", ".join(["%s"] * len(keys))
+        self.cursor.execute(f"SELECT idempotency_key FROM transactions WHERE idempotency_key IN ({placeholders})", keys)
+        done = {row['idempotency_key'] for row in self.cursor.fetchall()}
+        
+        applied = []
+        rejected = {}
+        for m in movements:
+            if m['key'] not in done:
+                self.cursor.execute("SAVEPOINT movement")
+                try:
+                    self._record_movement(m['product_id'], m['transaction_type'], m['quantity'], m['notes'],
+                                          m['user'], m['location_id'], m['key'], m['created_at'], m.get('unit_cost'))
+                except InsufficientStockError as e:
+                    self.cursor.execute("ROLLBACK TO SAVEPOINT movement")
+                    rejected[m['key']] = str(e)
+                    continue
+                except Error as e:
+                    # Only locks and the connection can clear up; any other error would fail every retry
+                    if is_transient_error(e):
+                        raise
+                    self.cursor.execute("ROLLBACK TO SAVEPOINT movement")
+                    if e.errno == 1062 and "idempotency_key" in (e.msg or ""):
+                        # Committed by another syncer since the check above: already applied
+                        done.add(m['key'])
+                        applied.append(m['key'])
+                    elif e.errno == 1452:
+                        rejected[m['key']] = "Product or location no longer exists"
+                    else:
+                        rejected[m['key']] = f"Refused by the database: {e.msg}"
+                    continue
+                done.add(m['key'])
+            applied.append(m['key'])
+        return applied, rejected
+    
+    def _record_movement(self, product_id, transaction_type, quantity, notes, user, location_id=None,
+                         idempotency_key=None, created_at=None, unit_cost=None):
+        """Apply a movement to stock and costs and write its ledger row without committing"""
+        # Stock first: the guarded decrement decides whether the movement is allowed
+        if transaction_type == "IN":
+            self._apply_stock_change(product_id, quantity, location_id)
+        elif transaction_type == "OUT":
+            self._apply_stock_change(product_id, -quantity, location_id)
+        unit_cost = self._apply_cost(product_id, transaction_type, quantity, unit_cost)
+        
+        transaction_id = self._insert_ledger_row(
+            product_id, transaction_type, quantity, notes, user, location_id, idempotency_key, created_at, unit_cost
+        )
+        delta = quantity if transaction_type == "IN" else -quantity
+        self._log_stock_change(product_id, delta, location_id, transaction_id, created_at)
+        return transaction_id
+    
+    def _insert_ledger_row(self, product_id, transaction_type, quantity, notes, user, location_id=None,
+                           idempotency_key=None, created_at=None, unit_cost=None):
+        """Insert a row into the transactions ledger without committing"""
+        query = """
+            INSERT INTO transactions
+                (product_id, transaction_type, quantity, notes, user, location_id, idempotency_key, created_at,
+                 unit_cost)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, COALESCE(%s, CURRENT_TIMESTAMP), %s)
+        """
+        cursor, _ = self.statements.execute(
+            query,
+            (product_id, transaction_type, quantity, notes, user, location_id, idempotency_key, created_at, unit_cost)
+        )
+        return cursor.lastrowid
+    
+    def get_transactions(self, product_id=None, limit=100, location_id=None, since_id=None, start=None, end=None):
+        """Get transaction history, newest first
+        
+        since_id limits it to newer transactions, start and end to a created_at
+        range. Archived rows are read only when the hot table cannot fill the
+        request and the range reaches back past the archive cutoff.
+        """
+        try:
+            rows = self._query_ledger("transactions", product_id, limit, location_id, since_id, start, end)
+            if since_id is None and len(rows) < limit:
+                cutoff = self.get_archive_cutoff()
+                if cutoff is not None and (start is None or start < cutoff):
+                    rows += self._query_ledger(
+                        "transactions_archive", product_id, limit - len(rows), location_id, None, start, end
+                    )
+            return rows
+        except Error as e:
+            logger.error(f"Error fetching transactions: {e}")
+            return []
+    
+    def _query_ledger(self, table, product_id, limit, location_id, since_id, start, end):
+        """Read one ledger table (hot or archive) with the get_transactions filters"""
+        query = Query(f"""
+            SELECT t.*, p.name as product_name, p.sku, l.name as location_name
+            FROM {table} t
+            JOIN products p ON t.product_id = p.id
+            LEFT JOIN locations l ON t.location_id = l.id
+        """)
+        
+        if product_id:
+            query.where("t.product_id = %s", product_id)
+        
+        if location_id:
+            query.where("t.location_id = %s", location_id)
+        
+        if start:
+            query.where("t.created_at >= %s", start)
+        
+        if end:
+            query.where("t.created_at < %s", end)
+        
+        if since_id is not None:
+            query.where("t.id > %s", since_id).order_by("t.id DESC")
+        else:
+            query.order_by("t.created_at DESC, t.id DESC")
+        
+        return self.statements.fetchall(*query.limit(limit).build())
+    
+    # ==================== BULK EDITS ====================
+    
+    def _bulk_edit_columns(self, changes):
+        """SQL selecting the new price, category and min level for changes, with its parameters
+        
+        changes may hold 'price': (rule, value) with rule "percent", "amount"
+        or "set"; 'category_id' (None moves to no category); and 'min_stock':
+        (rule, value) with rule "amount" or "set".
+        """
+        params = []
+        price = "p.price"
+        if changes.get('price'):
+            rule, value = changes['price']
+            if rule not in BULK_PRICE_RULES:
+                raise ValueError(f"Unknown price rule: {rule}")
+            price = BULK_PRICE_RULES[rule]
+            params.append(value)
+        category = "p.category_id"
+        if 'category_id' in changes:
+            category = "%s"
+            params.append(changes['category_id'])
+        min_stock = "p.min_stock_level"
+        if changes.get('min_stock'):
+            rule, value = changes['min_stock']
+            if rule not in BULK_MIN_STOCK_RULES:
+                raise ValueError(f"Unknown min stock rule: {rule}")
+            min_stock = BULK_MIN_STOCK_RULES[rule]
+            params.append(value)
+        return f"{price} AS new_price, {category} AS new_category_id, {min_stock} AS new_min_stock_level", params
+    
+    def _bulk_edit_scopes(self, selection):
+        """Yield (condition, params) covering the selected products; id lists come in chunks
+        
+        selection is {'ids': [...]} or a filter with any of 'search',
+        'category_id', 'min_price' and 'max_price'.
+        """
+        if 'ids' in selection:
+            ids = selection['ids']
+            for start in range(0, len(ids), self.chunk_size):
+                chunk = list(ids[start:start + self.chunk_size])
+                yield f"p.id IN ({', '.join(['%s'] * len(chunk))})", chunk
+            return
+        conditions, params = ["1 = 1"], []
+        if selection.get('search'):
+            pattern = f"%{selection['search']}%"
+            conditions.append("(p.name LIKE %s OR p.sku LIKE %s OR p.description LIKE %s)")
+            params += [pattern, pattern, pattern]
+        if selection.get('category_id'):
+            conditions.append("p.category_id = %s")
+            params.append(selection['category_id'])
+        if selection.get('min_price') is not None:
+            conditions.append("p.price >= %s")
+            params.append(selection['min_price'])
+        if selection.get('max_price') is not None:
+            conditions.append("p.price <= %s")
+            params.append(selection['max_price'])
+        yield " AND ".join(conditions), params
+    
+    def _bulk_edit_select(self, columns, condition):
+        """Old and new values for the products matching condition that the edit would change"""
+        return f"""
+            SELECT product_id, old_price, old_category_id, old_min_stock_level, edited_version,
+                   new_price, new_category_id, new_min_stock_level
+            FROM (
+                SELECT p.id AS product_id, p.price AS old_price, p.category_id AS old_category_id,
+                       p.min_stock_level AS old_min_stock_level, p.version + 1 AS edited_version, {columns}
+                FROM products p
+                WHERE {condition}
+            ) edit
+            WHERE NOT (new_price <=> old_price AND new_category_id <=> old_category_id
+                       AND new_min_stock_level <=> old_min_stock_level)
+        """
+    
+    def preview_bulk_edit(self, selection, changes, limit=200):
+        """Count the products a bulk edit would change and get the first few, before and after"""
+        try:
+            columns, column_params = self._bulk_edit_columns(changes)
+            count, rows = 0, []
+            for condition, params in self._bulk_edit_scopes(selection):
+                select = self._bulk_edit_select(columns, condition)
+                self.cursor.execute(f"SELECT COUNT(*) as count FROM ({select}) edits", column_params + params)
+                count += self.cursor.fetchone()['count']
+                if len(rows) < limit:
+                    self.cursor.execute(f"""
+                        SELECT e.*, p.sku, p.name, oc.name as old_category, nc.name as new_category
+                        FROM ({select}) e
+                        JOIN products p ON p.id = e.product_id
+                        LEFT JOIN categories oc ON oc.id = e.old_category_id
+                        LEFT JOIN categories nc ON nc.id = e.new_category_id
+                        ORDER BY p.name, p.id
+                        LIMIT %s
+                    """, column_params + params + [limit - len(rows)])
+                    rows.extend(self.cursor.fetchall())
+            return {'count': count, 'rows': rows}
+        except Error as e:
+            logger.error(f"Error previewing bulk edit: {e}")
+            return None
+    
+    def bulk_edit_products(self, selection, changes, user="Admin"):
+        """Apply a bulk edit to every selected product in one transaction
+        
+        The edit runs as set-based statements, whatever the number of products,
+        and is recorded so it can be undone. Returns (bulk edit id, products
+        changed), or None on error.
+        """
+        try:
+            return self._run_in_transaction(self._apply_bulk_edit, selection, changes, user)
+        except Error as e:
+            logger.error(f"Error applying bulk edit: {e}")
+            return None
+    
+    def _apply_bulk_edit(self, selection, changes, user):
+        """Record, apply and log a bulk edit without committing"""
+        self.cursor.execute(
+            "INSERT INTO bulk_edits (user, selection, changes) VALUES (%s, %s, %s)",
+            (user, json.dumps(selection, default=str), json.dumps(changes, default=str))
+        )
+        bulk_edit_id = self.cursor.lastrowid
+        columns, column_params = self._bulk_edit_columns(changes)
+        
+        # The saved old and new values drive the update, the change log and undo
+        for condition, params in self._bulk_edit_scopes(selection):
+            self.cursor.execute(f"""
+                INSERT INTO bulk_edit_rows
+                    (bulk_edit_id, product_id, old_price, old_category_id, old_min_stock_level, edited_version,
+                     new_price, new_category_id, new_min_stock_level)
+                SELECT %s, e.* FROM ({self._bulk_edit_select(columns, condition)}) e
+            """, [bulk_edit_id] + column_params + params)
+        
+        self.cursor.execute("""
+            UPDATE products p
+            JOIN bulk_edit_rows r ON r.product_id = p.id
+            SET p.price = r.new_price, p.category_id = r.new_category_id,
+                p.min_stock_level = r.new_min_stock_level, p.updated_at = %s, p.version = r.edited_version
+            WHERE r.bulk_edit_id = %s
+        """, (datetime.now(), bulk_edit_id))
+        count = self.cursor.rowcount
+        self._bulk_edit_category_changes(bulk_edit_id, restored=False)
+        self._log_bulk_edit_rows(bulk_edit_id, restored=False)
+        self.cursor.execute("UPDATE bulk_edits SET product_count = %s WHERE id = %s", (count, bulk_edit_id))
+        return bulk_edit_id, count
+    
+    def _bulk_edit_category_changes(self, bulk_edit_id, restored):
+        """Move edited (or restored) rows between the category totals in one statement"""
+        new, old = ("old", "new") if restored else ("new", "old")
+        self.cursor.execute(f"""
+            UPDATE categories c
+            JOIN (
+                SELECT category_id, SUM(products) as products, SUM(units) as units, SUM(value) as value,
+                       SUM(low) as low
+                FROM (
+                    SELECT r.{new}_category_id as category_id, 1 as products, p.quantity as units,
+                           p.quantity * r.{new}_price as value, p.quantity <= r.{new}_min_stock_level as low
+                    FROM bulk_edit_rows r JOIN products p ON p.id = r.product_id
+                    WHERE r.bulk_edit_id = %s AND r.restored = %s
+                    UNION ALL
+                    SELECT r.{old}_category_id, -1, -p.quantity,
+                           -p.quantity * r.{old}_price, -(p.quantity <= r.{old}_min_stock_level)
+                    FROM bulk_edit_rows r JOIN products p ON p.id = r.product_id
+                    WHERE r.bulk_edit_id = %s AND r.restored = %s
+                ) moves
+                WHERE category_id IS NOT NULL
+                GROUP BY category_id
+            ) d ON d.category_id = c.id
+            SET c.product_count = c.product_count + d.products, c.total_units = c.total_units + d.units,
+                c.stock_value = c.stock_value + d.value, c.low_stock_count = c.low_stock_count + d.low
+        """, (bulk_edit_id, int(restored), bulk_edit_id, int(restored)))
+    
+    def _log_bulk_edit_rows(self, bulk_edit_id, restored):
+        """Log a product update per edited (or restored) row in one statement, with the figures delta consumers need"""
+        new, old = ("old", "new") if restored else ("new", "old")
+        self.cursor.execute(f"""
+            INSERT INTO change_log (entity, entity_id, op, payload)
+            SELECT 'product', p.id, 'update', JSON_OBJECT(
+                'category_id', r.{new}_category_id, 'quantity', p.quantity, 'price', r.{new}_price,
+                'min_stock_level', r.{new}_min_stock_level, 'bulk_edit_id', r.bulk_edit_id,
+                'old', JSON_OBJECT(
+                    'quantity', p.quantity, 'price', r.{old}_price,
+                    'min_stock_level', r.{old}_min_stock_level, 'category_id', r.{old}_category_id
+                )
+            )
+            FROM bulk_edit_rows r
+            JOIN products p ON p.id = r.product_id
+            WHERE r.bulk_edit_id = %s AND r.restored = %s
+            ORDER BY r.product_id
+        """, (bulk_edit_id, int(restored)))
+    
+    def undo_bulk_edit(self, bulk_edit_id):
+        """Put back the values a bulk edit replaced
+        
+        Products changed again since the edit are left as they are. Returns
+        (restored, skipped), or None on error or if the edit was already undone.
+        """
+        try:
+            return self._run_in_transaction(self._undo_bulk_edit, bulk_edit_id)
+        except Error as e:
+            logger.error(f"Error undoing bulk edit: {e}")
+            return None
+    
+    def _undo_bulk_edit(self, bulk_edit_id):
+        """Restore a bulk edit's old values without committing"""
+        self.cursor.execute(
+            "SELECT product_count, undone_at FROM bulk_edits WHERE id = %s FOR UPDATE", (bulk_edit_id,)
+        )
+        edit = self.cursor.fetchone()
+        if edit is None or edit['undone_at'] is not None:
+            return None
+        
+        # Only rows still at the version the edit wrote are restored
+        self.cursor.execute("""
+            UPDATE products p
+            JOIN bulk_edit_rows r ON r.product_id = p.id
+            SET p.price = r.old_price, p.category_id = r.old_category_id,
+                p.min_stock_level = r.old_min_stock_level, p.updated_at = %s, p.version = p.version + 1,
+                r.restored = 1
+            WHERE r.bulk_edit_id = %s AND p.version = r.edited_version
+        """, (datetime.now(), bulk_edit_id))
+        self.cursor.execute(
+            "SELECT COUNT(*) as restored FROM bulk_edit_rows WHERE bulk_edit_id = %s AND restored = 1",
+            (bulk_edit_id,)
+        )
+        restored = self.cursor.fetchone()['restored']
+        self._bulk_edit_category_changes(bulk_edit_id, restored=True)
+        self._log_bulk_edit_rows(bulk_edit_id, restored=True)
+        self.cursor.execute(
+            "UPDATE bulk_edits SET undone_at = %s, restored_count = %s WHERE id = %s",
+            (datetime.now(), restored, bulk_edit_id)
+        )
+        return restored, edit['product_count'] - restored
+    
+    def get_bulk_edits(self, limit=20):
+        """Get the most recent bulk edits, newest first"""
+        try:
+            self.cursor.execute("""
+                SELECT id, user, selection, changes, product_count, restored_count, created_at, undone_at
+                FROM bulk_edits
+                ORDER BY id DESC
+                LIMIT %s
+            """, (limit,))
+            edits = self.cursor.fetchall()
+            for edit in edits:
+                edit['selection'] = json.loads(edit['selection'] or "{}")
+                edit['changes'] = json.loads(edit['changes'] or "{}")
+            return edits
+        except Error as e:
+            logger.error(f"Error fetching bulk edits: {e}")
+            return []
+    
+    # ==================== COSTING ====================
+    
+    def _seed_product_costs(self, product_id, on_hand, unit_cost=None):
+        """Start costing a product with on_hand units in one opening layer, without committing"""
+        unit_cost = Decimal(str(unit_cost or 0))
+        self.cursor.execute("""
+            INSERT INTO product_costs (product_id, on_hand, average_cost, fifo_value) VALUES (%s, %s, %s, %s)
+        """, (product_id, on_hand, unit_cost, unit_cost * max(on_hand, 0)))
+        if on_hand > 0:
+            self.cursor.execute(
+                "INSERT INTO cost_layers (product_id, quantity, remaining, unit_cost) VALUES (%s, %s, %s, %s)",
+                (product_id, on_hand, on_hand, unit_cost)
+            )
+        return {'on_hand': on_hand, 'average_cost': unit_cost, 'fifo_value': unit_cost * max(on_hand, 0),
+                'fifo_cogs': Decimal(0), 'average_cogs': Decimal(0)}
+    
+    def _product_costs(self, product_id, delta):
+        """Lock a product's cost figures; products costed for the first time are seeded
+        
+        delta is the stock change already applied to products.quantity by the
+        current movement, so the seed is the quantity from before it.
+        """
+        costs = self.statements.fetchone(
+            "SELECT on_hand, average_cost, fifo_value, fifo_cogs, average_cogs FROM product_costs "
+            "WHERE product_id = %s FOR UPDATE", (product_id,)
+        )
+        if costs is not None:
+            return costs
+        row = self.statements.fetchone("SELECT quantity FROM products WHERE id = %s", (product_id,))
+        # Stock from before costing started has no known cost
+        return self._seed_product_costs(product_id, (row['quantity'] if row else 0) - delta)
+    
+    def _apply_cost(self, product_id, transaction_type, quantity, unit_cost=None, delta=None):
+        """Update a product's FIFO layers and moving average for one movement, without committing
+        
+        Only the product's own figures and its oldest open layers are touched,
+        so the cost of a movement never depends on how long the history is.
+        Returns the unit cost of the movement: the receipt cost for IN, the
+        FIFO cost per unit for OUT.
+        """
+        if delta is None:
+            delta = quantity if transaction_type == "IN" else -quantity
+        costs = self._product_costs(product_id, delta)
+        on_hand = costs['on_hand']
+        average = Decimal(costs['average_cost'])
+        fifo_value = Decimal(costs['fifo_value'])
+        fifo_cogs = Decimal(costs['fifo_cogs'])
+        average_cogs = Decimal(costs['average_cogs'])
+        
+        if transaction_type == "IN":
+            cost = average if unit_cost is None else Decimal(str(unit_cost))
+            # Units that cover earlier overselling never join a layer
+            layered = quantity - min(quantity, max(0, -on_hand))
+            if layered:
+                self.statements.execute(
+                    "INSERT INTO cost_layers (product_id, quantity, remaining, unit_cost) VALUES (%s, %s, %s, %s)",
+                    (product_id, layered, layered, cost)
+                )
+            if on_hand <= 0:
+                average = cost
+            else:
+                average = ((on_hand * average + quantity * cost) / (on_hand + quantity)).quantize(Decimal("0.000001"))
+            fifo_value += layered * cost
+            on_hand += quantity
+        else:
+            consumed, shortfall = self._consume_layers(product_id, quantity)
+            fifo_value -= consumed
+            # Oversold units have no layer; they are costed at the average
+            consumed += shortfall * average
+            fifo_cogs += consumed
+            average_cogs += quantity * average
+            on_hand -= quantity
+            cost = consumed / quantity if quantity else average
+        
+        self.statements.execute("""
+            UPDATE product_costs
+            SET on_hand = %s, average_cost = %s, fifo_value = %s, fifo_cogs = %s, average_cogs = %s
+            WHERE product_id = %s
+        """, (on_hand, average, fifo_value, fifo_cogs, average_cogs, product_id))
+        return cost.quantize(Decimal("0.0001"))
+    
+    def _consume_layers(self, product_id, quantity):
+        """Take quantity from the oldest cost layers; returns (value taken, units no layer covered)"""
+        value = Decimal(0)
+        while quantity > 0:
+            layers = self.statements.fetchall(
+                "SELECT id, remaining, unit_cost FROM cost_layers WHERE product_id = %s ORDER BY id LIMIT %s FOR UPDATE",
+                (product_id, 50)
+            )
+            if not layers:
+                break
+            emptied = []
+            for layer in layers:
+                taken = min(quantity, layer['remaining'])
+                value += taken * Decimal(layer['unit_cost'])
+                quantity -= taken
+                if taken == layer['remaining']:
+                    emptied.append(layer['id'])
+                else:
+                    self.statements.execute(
+                        "UPDATE cost_layers SET remaining = remaining - %s WHERE id = %s", (taken, layer['id'])
+                    )
+                if quantity == 0:
+                    break
+            # Used-up layers are dropped; the ledger keeps the history
+            if emptied:
+                placeholders = ", ".join(["%s"] * len(emptied))
+                self.cursor.execute(f"DELETE FROM cost_layers WHERE id IN ({placeholders})", emptied)
+        return value, quantity
+    
+    def get_inventory_valuation(self, category=None):
+        """Get each product's FIFO and weighted average cost valuation from the maintained figures"""
+        try:
+            query = Query("""
+                SELECT p.id, p.sku, p.name, c.name as category_name, p.quantity, p.price,
+                       COALESCE(pc.on_hand, p.quantity) as on_hand,
+                       COALESCE(pc.average_cost, 0) as average_cost,
+                       COALESCE(pc.fifo_value, 0) as fifo_value,
+                       COALESCE(pc.on_hand, 0) * COALESCE(pc.average_cost, 0) as average_value,
+                       p.quantity * p.price as retail_value,
+                       COALESCE(pc.fifo_cogs, 0) as fifo_cogs,
+                       COALESCE(pc.average_cogs, 0) as average_cogs
+                FROM products p
+                LEFT JOIN categories c ON p.category_id = c.id
+                LEFT JOIN product_costs pc ON pc.product_id = p.id
+            """)
+            if category:
+                query.where("p.category_id = %s", category)
+            self.cursor.execute(*query.order_by("p.name, p.id").build())
+            return self.cursor.fetchall()
+        except Error as e:
+            logger.error(f"Error fetching inventory valuation: {e}")
+            return []
+    
+    # ==================== LEDGER ARCHIVE ====================
+    
+    def archive_transactions(self, keep_months=12, chunk_size=5000):
+        """Move whole months older than keep_months from the ledger into the archive
+        
+        Rows are moved in chunks, each in its own short transaction that also
+        adds them to the monthly roll-ups in transaction_summaries, so tills are
+        never blocked for long. Returns the number of rows moved, or None on a
+        database error.
+        """
+        today = date.today()
+        month = today.year * 12 + today.month - 1 - keep_months
+        cutoff = datetime(month // 12, month % 12 + 1, 1)
+        try:
+            # Recorded first: from here on history queries may need the archive
+            self.cursor.execute("INSERT INTO ledger_archive_runs (cutoff) VALUES (%s)", (cutoff,))
+            run_id = self.cursor.lastrowid
             self.connection.commit()
+            self._add_archive_partitions(cutoff)
             
-            # Update product quantity
-            if transaction_type == "IN":
-                self.update_stock(product_id, quantity)
-            elif transaction_type == "OUT":
-                self.update_stock(product_id, -quantity)
+            moved = 0
+            while True:
+                count = self._run_in_transaction(self._archive_chunk, cutoff, chunk_size)
+                moved += count
+                if count < chunk_size:
+                    break
             
-            return self.cursor.lastrowid
+            self.cursor.execute(
+                "UPDATE ledger_archive_runs SET rows_moved = %s, finished_at = %s WHERE id = %s",
+                (moved, datetime.now(), run_id)
+            )
+            self.connection.commit()
+            return moved
         except Error as e:
-            print(f"Error adding transaction: {e}")
+            logger.error(f"Error archiving transactions: {e}")
             return None
     
-    def get_transactions(self, product_id=None, limit=100):
-        """Get transaction history"""
+    def _archive_chunk(self, cutoff, chunk_size):
+        """Move one chunk of ledger rows older than cutoff without committing"""
+        self.cursor.execute(
+            "SELECT id FROM transactions WHERE created_at < %s ORDER BY id LIMIT %s FOR UPDATE", (cutoff, chunk_size)
+        )
+        ids = [row['id'] for row in self.cursor.fetchall()]
+        if not ids:
+            return 0
+        placeholders = ", ".join(["%s"] * len(ids))
+        
+        self.cursor.execute(f"""
+            INSERT INTO transactions_archive ({LEDGER_COLUMNS})
+            SELECT {LEDGER_COLUMNS} FROM transactions WHERE id IN ({placeholders})
+        """, ids)
+        self.cursor.execute(f"""
+            INSERT INTO transaction_summaries (month, product_id, location_id, transaction_type, movements, quantity)
+            SELECT DATE_SUB(DATE(created_at), INTERVAL DAYOFMONTH(created_at) - 1 DAY) as month,
+                   product_id, COALESCE(location_id, 0) as location, transaction_type, COUNT(*), SUM(quantity)
+            FROM transactions
+            WHERE id IN ({placeholders})
+            GROUP BY month, product_id, location, transaction_type
+            ON DUPLICATE KEY UPDATE movements = movements + VALUES(movements), quantity = quantity + VALUES(quantity)
+        """, ids)
+        self.cursor.execute(f"DELETE FROM transactions WHERE id IN ({placeholders})", ids)
+        return len(ids)
+    
+    def _add_archive_partitions(self, cutoff):
+        """Give each month about to be archived its own partition, if the archive is partitioned"""
+        self.cursor.execute("""
+            SELECT partition_name as name
+            FROM information_schema.partitions
+            WHERE table_schema = DATABASE() AND table_name = 'transactions_archive' AND partition_name IS NOT NULL
+        """)
+        existing = {row['name'] for row in self.cursor.fetchall()}
+        if "pmax" not in existing:
+            return
+        
+        self.cursor.execute("SELECT MIN(created_at) as oldest FROM transactions WHERE created_at < %s", (cutoff,))
+        oldest = self.cursor.fetchone()['oldest']
+        if oldest is None:
+            return
+        
+        # Partitions can only be split off the top, so start after the newest one
+        month = oldest.year * 12 + oldest.month - 1
+        monthly = [name for name in existing if name != "pmax"]
+        if monthly:
+            newest = max(monthly)
+            month = max(month, int(newest[1:5]) * 12 + int(newest[5:7]))
+        end = cutoff.year * 12 + cutoff.month - 1
+        
+        partitions = []
+        while month < end:
+            year, index = divmod(month, 12)
+            bound = date(year + (index + 1) // 12, (index + 1) % 12 + 1, 1)
+            partitions.append(f"PARTITION p{year:04d}{index + 1:02d} VALUES LESS THAN ('{bound}')")
+            month += 1
+        if partitions:
+            partitions.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+            self.cursor.execute(
+                f"ALTER TABLE transactions_archive REORGANIZE PARTITION pmax INTO ({', '.join(partitions)})"
+            )
+    
+    def get_archive_cutoff(self):
+        """Date before which ledger rows may have been archived, or None if nothing was"""
         try:
-            query = """
-                SELECT t.*, p.name as product_name, p.sku
-                FROM transactions t
-                JOIN products p ON t.product_id = p.id
-            """
-            params = []
-            
+            self.cursor.execute("SELECT MAX(cutoff) as cutoff FROM ledger_archive_runs")
+            return self.cursor.fetchone()['cutoff']
+        except Error as e:
+            logger.error(f"Error fetching archive cutoff: {e}")
+            return None
+    
+    def get_transaction_summaries(self, product_id=None, start=None, end=None):
+        """Get the monthly roll-ups of archived movements, newest month first"""
+        try:
+            query = Query("""
+                SELECT s.month, s.product_id, p.name as product_name, p.sku, s.location_id, s.transaction_type,
+                       s.movements, s.quantity
+                FROM transaction_summaries s
+                JOIN products p ON s.product_id = p.id
+            """)
             if product_id:
-                query += " WHERE t.product_id = %s"
-                params.append(product_id)
-            
-            query += " ORDER BY t.created_at DESC LIMIT %s"
-            params.append(limit)
-            
-            self.cursor.execute(query, params)
-            return self.cursor.fetchall()
+                query.where("s.product_id = %s", product_id)
+            if start:
+                query.where("s.month >= %s", start)
+            if end:
+                query.where("s.month < %s", end)
+            query.order_by("s.month DESC, p.name")
+            return self.statements.fetchall(*query.build())
         except Error as e:
-            print(f"Error fetching transactions: {e}")
+            logger.error(f"Error fetching transaction summaries: {e}")
             return []
     
-    # ====== DASHBOARD STATS =======
-    
-    def get_dashboard_stats(self):
-        """Get dashboard statistics"""
+    def get_movement_series(self, bucket="day", start=None, end=None, product_id=None, category_id=None):
+        """Get movement totals per hour, day or week for a product, a category or all products
+        
+        Rows are grouped on the server, so no ledger rows are fetched. Both the
+        buckets and the net since end read the archive as well when their
+        period reaches back past the archive cutoff.
+        Returns {'buckets': [{'bucket', 'in_quantity', 'out_quantity',
+        'movements'}] oldest first, 'quantity': stock on hand now, 'net_after':
+        net movement since end}, from which stock levels can be worked back; or
+        None on error.
+        """
         try:
-            stats = {}
+            expression = SERIES_BUCKETS[bucket]
+            join, conditions, scope_params = "", [], []
+            if product_id:
+                conditions.append("t.product_id = %s")
+                scope_params.append(product_id)
+            elif category_id:
+                join = "JOIN products p ON p.id = t.product_id"
+                conditions.append("p.category_id = %s")
+                scope_params.append(category_id)
             
-            # Total products
-            self.cursor.execute("SELECT COUNT(*) as count FROM products")
-            stats['total_products'] = self.cursor.fetchone()['count']
+            range_conditions, range_params = list(conditions), list(scope_params)
+            if start:
+                range_conditions.append("t.created_at >= %s")
+                range_params.append(start)
+            if end:
+                range_conditions.append("t.created_at < %s")
+                range_params.append(end)
+            where = f"WHERE {' AND '.join(range_conditions)}" if range_conditions else ""
             
-            # Total categories
-            self.cursor.execute("SELECT COUNT(*) as count FROM categories")
-            stats['total_categories'] = self.cursor.fetchone()['count']
+            cutoff = self.get_archive_cutoff()
             
-            # Total stock value
-            self.cursor.execute("""
-                SELECT SUM(quantity * price) as total_value 
-                FROM products
-            """)
-            result = self.cursor.fetchone()
-            stats['stock_value'] = result['total_value'] or 0
+            def ledger_tables(since):
+                if cutoff is not None and (since is None or since < cutoff):
+                    return ["transactions", "transactions_archive"]
+                return ["transactions"]
             
-            # Low stock count
+            tables = ledger_tables(start)
+            # Each table is grouped on its own, so only bucket totals are unioned
+            parts = [f"""
+                SELECT {expression} as bucket,
+                       SUM(CASE WHEN t.transaction_type = 'IN' THEN t.quantity ELSE 0 END) as in_quantity,
+                       SUM(CASE WHEN t.transaction_type = 'OUT' THEN t.quantity ELSE 0 END) as out_quantity,
+                       COUNT(*) as movements
+                FROM {table} t {join}
+                {where}
+                GROUP BY bucket
+            """ for table in tables]
+            self.cursor.execute(f"""
+                SELECT bucket, SUM(in_quantity) as in_quantity, SUM(out_quantity) as out_quantity,
+                       SUM(movements) as movements
+                FROM ({" UNION ALL ".join(parts)}) series
+                GROUP BY bucket
+                ORDER BY bucket
+            """, range_params * len(tables))
+            buckets = [
+                {'bucket': row['bucket'], 'in_quantity': int(row['in_quantity']),
+                 'out_quantity': int(row['out_quantity']), 'movements': int(row['movements'])}
+                for row in self.cursor.fetchall()
+            ]
+            
+            if product_id:
+                self.cursor.execute("SELECT quantity FROM products WHERE id = %s", (product_id,))
+            elif category_id:
+                # Maintained per category, so no scan over its products
+                self.cursor.execute("SELECT total_units as quantity FROM categories WHERE id = %s", (category_id,))
+            else:
+                self.cursor.execute("SELECT COALESCE(SUM(quantity), 0) as quantity FROM products")
+            row = self.cursor.fetchone()
+            
+            net_after = 0
+            if end:
+                after = " AND ".join(conditions + ["t.created_at >= %s"])
+                tables = ledger_tables(end)
+                parts = [f"""
+                    SELECT SUM(CASE WHEN t.transaction_type = 'IN' THEN t.quantity ELSE -t.quantity END) as net
+                    FROM {table} t {join}
+                    WHERE {after}
+                """ for table in tables]
+                self.cursor.execute(f"""
+                    SELECT COALESCE(SUM(net), 0) as net FROM ({" UNION ALL ".join(parts)}) movements
+                """, (scope_params + [end]) * len(tables))
+                net_after = int(self.cursor.fetchone()['net'])
+            
+            return {'buckets': buckets, 'quantity': int(row['quantity']) if row else 0, 'net_after': net_after}
+        except Error as e:
+            logger.error(f"Error fetching movement series: {e}")
+            return None
+    
+    # ==================== LEDGER VERIFICATION ====================
+    
+    def start_stock_verification(self, mode):
+        """Record a verification run and fix its ledger high-water mark
+        
+        Returns {'id', 'ledger_high', 'started_at'}, or None on a database error.
+        """
+        try:
+            self.cursor.execute("SELECT COALESCE(MAX(id), 0) as high, NOW(6) as now FROM transactions")
+            row = self.cursor.fetchone()
+            self.cursor.execute(
+                "INSERT INTO stock_verifications (mode, ledger_high) VALUES (%s, %s)", (mode, row['high'])
+            )
+            self.connection.commit()
+            return {'id': self.cursor.lastrowid, 'ledger_high': row['high'], 'started_at': row['now']}
+        except Error as e:
+            logger.error(f"Error starting stock verification: {e}")
+            return None
+    
+    def get_last_stock_verification(self):
+        """Get the newest finished verification run, or None"""
+        try:
+            self.cursor.execute(
+                "SELECT * FROM stock_verifications WHERE finished_at IS NOT NULL ORDER BY id DESC LIMIT 1"
+            )
+            return self.cursor.fetchone()
+        except Error as e:
+            logger.error(f"Error fetching stock verifications: {e}")
+            return None
+    
+    def wait_for_transactions_before(self, started, timeout=60.0):
+        """Wait until every transaction that began before started has ended
+        
+        Ledger ids are handed out at insert time, so until then rows below the
+        high-water mark may still be uncommitted. Returns False on timeout or
+        when the server does not let us see other transactions.
+        """
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                self.cursor.execute(
+                    "SELECT COUNT(*) as count FROM information_schema.innodb_trx WHERE trx_started < %s", (started,)
+                )
+                count = self.cursor.fetchone()['count']
+                self.connection.commit()
+                if count == 0:
+                    return True
+                if time.monotonic() > deadline:
+                    return False
+                time.sleep(0.5)
+        except Error as e:
+            logger.warning(f"Cannot check for open transactions: {e}")
+            return False
+    
+    def get_ledger_deltas(self, low, high):
+        """Net quantity per product of ledger rows with low < id <= high, as {product id: delta}
+        
+        The grouped rows are streamed from an unbuffered cursor, so a range can
+        cover millions of ledger rows without holding them in the client.
+        """
+        cursor = self.connection.cursor(buffered=False)
+        try:
+            cursor.execute("""
+                SELECT product_id, SUM(IF(transaction_type = 'IN', quantity, -quantity))
+                FROM transactions
+                WHERE id > %s AND id <= %s
+                GROUP BY product_id
+            """, (low, high))
+            deltas = {product_id: int(delta) for product_id, delta in cursor}
+            self.connection.commit()
+            return deltas
+        except Error as e:
+            logger.error(f"Error scanning ledger: {e}")
+            return None
+        finally:
+            cursor.close()
+    
+    def get_archived_ledger_deltas(self):
+        """Net quantity per product of all archived ledger rows, from the monthly roll-ups"""
+        try:
             self.cursor.execute("""
-                SELECT COUNT(*) as count 
-                FROM products 
-                WHERE quantity <= min_stock_level
+                SELECT product_id, SUM(IF(transaction_type = 'IN', quantity, -quantity)) as delta
+                FROM transaction_summaries
+                GROUP BY product_id
             """)
-            stats['low_stock_count'] = self.cursor.fetchone()['count']
-            
-            # Total transactions today
+            return {row['product_id']: int(row['delta']) for row in self.cursor.fetchall()}
+        except Error as e:
+            logger.error(f"Error reading ledger summaries: {e}")
+            return None
+    
+    def get_stock_positions(self, after_id=0, limit=10000):
+        """Get product quantities with their verified baselines, in id order from after_id"""
+        try:
+            self.cursor.execute("""
+                SELECT p.id, p.sku, p.quantity, b.product_id IS NOT NULL as has_baseline,
+                       COALESCE(b.opening_quantity, 0) as opening_quantity,
+                       COALESCE(b.quantity, 0) as baseline_quantity
+                FROM products p
+                LEFT JOIN stock_baselines b ON b.product_id = p.id
+                WHERE p.id > %s
+                ORDER BY p.id
+                LIMIT %s
+            """, (after_id, limit))
+            rows = self.cursor.fetchall()
+            self.connection.commit()
+            return rows
+        except Error as e:
+            logger.error(f"Error fetching stock positions: {e}")
+            return None
+    
+    def get_stock_at(self, product_ids, ledger_high):
+        """Quantities of the given products as of ledger_high, as {product id: quantity}
+        
+        Product quantities and the ledger rows after ledger_high are read in one
+        consistent snapshot, so movements made during a verification run are
+        not mistaken for drift.
+        """
+        if not product_ids:
+            return {}
+        try:
+            self.cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+            quantities = {}
+            later = {}
+            for start in range(0, len(product_ids), self.chunk_size):
+                chunk = product_ids[start:start + self.chunk_size]
+                placeholders = ", ".join(["%s"] * len(chunk))
+                self.cursor.execute(f"SELECT id, quantity FROM products WHERE id IN ({placeholders})", chunk)
+                quantities.update((row['id'], row['quantity']) for row in self.cursor.fetchall())
+                self.cursor.execute(f"""
+                    SELECT product_id, SUM(IF(transaction_type = 'IN', quantity, -quantity)) as delta
+                    FROM transactions
+                    WHERE id > %s AND product_id IN ({placeholders})
+                    GROUP BY product_id
+                """, [ledger_high] + list(chunk))
+                later.update((row['product_id'], int(row['delta'])) for row in self.cursor.fetchall())
+            self.connection.commit()
+            return {product_id: quantity - later.get(product_id, 0) for product_id, quantity in quantities.items()}
+        except Error as e:
+            self.connection.rollback()
+            logger.error(f"Error reading stock positions: {e}")
+            return None
+    
+    def repair_stock(self, corrections):
+        """Move product quantities by {product id: delta} so they agree with the ledger
+        
+        Cost figures, location stock and category totals are corrected with
+        them. Applied in chunks, each in its own short transaction with change
+        log events, so open views follow. Returns the number of products
+        repaired, or None if a chunk failed.
+        """
+        items = sorted(corrections.items())
+        repaired = 0
+        try:
+            for start in range(0, len(items), self.chunk_size):
+                repaired += self._run_in_transaction(self._repair_stock_chunk, items[start:start + self.chunk_size])
+            return repaired
+        except Error as e:
+            logger.error(f"Error repairing stock: {e}")
+            return None
+    
+    def _repair_stock_chunk(self, items):
+        """Apply one chunk of stock corrections without committing
+        
+        The cost figures follow each correction as they follow a movement, and
+        _log_stock_change keeps the category totals. A decrease is taken from
+        stock held at no location first, then from the product's locations in
+        id order, so its location rows never add up to more than its total.
+        """
+        now = datetime.now()
+        self.cursor.executemany(
+            "UPDATE products SET quantity = quantity + %s, updated_at = %s, version = version + 1 WHERE id = %s",
+            [(delta, now, product_id) for product_id, delta in items]
+        )
+        for product_id, delta in items:
+            if not delta:
+                continue
+            if delta < 0:
+                self._trim_location_stock(product_id)
+            self._apply_cost(product_id, "IN" if delta > 0 else "OUT", abs(delta), delta=delta)
+            self._log_stock_change(product_id, delta)
+        return len(items)
+    
+    def _trim_location_stock(self, product_id):
+        """Take stock off a product's locations until they hold no more than its total, without committing"""
+        total = self.statements.fetchone("SELECT quantity FROM products WHERE id = %s", (product_id,))
+        rows = self.statements.fetchall(
+            "SELECT location_id, quantity FROM product_stock WHERE product_id = %s AND quantity > 0 "
+            "ORDER BY location_id FOR UPDATE",
+            (product_id,)
+        )
+        excess = sum(row['quantity'] for row in rows) - max(total['quantity'] if total else 0, 0)
+        for row in rows:
+            if excess <= 0:
+                break
+            taken = min(excess, row['quantity'])
+            self._apply_location_change(product_id, row['location_id'], -taken)
+            excess -= taken
+    
+    def save_stock_baselines(self, baselines):
+        """Upsert verified quantities as (product id, quantity, opening adjustment) in chunks"""
+        try:
+            for start in range(0, len(baselines), self.chunk_size):
+                self.cursor.executemany("""
+                    INSERT INTO stock_baselines (product_id, opening_quantity, quantity) VALUES (%s, %s, %s)
+                    ON DUPLICATE KEY UPDATE quantity = VALUES(quantity),
+                        opening_quantity = opening_quantity + VALUES(opening_quantity)
+                """, [(product_id, opening, quantity)
+                      for product_id, quantity, opening in baselines[start:start + self.chunk_size]])
+                self.connection.commit()
+            return True
+        except Error as e:
+            self.connection.rollback()
+            logger.error(f"Error saving stock baselines: {e}")
+            return False
+    
+    def finish_stock_verification(self, run_id, checked, mismatches, repaired):
+        """Mark a verification run finished; later incremental runs start from its high-water mark"""
+        try:
             self.cursor.execute("""
-                SELECT COUNT(*) as count 
-                FROM transactions 
-                WHERE DATE(created_at) = CURDATE()
+                UPDATE stock_verifications
+                SET products_checked = %s, mismatches = %s, repaired = %s, finished_at = %s
+                WHERE id = %s
+            """, (checked, mismatches, repaired, datetime.now(), run_id))
+            self.connection.commit()
+            return True
+        except Error as e:
+            logger.error(f"Error finishing stock verification: {e}")
+            return False
+    
+    # ==================== STOCK TAKE OPERATIONS ====================
+    
+    def start_stock_take(self, name, location_id=None, user="Admin", notes=""):
+        """Open a stock take with a snapshot of expected quantities
+        
+        The snapshot covers every product, or every product held at location_id.
+        It is read with plain consistent reads, so it takes no locks on products
+        however large the catalogue is.
+        """
+        try:
+            return self._run_in_transaction(self._snapshot_stock_take, name, location_id, user, notes)
+        except Error as e:
+            logger.error(f"Error starting stock take: {e}")
+            return None
+    
+    def _snapshot_stock_take(self, name, location_id, user, notes):
+        """Create a stock take and its expected lines without committing"""
+        self.cursor.execute(
+            "INSERT INTO stock_takes (name, location_id, user, notes) VALUES (%s, %s, %s, %s)",
+            (name, location_id, user, notes)
+        )
+        stock_take_id = self.cursor.lastrowid
+        if location_id:
+            self.cursor.execute(
+                "SELECT product_id, quantity FROM product_stock WHERE location_id = %s", (location_id,)
+            )
+        else:
+            self.cursor.execute("SELECT id AS product_id, quantity FROM products")
+        rows = self.cursor.fetchall()
+        
+        # Not INSERT ... SELECT: that would share-lock every product row until commit
+        query = "INSERT INTO stock_take_lines (stock_take_id, product_id, expected) VALUES (%s, %s, %s)"
+        for start in range(0, len(rows), self.chunk_size):
+            self.cursor.executemany(query, [
+                (stock_take_id, row['product_id'], row['quantity'])
+                for row in rows[start:start + self.chunk_size]
+            ])
+        return stock_take_id
+    
+    def get_stock_takes(self, status=None):
+        """Get stock takes with their line and counted totals, newest first"""
+        try:
+            query = Query("""
+                SELECT st.*, l.name as location_name,
+                       COUNT(ln.product_id) as line_count, COUNT(ln.counted) as counted_count
+                FROM stock_takes st
+                LEFT JOIN locations l ON st.location_id = l.id
+                LEFT JOIN stock_take_lines ln ON ln.stock_take_id = st.id
             """)
-            stats['today_transactions'] = self.cursor.fetchone()['count']
+            if status:
+                query.where("st.status = %s", status)
+            query.group_by("st.id").order_by("st.created_at DESC, st.id DESC")
+            return self.statements.fetchall(*query.build())
+        except Error as e:
+            logger.error(f"Error fetching stock takes: {e}")
+            return []
+    
+    def record_stock_counts(self, stock_take_id, counts, add=False):
+        """Record counted quantities in bulk
+        
+        counts maps product id to counted quantity. With add=True the counts are
+        added to earlier ones, as when items are scanned one at a time. Products
+        missing from the snapshot are added with an expected quantity of 0.
+        Returns the number of lines written, or None on a database error.
+        Raises StockTakeClosedError if the stock take is not open.
+        """
+        try:
+            return self._run_in_transaction(self._write_stock_counts, stock_take_id, dict(counts), add)
+        except Error as e:
+            logger.error(f"Error recording stock counts: {e}")
+            return None
+    
+    def _write_stock_counts(self, stock_take_id, counts, add):
+        """Upsert counted quantities without committing"""
+        # Shared lock: counts cannot land while the stock take is being posted
+        self._lock_open_stock_take(stock_take_id, "LOCK IN SHARE MODE")
+        update = "COALESCE(counted, 0) + VALUES(counted)" if add else "VALUES(counted)"
+        query = f"""
+            INSERT INTO stock_take_lines (stock_take_id, product_id, counted) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE counted = {update}
+        """
+        items = list(counts.items())
+        for start in range(0, len(items), self.chunk_size):
+            self.cursor.executemany(query, [
+                (stock_take_id, product_id, quantity) for product_id, quantity in items[start:start + self.chunk_size]
+            ])
+        return len(items)
+    
+    def _lock_open_stock_take(self, stock_take_id, lock="FOR UPDATE"):
+        """Lock a stock take row and return it, raising StockTakeClosedError unless it is open"""
+        self.cursor.execute(f"SELECT * FROM stock_takes WHERE id = %s {lock}", (stock_take_id,))
+        stock_take = self.cursor.fetchone()
+        if stock_take is None or stock_take['status'] != "open":
+            raise StockTakeClosedError(f"Stock take {stock_take_id} is not open")
+        return stock_take
+    
+    def get_stock_take_variances(self, stock_take_id, uncounted_as_zero=False):
+        """Get the lines whose count differs from the snapshot, largest value difference first
+        
+        Uncounted lines are skipped, or treated as counted at zero with
+        uncounted_as_zero (a full count where anything not found is missing).
+        """
+        try:
+            counted = "COALESCE(ln.counted, 0)" if uncounted_as_zero else "ln.counted"
+            query = f"""
+                SELECT ln.product_id, p.sku, p.name, p.price, ln.expected, ln.counted,
+                       {counted} - ln.expected as variance,
+                       ({counted} - ln.expected) * p.price as value_variance
+                FROM stock_take_lines ln
+                JOIN products p ON ln.product_id = p.id
+                WHERE ln.stock_take_id = %s AND {counted} <> ln.expected
+                ORDER BY ABS(value_variance) DESC
+            """
+            self.cursor.execute(query, (stock_take_id,))
+            return self.cursor.fetchall()
+        except Error as e:
+            logger.error(f"Error fetching stock take variances: {e}")
+            return []
+    
+    def post_stock_take(self, stock_take_id, user="Admin", uncounted_as_zero=False):
+        """Post every variance as a ledger adjustment in one transaction and close the stock take
+        
+        Each adjustment is the difference between the count and the snapshot,
+        applied to the current quantity, so movements made since the snapshot
+        are kept. Only products with a variance are locked, and only while
+        posting. Returns the number of adjustments, or None on a database error.
+        Raises StockTakeClosedError if the stock take is not open.
+        """
+        try:
+            return self._run_in_transaction(self._post_stock_take, stock_take_id, user, uncounted_as_zero)
+        except Error as e:
+            logger.error(f"Error posting stock take: {e}")
+            return None
+    
+    def _post_stock_take(self, stock_take_id, user, uncounted_as_zero):
+        """Write the stock take adjustments in batches without committing"""
+        stock_take = self._lock_open_stock_take(stock_take_id)
+        location_id = stock_take['location_id']
+        counted = "COALESCE(counted, 0)" if uncounted_as_zero else "counted"
+        self.cursor.execute(f"""
+            SELECT product_id, {counted} - expected as variance
+            FROM stock_take_lines
+            WHERE stock_take_id = %s AND {counted} <> expected
+            ORDER BY product_id
+        """, (stock_take_id,))
+        variances = [(row['product_id'], int(row['variance'])) for row in self.cursor.fetchall()]
+        notes = f"Stock take #{stock_take_id}"
+        now = datetime.now()
+        
+        for start in range(0, len(variances), self.chunk_size):
+            chunk = variances[start:start + self.chunk_size]
+            product_ids = [product_id for product_id, _ in chunk]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            
+            # Counts are authoritative, so adjustments are not held to the negative stock guard
+            self.cursor.executemany(
+                "UPDATE products SET quantity = quantity + %s, updated_at = %s, version = version + 1 WHERE id = %s",
+                [(variance, now, product_id) for product_id, variance in chunk]
+            )
+            if location_id:
+                self.cursor.executemany("""
+                    INSERT INTO product_stock (product_id, location_id, quantity) VALUES (%s, %s, %s)
+                    ON DUPLICATE KEY UPDATE quantity = quantity + VALUES(quantity)
+                """, [(product_id, location_id, variance) for product_id, variance in chunk])
+            
+            # Surpluses come in at average cost, shrinkage leaves from the oldest layers
+            costs = {product_id: self._apply_cost(product_id, "IN" if variance > 0 else "OUT", abs(variance))
+                     for product_id, variance in chunk}
             
+            # Keyed ledger rows, so their ids can be read back in one query
+            keys = [f"stocktake-{stock_take_id}-{product_id}" for product_id in product_ids]
+            self.cursor.executemany("""
+                INSERT INTO transactions
+                    (product_id, transaction_type, quantity, notes, user, location_id, idempotency_key, unit_cost)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """, [
+                (product_id, "IN" if variance > 0 else "OUT", abs(variance), notes, user, location_id, key,
+                 costs[product_id])
+                for (product_id, variance), key in zip(chunk, keys)
+            ])
+            self.cursor.execute(
+                f"SELECT id, product_id FROM transactions WHERE idempotency_key IN ({placeholders})", keys
+            )
+            ledger_ids = {row['product_id']: row['id'] for row in self.cursor.fetchall()}
+            self.cursor.execute(
+                f"SELECT id, quantity, price, min_stock_level, category_id FROM products WHERE id IN ({placeholders})",
+                product_ids
+            )
+            figures = {row['id']: row for row in self.cursor.fetchall()}
+            self._apply_category_changes([
+                (dict(figures[product_id], quantity=figures[product_id]['quantity'] - variance), figures[product_id])
+                for product_id, variance in chunk
+            ])
+            
+            # Same events as _log_stock_change, written in one statement
+            self.cursor.executemany(
+                "INSERT INTO change_log (entity, entity_id, op, payload) VALUES (%s, %s, %s, %s)",
+                [("product", product_id, "stock", json.dumps({
+                    'delta': variance,
+                    'quantity': figures[product_id]['quantity'],
+                    'price': figures[product_id]['price'],
+                    'min_stock_level': figures[product_id]['min_stock_level'],
+                    'category_id': figures[product_id]['category_id'],
+                    'location_id': location_id,
+                    'transaction_id': ledger_ids.get(product_id),
+                }, default=str)) for product_id, variance in chunk]
+            )
+        
+        if location_id:
+            self.cursor.execute("""
+                UPDATE locations
+                SET total_units = (SELECT COALESCE(SUM(quantity), 0) FROM product_stock WHERE location_id = %s),
+                    sku_count = (SELECT COUNT(*) FROM product_stock WHERE location_id = %s AND quantity <> 0)
+                WHERE id = %s
+            """, (location_id, location_id, location_id))
+        self.cursor.execute(
+            "UPDATE stock_takes SET status = 'posted', posted_at = %s WHERE id = %s", (now, stock_take_id)
+        )
+        return len(variances)
+    
+    def cancel_stock_take(self, stock_take_id):
+        """Close an open stock take without posting it"""
+        try:
+            self.cursor.execute(
+                "UPDATE stock_takes SET status = 'cancelled' WHERE id = %s AND status = 'open'", (stock_take_id,)
+            )
+            self.connection.commit()
+            return self.cursor.rowcount > 0
+        except Error as e:
+            logger.error(f"Error cancelling stock take: {e}")
+            return False
+    
+    # ==================== CHANGE FEED ====================
+    
+    def get_changes(self, since_id=0, limit=500, ids=None):
+        """Get change log events with id greater than since_id (or the given ids), oldest first"""
+        try:
+            query = Query("SELECT id, entity, entity_id, op, payload, created_at FROM change_log")
+            if ids:
+                query.where_in("id", ids)
+            else:
+                query.where("id > %s", since_id).limit(limit)
+            rows = self.statements.fetchall(*query.order_by("id").build())
+            # End the read snapshot so the next poll sees newly committed events
+            self.connection.commit()
+            for row in rows:
+                row['payload'] = json.loads(row['payload'] or "{}")
+            return rows
+        except Error as e:
+            logger.error(f"Error fetching changes: {e}")
+            return []
+    
+    def get_latest_change_id(self):
+        """Get the id of the newest change log event"""
+        try:
+            self.cursor.execute("SELECT COALESCE(MAX(id), 0) as max_id FROM change_log")
+            max_id = self.cursor.fetchone()['max_id']
+            self.connection.commit()
+            return max_id
+        except Error as e:
+            logger.error(f"Error fetching latest change id: {e}")
+            return None
+    
+    def get_oldest_change_id(self):
+        """Get the id of the oldest change log event still kept (0 when the log is empty)"""
+        try:
+            self.cursor.execute("SELECT COALESCE(MIN(id), 0) as min_id FROM change_log")
+            min_id = self.cursor.fetchone()['min_id']
+            self.connection.commit()
+            return min_id
+        except Error as e:
+            logger.error(f"Error fetching oldest change id: {e}")
+            return None
+    
+    def purge_changes(self, older_than_days=7):
+        """Delete change log events older than the retention window, one chunk per transaction"""
+        try:
+            query = "DELETE FROM change_log WHERE created_at < NOW() - INTERVAL %s DAY ORDER BY id LIMIT %s"
+            deleted = 0
+            while True:
+                self.cursor.execute(query, (older_than_days, self.chunk_size))
+                count = self.cursor.rowcount
+                self.connection.commit()
+                deleted += count
+                if count < self.chunk_size:
+                    return deleted
+        except Error as e:
+            logger.error(f"Error purging changes: {e}")
+            return 0
+    
+    def get_products_by_ids(self, product_ids):
+        """Get several products by ID in one query"""
+        if not product_ids:
+            return []
+        try:
+            query = Query("""
+                SELECT p.*, c.name as category_name 
+                FROM products p 
+                LEFT JOIN categories c ON p.category_id = c.id
+            """).where_in("p.id", product_ids)
+            return self.statements.fetchall(*query.build())
+        except Error as e:
+            logger.error(f"Error fetching products: {e}")
+            return []
+    
+    def get_sku_index(self):
+        """Get the id, SKU and name of every product, for building a scan lookup"""
+        try:
+            self.cursor.execute("SELECT id, sku, name FROM products")
+            return self.cursor.fetchall()
+        except Error as e:
+            logger.error(f"Error fetching SKU index: {e}")
+            return None
+    
+    # ==================== DASHBOARD STATS ====================
+    
+    # Each dashboard figure is an independent query so callers can run them in parallel
+    DASHBOARD_STAT_QUERIES = {
+        'total_products': "SELECT COUNT(*) as value FROM products",
+        'total_categories': "SELECT COUNT(*) as value FROM categories",
+        'total_locations': "SELECT COUNT(*) as value FROM locations",
+        'stock_value': "SELECT SUM(quantity * price) as value FROM products",
+        'low_stock_count': "SELECT COUNT(*) as value FROM products WHERE quantity <= min_stock_level",
+        # Range predicate rather than DATE(created_at) so an index on created_at can be used
+        'today_transactions': "SELECT COUNT(*) as value FROM transactions WHERE created_at >= CURDATE()",
+    }
+    
+    def get_dashboard_stat(self, name):
+        """Get a single dashboard statistic by name"""
+        try:
+            self.cursor.execute(self.DASHBOARD_STAT_QUERIES[name])
+            return self.cursor.fetchone()['value'] or 0
+        except Error as e:
+            logger.error(f"Error fetching dashboard stat {name}: {e}")
+            return None
+    
+    def get_dashboard_stats(self):
+        """Get dashboard statistics"""
+        try:
+            stats = {}
+            for name, query in self.DASHBOARD_STAT_QUERIES.items():
+                self.cursor.execute(query)
+                stats[name] = self.cursor.fetchone()['value'] or 0
             return stats
         except Error as e:
-            print(f"Error fetching dashboard stats: {e}")
+            logger.error(f"Error fetching dashboard stats: {e}")
             return {}
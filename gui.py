@@ -4,18 +4,361 @@ Tkinter interface for the Inventory Management System
 I used ai to modify the interface more 
 """
 
+import logging
+import queue
+import time
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
-from datetime import datetime
+from collections.abc import Sequence
+from tkinter import ttk, messagebox, simpledialog, filedialog
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from catalogue_snapshot import Catalogue
+from change_feed import ChangeFeed, changed_ids, fetch_products, stat_deltas
+from charts import TimeSeriesChart, stock_levels
+from database import ConcurrentUpdateError, InsufficientStockError, StockTakeClosedError
+from settings import Settings
+from sku_index import SkuIndex
+from ui_profiler import UiProfiler
+from stock_take import read_counts_csv
+
+
+logger = logging.getLogger("inventory.gui")
+
+# Longest wait between change feed polls while they keep failing
+MAX_POLL_BACKOFF_MS = 60000
+
+class TreeRenderer:
+    """Fills Treeviews in time-sliced chunks so long lists never freeze the window
+    
+    The first screenful is inserted on the next idle callback, before Tk redraws;
+    the rest follows in slices of at most slice_ms, yielding to the event loop
+    in between. A render requested before the previous one for the same tree
+    has started replaces it; one requested while it is running restarts it.
+    """
+    
+    def __init__(self, root, slice_ms=12, first_rows=60, profiler=None):
+        self.root = root
+        self.slice_ms = slice_ms
+        self.first_rows = first_rows
+        # Insert time of each render is reported to the call that requested it
+        self.profiler = profiler
+        self.jobs = {}
+    
+    def render(self, tree, rows):
+        """Replace the contents of tree with rows of (iid or None, values, tags)"""
+        owner = self.profiler.current_call() if self.profiler else None
+        job = self.jobs.get(tree)
+        if job and job['pos'] == 0:
+            job['rows'] = rows
+            job['owner'] = owner
+            return
+        self.cancel(tree)
+        self.jobs[tree] = {'rows': rows, 'pos': 0, 'owner': owner, 'spent_ms': 0.0,
+                           'after': self.root.after_idle(self._step, tree)}
+    
+    def busy(self, tree):
+        return tree in self.jobs
+    
+    def cancel(self, tree=None):
+        """Abandon the render for tree, or every render when the view changes"""
+        for key in [tree] if tree is not None else list(self.jobs):
+            job = self.jobs.pop(key, None)
+            if job:
+                self.root.after_cancel(job['after'])
+                self._finish(job)
+    
+    def _finish(self, job):
+        # Renders replaced before their first step inserted nothing
+        if self.profiler and job['spent_ms']:
+            self.profiler.add_widget_time(job['owner'], job['spent_ms'])
+    
+    def _step(self, tree):
+        job = self.jobs.get(tree)
+        if job is None:
+            return
+        if not tree.winfo_exists():
+            del self.jobs[tree]
+            return
+        
+        rows, pos = job['rows'], job['pos']
+        start = time.perf_counter()
+        if pos == 0:
+            tree.delete(*tree.get_children())
+            stop = min(len(rows), self.first_rows)
+        else:
+            stop = len(rows)
+        deadline = start + self.slice_ms / 1000
+        while pos < stop:
+            iid, values, tags = rows[pos]
+            tree.insert("", tk.END, iid=iid, values=values, tags=tags)
+            pos += 1
+            if pos % 25 == 0 and time.perf_counter() > deadline:
+                break
+        
+        job['pos'] = pos
+        job['spent_ms'] += (time.perf_counter() - start) * 1000
+        if pos < len(rows):
+            job['after'] = self.root.after(1, self._step, tree)
+        else:
+            del self.jobs[tree]
+            self._finish(job)
+
+
+def sort_key(value):
+    """Typed sort key: blanks first, then numbers and dates, then text ignoring case"""
+    if value is None or value == "":
+        return (0, 0)
+    if isinstance(value, str):
+        return (2, value.casefold())
+    return (1, value)
+
+
+class MappedRows(Sequence):
+    """fn(source[i]) computed on access, so large lazily decoded sources stay lazy"""
+    
+    def __init__(self, source, fn):
+        self.source = source
+        self.fn = fn
+    
+    def __len__(self):
+        return len(self.source)
+    
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[n] for n in range(*i.indices(len(self)))]
+        return self.fn(self.source[i])
+
+
+class SortableTable:
+    """The rows behind a Treeview, re-sorted in memory when a header is clicked
+    
+    Rows are (iid, values, tags) as shown, with a parallel tuple of raw values
+    per row (numbers, dates) to sort by. Keys are computed once per column and
+    dataset. Click a header to sort by it, again to reverse; Shift-click adds
+    it as the next sort column. The order list is shared so it survives reloads.
+    Live changes are patched into the shown rows one by one, so lazily decoded
+    data sets are never decoded whole for an update.
+    """
+    
+    def __init__(self, renderer, tree, columns, order):
+        self.renderer = renderer
+        self.tree = tree
+        self.columns = columns
+        self.order = order
+        self.rows = []
+        self.raw = []
+        self.keys = {}
+        # Rows in shown order, with their sort keys, while a sort order is set
+        self.sorted = []
+        self.sorted_keys = []
+        tree.bind("<Button-1>", self.on_click, add="+")
+        self.update_headings()
+    
+    def load(self, rows, raw=None):
+        """Show rows; raw defaults to the displayed values when those are already typed"""
+        self.rows = rows
+        self.raw = raw if raw is not None else [row[1] for row in rows]
+        self.keys = {}
+        self.refresh()
+    
+    def refresh(self):
+        self.renderer.render(self.tree, self.sorted_rows())
+    
+    def column_keys(self, column):
+        keys = self.keys.get(column)
+        if keys is None:
+            keys = self.keys[column] = [sort_key(raw[column]) for raw in self.raw]
+        return keys
+    
+    def sorted_rows(self):
+        if not self.order:
+            self.sorted, self.sorted_keys = [], []
+            return self.rows
+        # Stable sorts from the last sort column to the first give multi-column order
+        index = list(range(len(self.rows)))
+        for column, descending in reversed(self.order):
+            index.sort(key=self.column_keys(column).__getitem__, reverse=descending)
+        keys = [self.column_keys(column) for column, _ in self.order]
+        self.sorted = [self.rows[i] for i in index]
+        self.sorted_keys = [tuple(k[i] for k in keys) for i in index]
+        return self.sorted
+    
+    def row_key(self, raw):
+        return tuple(sort_key(raw[column]) for column, _ in self.order)
+    
+    def _insert_position(self, key):
+        """Position after the last shown row that sorts before or level with key"""
+        low, high = 0, len(self.sorted_keys)
+        while low < high:
+            mid = (low + high) // 2
+            if self._compare(self.sorted_keys[mid], key) > 0:
+                high = mid
+            else:
+                low = mid + 1
+        return low
+    
+    def _compare(self, a, b):
+        for x, y, (_, descending) in zip(a, b, self.order):
+            if x != y:
+                result = -1 if x < y else 1
+                return -result if descending else result
+        return 0
+    
+    def sort_by(self, column, extend=False):
+        current = dict(self.order)
+        if extend and column in current:
+            self.order[:] = [(c, not d if c == column else d) for c, d in self.order]
+        elif extend:
+            self.order.append((column, False))
+        elif self.order and self.order[0][0] == column:
+            self.order[:] = [(column, not self.order[0][1])]
+        else:
+            self.order[:] = [(column, False)]
+        self.update_headings()
+        self.refresh()
+    
+    def on_click(self, event):
+        if self.tree.identify_region(event.x, event.y) != "heading":
+            return
+        column = int(self.tree.identify_column(event.x)[1:]) - 1
+        if 0 <= column < len(self.columns):
+            self.sort_by(column, extend=bool(event.state & 0x0001))
+    
+    def update_headings(self):
+        positions = {column: (n, descending) for n, (column, descending) in enumerate(self.order, start=1)}
+        for column, name in enumerate(self.columns):
+            text = name
+            if column in positions:
+                n, descending = positions[column]
+                text += " \u25bc" if descending else " \u25b2"
+                if len(self.order) > 1:
+                    text += str(n)
+            self.tree.heading(name, text=text)
+    
+    def update(self, upserted, deleted, prepend=True, rows=None, raw=None):
+        """Apply changed rows {iid: (row, raw)} and deleted iids, patching the shown rows in place
+        
+        rows and raw replace the data set when the caller's source already has
+        the changes applied (a lazily decoded view); otherwise the row lists
+        are patched. prepend shows rows that were not shown before, newest
+        first or at their sorted position. The tree must be fully rendered.
+        """
+        deleted = set(deleted)
+        if rows is not None:
+            self.rows, self.raw = rows, raw
+        else:
+            self.rows = list(self.rows)
+            self.raw = list(self.raw)
+            index = {row[0]: i for i, row in enumerate(self.rows)}
+            added = []
+            for iid, (row, raw_values) in upserted.items():
+                if iid in index:
+                    self.rows[index[iid]] = row
+                    self.raw[index[iid]] = raw_values
+                elif prepend:
+                    added.append((row, raw_values))
+            kept = [i for i, row in enumerate(self.rows) if row[0] not in deleted]
+            self.rows = [row for row, _ in added] + [self.rows[i] for i in kept]
+            self.raw = [raw_values for _, raw_values in added] + [self.raw[i] for i in kept]
+        # Recomputed on the next header click, not per change
+        self.keys = {}
+        
+        tree = self.tree
+        for iid in deleted:
+            if tree.exists(iid):
+                tree.delete(iid)
+        if not self.order:
+            for iid, ((_, values, tags), _) in upserted.items():
+                if tree.exists(iid):
+                    tree.item(iid, values=values, tags=tags)
+                elif prepend:
+                    tree.insert("", 0, iid=iid, values=values, tags=tags)
+            return
+        
+        # Sorted: take the changed rows out, then put each back at its new position
+        gone = deleted | set(upserted)
+        kept = [n for n, row in enumerate(self.sorted) if row[0] not in gone]
+        self.sorted = [self.sorted[n] for n in kept]
+        self.sorted_keys = [self.sorted_keys[n] for n in kept]
+        for iid, (row, raw_values) in upserted.items():
+            shown = tree.exists(iid)
+            if not shown and not prepend:
+                continue
+            key = self.row_key(raw_values)
+            position = self._insert_position(key)
+            self.sorted.insert(position, row)
+            self.sorted_keys.insert(position, key)
+            _, values, tags = row
+            if shown:
+                tree.item(iid, values=values, tags=tags)
+                tree.move(iid, "", position)
+            else:
+                tree.insert("", position, iid=iid, values=values, tags=tags)
 
 
 class InventoryGUI:
     """Main GUI class for Inventory Management System"""
     
-    def __init__(self, root, db):
+    def __init__(self, root, db, syncer=None, scan_queue=None, settings=None):
         self.root = root
         self.db = db
+        self.settings = settings or Settings()
+        # With a syncer, stock movements go to the offline journal first
+        self.syncer = syncer
+        # High-rate movements (scans) go through a write-behind queue
+        self.scan_queue = scan_queue
+        # Journaled stock-outs to check against the minimum level once they are synced, by key
+        self.low_stock_watch = {}
+        self.last_rejected_seq = 0
+        self.rejected_count = 0
+        if syncer:
+            self.last_rejected_seq = max((m['seq'] for m in syncer.journal.rejected()), default=0)
+            self.rejected_count = syncer.journal.counts()['rejected']
         self.current_view = "dashboard"
+        self.products_search_term = None
+        
+        # Main-loop lag and view timings; views are wrapped before any widget holds them
+        tuning = self.settings.tuning
+        self.profiler = UiProfiler(root, db.stats, tuning.ui_heartbeat_ms, tuning.ui_stall_ms,
+                                   self.settings.app.profile_dir)
+        self.profiler.instrument(self)
+        self.profiler.start()
+        self.cpu_profiling = tk.BooleanVar(value=False)
+        self.memory_tracing = tk.BooleanVar(value=False)
+        self.renderer = TreeRenderer(root, profiler=self.profiler)
+        # Header-click sort order per table, kept while switching views
+        self.sort_orders = {}
+        
+        # Follow changes made by other terminals
+        self.change_poll_ms = self.settings.tuning.change_poll_ms
+        self.poll_failures = 0
+        self.change_feed = ChangeFeed(db)
+        # The catalogue comes from the local snapshot, caught up through the change log;
+        # it takes each batch first so views reloading from it see the same events
+        self.catalogue = Catalogue(db, self.settings.app.catalogue_snapshot)
+        self.catalogue.open()
+        # Scan lookups never hit the database: warm the SKU index once, then follow the feed
+        self.sku_index = SkuIndex(db)
+        self.sku_index.warm()
+        self.change_feed.subscribe(self.dispatch_changes)
+        self.scan_type = tk.StringVar(value="IN")
+        self.scan_quantity = tk.StringVar(value="1")
+        self.scan_location = tk.StringVar()
+        self.scan_tally = {}
+        self.scan_count = 0
+        # While counting for a stock take, scans add to its counts instead of moving stock
+        self.scan_stock_take = None
+        self.pending_counts = {}
+        self.count_flush_job = None
+        
+        # Live dashboard: counters follow change feed deltas, with a full reload now and then
+        self.dashboard_live = tk.BooleanVar(value=True)
+        self.dashboard_interval = tk.StringVar(value=str(self.settings.tuning.dashboard_refresh_s))
+        self.dashboard_resync_s = self.settings.tuning.dashboard_resync_s
+        self.dashboard_job = None
+        self.dashboard_pending = []
+        self.dashboard_stats = {}
+        self.stat_labels = {}
         
         # Configure styles
         self.setup_styles()
@@ -27,11 +370,16 @@ class InventoryGUI:
         
         # Show dashboard by default
         self.show_dashboard()
+        self.root.after(self.change_poll_ms, self.poll_changes)
     
     def setup_styles(self):
         """Configure ttk styles"""
         style = ttk.Style()
-        style.theme_use('clam')
+        try:
+            style.theme_use(self.settings.app.theme)
+        except tk.TclError:
+            logger.warning("Unknown ttk theme '%s'; using 'clam'", self.settings.app.theme)
+            style.theme_use('clam')
         
         # Colors
         self.primary_color = "#2196F3"
@@ -73,22 +421,40 @@ class InventoryGUI:
         products_menu.add_command(label="View All Products", command=self.show_products)
         products_menu.add_command(label="Add Product", command=self.show_add_product)
         products_menu.add_command(label="Low Stock Alert", command=self.show_low_stock)
+        products_menu.add_command(label="Inventory Valuation", command=self.show_valuation)
+        products_menu.add_separator()
+        products_menu.add_command(label="Bulk Edit", command=self.show_bulk_edit_dialog)
+        products_menu.add_command(label="Undo Last Bulk Edit", command=self.undo_last_bulk_edit)
         
         # Categories menu
         categories_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Categories", menu=categories_menu)
         categories_menu.add_command(label="Manage Categories", command=self.show_categories)
         
+        # Locations menu
+        locations_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Locations", menu=locations_menu)
+        locations_menu.add_command(label="Manage Locations", command=self.show_locations)
+        
         # Transactions menu
         transactions_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Transactions", menu=transactions_menu)
         transactions_menu.add_command(label="View Transactions", command=self.show_transactions)
         transactions_menu.add_command(label="Stock In", command=lambda: self.show_stock_movement("IN"))
         transactions_menu.add_command(label="Stock Out", command=lambda: self.show_stock_movement("OUT"))
+        transactions_menu.add_command(label="Scan Mode", command=self.show_scan_mode)
+        transactions_menu.add_command(label="Stock Take", command=self.show_stock_takes)
+        transactions_menu.add_command(label="Movement Charts", command=self.show_charts)
         
         # Help menu
         help_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Help", menu=help_menu)
+        help_menu.add_command(label="Diagnostics", command=self.show_diagnostics)
+        help_menu.add_checkbutton(label="CPU Profiling", variable=self.cpu_profiling,
+                                  command=self.toggle_cpu_profiling)
+        help_menu.add_checkbutton(label="Memory Tracing", variable=self.memory_tracing,
+                                  command=self.toggle_memory_tracing)
+        help_menu.add_separator()
         help_menu.add_command(label="About", command=self.show_about)
     
     def create_sidebar(self):
@@ -113,8 +479,13 @@ class InventoryGUI:
             ("Dashboard", self.show_dashboard),
             ("Products", self.show_products),
             ("Categories", self.show_categories),
+            ("Locations", self.show_locations),
             ("Transactions", self.show_transactions),
             ("Low Stock", self.show_low_stock),
+            ("Valuation", self.show_valuation),
+            ("Charts", self.show_charts),
+            ("Scan Mode", self.show_scan_mode),
+            ("Stock Take", self.show_stock_takes),
         ]
         
         for text, command in nav_buttons:
@@ -141,6 +512,7 @@ class InventoryGUI:
     
     def clear_main_content(self):
         """Clear main content area"""
+        self.renderer.cancel()
         for widget in self.main_frame.winfo_children():
             widget.destroy()
     
@@ -151,27 +523,46 @@ class InventoryGUI:
         self.clear_main_content()
         self.current_view = "dashboard"
         
-        # Header
-        header = ttk.Label(self.main_frame, text="Dashboard", style="Title.TLabel")
-        header.pack(anchor=tk.W, pady=(0, 20))
+        # Header with live mode controls
+        header_frame = ttk.Frame(self.main_frame)
+        header_frame.pack(fill=tk.X, pady=(0, 20))
+        
+        header = ttk.Label(header_frame, text="Dashboard", style="Title.TLabel")
+        header.pack(side=tk.LEFT)
+        
+        ttk.Label(header_frame, text="s").pack(side=tk.RIGHT)
+        ttk.Spinbox(header_frame, from_=1, to=3600, width=5, textvariable=self.dashboard_interval,
+                    command=self.schedule_dashboard_tick).pack(side=tk.RIGHT, padx=5)
+        ttk.Label(header_frame, text="Refresh every").pack(side=tk.RIGHT)
+        ttk.Checkbutton(header_frame, text="Live", variable=self.dashboard_live,
+                        command=self.toggle_dashboard_live).pack(side=tk.RIGHT, padx=15)
         
         # Stats cards frame
         cards_frame = ttk.Frame(self.main_frame)
         cards_frame.pack(fill=tk.X, pady=10)
         
-        # Get stats
-        stats = self.db.get_dashboard_stats()
-        
         # Create stat cards
         stat_cards = [
-            ("Total Products", stats.get('total_products', 0), "#2196F3"),
-            ("Categories", stats.get('total_categories', 0), "#9C27B0"),
-            ("Stock Value", f"${stats.get('stock_value', 0):,.2f}", "#4CAF50"),
-            ("Low Stock Items", stats.get('low_stock_count', 0), "#F44336"),
+            ('total_products', "Total Products", "#2196F3"),
+            ('total_categories', "Categories", "#9C27B0"),
+            ('stock_value', "Retail Value", "#4CAF50"),
+            ('low_stock_count', "Low Stock Items", "#F44336"),
         ]
         
-        for title, value, color in stat_cards:
-            self.create_stat_card(cards_frame, title, value, color)
+        self.stat_labels = {}
+        for name, title, color in stat_cards:
+            self.stat_labels[name] = self.create_stat_card(cards_frame, title, "", color)
+        
+        # Category breakdown from the maintained category totals
+        category_frame = ttk.LabelFrame(self.main_frame, text="Stock by Category", padding=15)
+        category_frame.pack(side=tk.RIGHT, fill=tk.Y, pady=20, padx=(20, 0))
+        
+        columns = ("Category", "Products", "Units", "Value", "Low")
+        self.category_breakdown_tree = ttk.Treeview(category_frame, columns=columns, show="headings", height=10)
+        for col in columns:
+            self.category_breakdown_tree.heading(col, text=col)
+            self.category_breakdown_tree.column(col, width=140 if col == "Category" else 80)
+        self.category_breakdown_tree.pack(fill=tk.BOTH, expand=True)
         
         # Recent activity section
         activity_frame = ttk.LabelFrame(self.main_frame, text="Recent Transactions", padding=15)
@@ -179,28 +570,125 @@ class InventoryGUI:
         
         # Transactions tree
         columns = ("Date", "Product", "Type", "Quantity", "User")
-        tree = ttk.Treeview(activity_frame, columns=columns, show="headings", height=10)
+        self.recent_tree = ttk.Treeview(activity_frame, columns=columns, show="headings", height=10)
         
         for col in columns:
-            tree.heading(col, text=col)
-            tree.column(col, width=120)
+            self.recent_tree.heading(col, text=col)
+            self.recent_tree.column(col, width=120)
         
         # Add scrollbar
-        scrollbar = ttk.Scrollbar(activity_frame, orient=tk.VERTICAL, command=tree.yview)
-        tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar = ttk.Scrollbar(activity_frame, orient=tk.VERTICAL, command=self.recent_tree.yview)
+        self.recent_tree.configure(yscrollcommand=scrollbar.set)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        tree.pack(fill=tk.BOTH, expand=True)
+        self.recent_tree.pack(fill=tk.BOTH, expand=True)
+        
+        self.load_dashboard()
+        self.schedule_dashboard_tick()
+    
+    def load_dashboard(self):
+        """Reload all dashboard figures and recent transactions"""
+        # Events up to here are already reflected in the figures read below
+        self.dashboard_change_id = self.db.get_latest_change_id() or 0
+        self.dashboard_pending = []
+        self.dashboard_loaded_at = time.monotonic()
+        self.dashboard_day = date.today()
         
-        # Load recent transactions
-        transactions = self.db.get_transactions(limit=10)
-        for trans in transactions:
-            tree.insert("", tk.END, values=(
+        stats = self.db.get_dashboard_stats()
+        self.dashboard_stats = {name: float(value or 0) if name == 'stock_value' else int(value or 0)
+                                for name, value in stats.items()}
+        self.update_stat_cards()
+        
+        self.recent_tree.delete(*self.recent_tree.get_children())
+        self.last_transaction_id = 0
+        self.load_recent_transactions()
+        self.load_category_breakdown()
+    
+    def load_category_breakdown(self):
+        """Show each category's totals on the dashboard, highest stock value first"""
+        categories = sorted(self.db.get_category_totals(), key=lambda c: c['stock_value'], reverse=True)
+        self.category_breakdown_tree.delete(*self.category_breakdown_tree.get_children())
+        for cat in categories:
+            self.category_breakdown_tree.insert("", tk.END, values=(
+                cat['name'],
+                cat['product_count'],
+                cat['total_units'],
+                f"${cat['stock_value']:,.2f}",
+                cat['low_stock_count']
+            ))
+    
+    def load_recent_transactions(self, since_id=None):
+        """Add transactions newer than since_id to the top of the recent list"""
+        transactions = self.db.get_transactions(limit=10, since_id=since_id)
+        # Newest first from the database, so insert oldest first at the top
+        for trans in reversed(transactions):
+            self.recent_tree.insert("", 0, iid=str(trans['id']), values=(
                 trans['created_at'].strftime("%Y-%m-%d %H:%M"),
                 trans['product_name'],
                 trans['transaction_type'],
                 trans['quantity'],
                 trans['user']
             ))
+            self.last_transaction_id = max(self.last_transaction_id, trans['id'])
+        for iid in self.recent_tree.get_children()[10:]:
+            self.recent_tree.delete(iid)
+    
+    def update_stat_cards(self):
+        """Show the current dashboard figures on the stat cards"""
+        for name, label in self.stat_labels.items():
+            value = self.dashboard_stats.get(name, 0)
+            label.config(text=f"${value:,.2f}" if name == 'stock_value' else str(value))
+    
+    def schedule_dashboard_tick(self):
+        """(Re)start the live dashboard timer at the chosen interval"""
+        if self.dashboard_job:
+            self.root.after_cancel(self.dashboard_job)
+            self.dashboard_job = None
+        if self.dashboard_live.get():
+            try:
+                seconds = max(1, int(self.dashboard_interval.get()))
+            except ValueError:
+                seconds = 5
+            self.dashboard_job = self.root.after(seconds * 1000, self.dashboard_tick)
+    
+    def toggle_dashboard_live(self):
+        """Catch up on changes missed while paused when live mode is switched on"""
+        if self.dashboard_live.get() and self.current_view == "dashboard":
+            self.load_dashboard()
+        self.schedule_dashboard_tick()
+    
+    def dashboard_tick(self):
+        """Apply pending deltas to the dashboard and reschedule while it is shown"""
+        self.dashboard_job = None
+        if self.current_view != "dashboard" or not self.dashboard_live.get():
+            return
+        try:
+            self.refresh_dashboard()
+        except Exception:
+            logger.exception("Error refreshing dashboard")
+        self.schedule_dashboard_tick()
+    
+    def refresh_dashboard(self):
+        """Update the stat cards and recent transactions in place from change feed events"""
+        events = [e for e in self.dashboard_pending if e['id'] > self.dashboard_change_id]
+        self.dashboard_pending = []
+        
+        # "Today" moved on, or drift from deltas racing the last reload: start over
+        stale = (date.today() != self.dashboard_day
+                 or time.monotonic() - self.dashboard_loaded_at > self.dashboard_resync_s)
+        deltas = None if stale else stat_deltas(events)
+        if deltas is None:
+            self.load_dashboard()
+            return
+        if not events:
+            return
+        
+        for name, delta in deltas.items():
+            self.dashboard_stats[name] = self.dashboard_stats.get(name, 0) + delta
+        self.update_stat_cards()
+        if any(e['entity'] in ("category", "product") and e['op'] != "transfer" for e in events):
+            self.load_category_breakdown()
+        if deltas['today_transactions']:
+            self.load_recent_transactions(since_id=self.last_transaction_id)
     
     def create_stat_card(self, parent, title, value, color):
         """Create a statistics card"""
@@ -220,6 +708,7 @@ class InventoryGUI:
         
         value_label = tk.Label(content, text=str(value), font=("Helvetica", 28, "bold"), bg="white", fg=color)
         value_label.pack(anchor=tk.W, pady=(5, 0))
+        return value_label
     
     # ==================== PRODUCTS VIEW ====================
     
@@ -280,6 +769,8 @@ class InventoryGUI:
         for col in columns:
             self.products_tree.heading(col, text=col)
             self.products_tree.column(col, width=column_widths.get(col, 100))
+        self.products_table = SortableTable(self.renderer, self.products_tree, columns,
+                                            self.sort_orders.setdefault("products", []))
         
         # Scrollbars
         v_scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.products_tree.yview)
@@ -333,36 +824,90 @@ class InventoryGUI:
         )
         stock_btn.pack(side=tk.LEFT, padx=5)
         
+        transfer_btn = tk.Button(
+            action_frame,
+            text="Transfer",
+            bg="#9C27B0",
+            fg="white",
+            padx=20,
+            pady=8,
+            bd=0,
+            cursor="hand2",
+            command=self.transfer_selected_product
+        )
+        transfer_btn.pack(side=tk.LEFT, padx=5)
+        
+        bulk_btn = tk.Button(
+            action_frame,
+            text="Bulk Edit",
+            bg="#607D8B",
+            fg="white",
+            padx=20,
+            pady=8,
+            bd=0,
+            cursor="hand2",
+            command=self.show_bulk_edit_dialog
+        )
+        bulk_btn.pack(side=tk.LEFT, padx=5)
+        
+        chart_btn = tk.Button(
+            action_frame,
+            text="Chart",
+            bg="#009688",
+            fg="white",
+            padx=20,
+            pady=8,
+            bd=0,
+            cursor="hand2",
+            command=self.chart_selected_product
+        )
+        chart_btn.pack(side=tk.LEFT, padx=5)
+        
         # Load products
         self.load_products()
     
     def load_products(self, search_term=None):
         """Load products into the treeview"""
-        # Clear existing
-        for item in self.products_tree.get_children():
-            self.products_tree.delete(item)
-        
-        # Get products
-        products = self.db.get_all_products(search_term=search_term)
+        self.products_search_term = search_term
         
-        for product in products:
-            status = "Low Stock" if product['quantity'] <= product['min_stock_level'] else "In Stock"
-            status_tag = "low" if status == "Low Stock" else "ok"
-            
-            self.products_tree.insert("", tk.END, values=(
-                product['id'],
-                product['sku'],
-                product['name'],
-                product['category_name'] or "Uncategorized",
-                product['quantity'],
-                f"${product['price']:.2f}",
-                status
-            ), tags=(status_tag,))
+        if search_term:
+            products = self.db.get_all_products(search_term=search_term)
+            entries = [self.product_entry(product) for product in products]
+            self.products_table.load([row for row, _ in entries], [raw for _, raw in entries])
+        else:
+            self.products_table.load(*self.catalogue_rows())
         
         # Configure tags
         self.products_tree.tag_configure("low", foreground="#F44336")
         self.products_tree.tag_configure("ok", foreground="#4CAF50")
     
+    def product_row(self, product):
+        """Treeview values and tags for a product row"""
+        status = "Low Stock" if product['quantity'] <= product['min_stock_level'] else "In Stock"
+        status_tag = "low" if status == "Low Stock" else "ok"
+        values = (
+            product['id'],
+            product['sku'],
+            product['name'],
+            product['category_name'] or "Uncategorized",
+            product['quantity'],
+            f"${product['price']:.2f}",
+            status
+        )
+        return values, (status_tag,)
+    
+    def catalogue_rows(self):
+        """Products table rows and raw values over the catalogue, decoded as they are rendered or sorted"""
+        products = self.catalogue.products()
+        return (MappedRows(products, lambda p: self.product_entry(p)[0]),
+                MappedRows(products, lambda p: self.product_entry(p)[1]))
+    
+    def product_entry(self, product):
+        """Products table row and the raw values it sorts by (price as a number)"""
+        values, tags = self.product_row(product)
+        raw = values[:5] + (product['price'],) + values[6:]
+        return (str(product['id']), values, tags), raw
+    
     def search_products(self, search_term):
         """Search products"""
         self.load_products(search_term=search_term)
@@ -455,9 +1000,8 @@ class InventoryGUI:
             if product_id:
                 messagebox.showinfo("Success", "Product added successfully!")
                 dialog.destroy()
-                if self.current_view == "products":
-                    self.load_products()
-                else:
+                self.refresh_products()
+                if self.current_view != "products":
                     self.show_products()
             else:
                 messagebox.showerror("Error", "Failed to add product!")
@@ -561,21 +1105,32 @@ class InventoryGUI:
                     category_id = cat['id']
                     break
             
-            success = self.db.update_product(
-                product_id=product_id,
-                name=name,
-                sku=sku,
-                description=entries['description'].get().strip(),
-                category_id=category_id,
-                quantity=quantity,
-                price=price,
-                min_stock=min_stock
-            )
+            try:
+                success = self.db.update_product(
+                    product_id=product_id,
+                    name=name,
+                    sku=sku,
+                    description=entries['description'].get().strip(),
+                    category_id=category_id,
+                    quantity=quantity,
+                    price=price,
+                    min_stock=min_stock,
+                    version=product['version']
+                )
+            except ConcurrentUpdateError:
+                messagebox.showerror(
+                    "Error",
+                    "This product was changed by another user since it was opened.\n"
+                    "Please reopen it and apply your changes again."
+                )
+                dialog.destroy()
+                self.refresh_products()
+                return
             
             if success:
                 messagebox.showinfo("Success", "Product updated successfully!")
                 dialog.destroy()
-                self.load_products()
+                self.refresh_products()
             else:
                 messagebox.showerror("Error", "Failed to update product!")
         
@@ -606,10 +1161,232 @@ class InventoryGUI:
         if messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete '{product_name}'?"):
             if self.db.delete_product(product_id):
                 messagebox.showinfo("Success", "Product deleted successfully!")
-                self.load_products()
+                self.refresh_products()
             else:
                 messagebox.showerror("Error", "Failed to delete product!")
     
+    def show_bulk_edit_dialog(self):
+        """Show dialog to change price, category or min level for many products at once"""
+        selected_ids = []
+        if self.current_view == "products":
+            selected_ids = [int(iid) for iid in self.products_tree.selection()]
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Bulk Edit Products")
+        dialog.geometry("640x660")
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        # Center
+        dialog.update_idletasks()
+        x = (dialog.winfo_screenwidth() // 2) - (640 // 2)
+        y = (dialog.winfo_screenheight() // 2) - (660 // 2)
+        dialog.geometry(f"640x660+{x}+{y}")
+        
+        ttk.Label(dialog, text="Bulk Edit Products", font=("Helvetica", 16, "bold")).pack(pady=15)
+        
+        categories = self.db.get_all_categories()
+        category_ids = {c['name']: c['id'] for c in categories}
+        
+        # Which products
+        scope_frame = ttk.LabelFrame(dialog, text="Apply To", padding=10)
+        scope_frame.pack(fill=tk.X, padx=20)
+        
+        scope_var = tk.StringVar(value="selected" if selected_ids else "filter")
+        ttk.Radiobutton(
+            scope_frame, text=f"Selected products ({len(selected_ids)})", variable=scope_var, value="selected",
+            state=tk.NORMAL if selected_ids else tk.DISABLED
+        ).grid(row=0, column=0, columnspan=4, sticky=tk.W)
+        ttk.Radiobutton(scope_frame, text="Products matching:", variable=scope_var, value="filter").grid(
+            row=1, column=0, columnspan=4, sticky=tk.W)
+        
+        ttk.Label(scope_frame, text="Search:").grid(row=2, column=0, sticky=tk.W, pady=3)
+        search_entry = ttk.Entry(scope_frame, width=25)
+        search_entry.grid(row=2, column=1, sticky=tk.W, pady=3)
+        if self.products_search_term:
+            search_entry.insert(0, self.products_search_term)
+        ttk.Label(scope_frame, text="Category:").grid(row=2, column=2, sticky=tk.W, padx=(10, 0))
+        filter_category_var = tk.StringVar(value="All categories")
+        ttk.Combobox(scope_frame, textvariable=filter_category_var, values=["All categories"] + list(category_ids),
+                     width=20, state="readonly").grid(row=2, column=3, sticky=tk.W)
+        
+        ttk.Label(scope_frame, text="Price from:").grid(row=3, column=0, sticky=tk.W, pady=3)
+        min_price_entry = ttk.Entry(scope_frame, width=10)
+        min_price_entry.grid(row=3, column=1, sticky=tk.W, pady=3)
+        ttk.Label(scope_frame, text="to:").grid(row=3, column=2, sticky=tk.W, padx=(10, 0))
+        max_price_entry = ttk.Entry(scope_frame, width=10)
+        max_price_entry.grid(row=3, column=3, sticky=tk.W)
+        
+        # What changes
+        change_frame = ttk.LabelFrame(dialog, text="Changes", padding=10)
+        change_frame.pack(fill=tk.X, padx=20, pady=10)
+        
+        price_rules = {"No change": None, "Change by %": "percent", "Change by amount": "amount", "Set to": "set"}
+        ttk.Label(change_frame, text="Price:").grid(row=0, column=0, sticky=tk.W, pady=3)
+        price_rule_var = tk.StringVar(value="No change")
+        ttk.Combobox(change_frame, textvariable=price_rule_var, values=list(price_rules), width=18,
+                     state="readonly").grid(row=0, column=1, sticky=tk.W, pady=3)
+        price_entry = ttk.Entry(change_frame, width=12)
+        price_entry.grid(row=0, column=2, sticky=tk.W, padx=10)
+        
+        ttk.Label(change_frame, text="Category:").grid(row=1, column=0, sticky=tk.W, pady=3)
+        category_var = tk.StringVar(value="No change")
+        ttk.Combobox(change_frame, textvariable=category_var, values=["No change", "No category"] + list(category_ids),
+                     width=18, state="readonly").grid(row=1, column=1, sticky=tk.W, pady=3)
+        
+        min_stock_rules = {"No change": None, "Change by": "amount", "Set to": "set"}
+        ttk.Label(change_frame, text="Min Stock Level:").grid(row=2, column=0, sticky=tk.W, pady=3)
+        min_stock_rule_var = tk.StringVar(value="No change")
+        ttk.Combobox(change_frame, textvariable=min_stock_rule_var, values=list(min_stock_rules), width=18,
+                     state="readonly").grid(row=2, column=1, sticky=tk.W, pady=3)
+        min_stock_entry = ttk.Entry(change_frame, width=12)
+        min_stock_entry.grid(row=2, column=2, sticky=tk.W, padx=10)
+        
+        # Preview
+        preview_label = ttk.Label(dialog, text="Preview the edit to see the products it changes.")
+        preview_label.pack(anchor=tk.W, padx=20)
+        preview_frame = ttk.Frame(dialog)
+        preview_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=5)
+        columns = ("SKU", "Name", "Price", "Category", "Min Level")
+        preview_tree = ttk.Treeview(preview_frame, columns=columns, show="headings", height=8)
+        for col in columns:
+            preview_tree.heading(col, text=col)
+            preview_tree.column(col, width=110)
+        preview_tree.column("Name", width=160)
+        scrollbar = ttk.Scrollbar(preview_frame, orient=tk.VERTICAL, command=preview_tree.yview)
+        preview_tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        preview_tree.pack(fill=tk.BOTH, expand=True)
+        
+        def read_form():
+            """(selection, changes) from the form, or None after reporting what is wrong"""
+            if scope_var.get() == "selected":
+                selection = {'ids': selected_ids}
+            else:
+                selection = {'search': search_entry.get().strip()}
+                if filter_category_var.get() in category_ids:
+                    selection['category_id'] = category_ids[filter_category_var.get()]
+                for key, entry in (('min_price', min_price_entry), ('max_price', max_price_entry)):
+                    if entry.get().strip():
+                        try:
+                            selection[key] = Decimal(entry.get().strip())
+                        except InvalidOperation:
+                            messagebox.showerror("Error", "Please enter a valid price range!", parent=dialog)
+                            return None
+            
+            changes = {}
+            rule = price_rules[price_rule_var.get()]
+            if rule:
+                try:
+                    value = Decimal(price_entry.get().strip())
+                    if not value.is_finite() or (rule == "set" and value < 0):
+                        raise InvalidOperation
+                except InvalidOperation:
+                    messagebox.showerror("Error", "Please enter a valid price change!", parent=dialog)
+                    return None
+                changes['price'] = (rule, value)
+            if category_var.get() != "No change":
+                changes['category_id'] = category_ids.get(category_var.get())
+            rule = min_stock_rules[min_stock_rule_var.get()]
+            if rule:
+                try:
+                    value = int(min_stock_entry.get())
+                    if rule == "set" and value < 0:
+                        raise ValueError("Min stock level cannot be negative")
+                except ValueError:
+                    messagebox.showerror("Error", "Please enter a valid min stock level!", parent=dialog)
+                    return None
+                changes['min_stock'] = (rule, value)
+            
+            if not changes:
+                messagebox.showwarning("Warning", "Choose at least one change!", parent=dialog)
+                return None
+            return selection, changes
+        
+        def preview():
+            form = read_form()
+            if form is None:
+                return None
+            result = self.db.preview_bulk_edit(*form)
+            if result is None:
+                messagebox.showerror("Error", "Failed to preview the bulk edit!", parent=dialog)
+                return None
+            preview_tree.delete(*preview_tree.get_children())
+            for row in result['rows']:
+                preview_tree.insert("", tk.END, values=(
+                    row['sku'],
+                    row['name'],
+                    f"${row['old_price']:.2f} → ${row['new_price']:.2f}",
+                    f"{row['old_category'] or 'N/A'} → {row['new_category'] or 'N/A'}",
+                    f"{row['old_min_stock_level']} → {row['new_min_stock_level']}"
+                ))
+            shown = f" (first {len(result['rows'])} shown)" if result['count'] > len(result['rows']) else ""
+            preview_label.config(text=f"{result['count']} products will change{shown}.")
+            return form, result['count']
+        
+        def apply_edit():
+            previewed = preview()
+            if previewed is None:
+                return
+            form, count = previewed
+            if not count:
+                messagebox.showinfo("Info", "No products would change.", parent=dialog)
+                return
+            if not messagebox.askyesno("Confirm Bulk Edit", f"Change {count} products?", parent=dialog):
+                return
+            result = self.db.bulk_edit_products(*form, user=self.settings.app.default_user)
+            if result is None:
+                messagebox.showerror("Error", "Failed to apply the bulk edit!", parent=dialog)
+                return
+            messagebox.showinfo(
+                "Success",
+                f"{result[1]} products updated.\nUse Products > Undo Last Bulk Edit to revert it.",
+                parent=dialog
+            )
+            dialog.destroy()
+            self.refresh_products()
+        
+        # Buttons
+        btn_frame = ttk.Frame(dialog, padding=(20, 10))
+        btn_frame.pack(fill=tk.X)
+        ttk.Button(btn_frame, text="Cancel", command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
+        tk.Button(
+            btn_frame,
+            text="Apply",
+            bg="#4CAF50",
+            fg="white",
+            padx=20,
+            pady=5,
+            bd=0,
+            cursor="hand2",
+            command=apply_edit
+        ).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(btn_frame, text="Preview", command=preview).pack(side=tk.RIGHT, padx=5)
+    
+    def undo_last_bulk_edit(self):
+        """Undo the most recent bulk edit that has not been undone"""
+        edit = next((e for e in self.db.get_bulk_edits() if e['undone_at'] is None), None)
+        if edit is None:
+            messagebox.showinfo("Info", "There is no bulk edit to undo.")
+            return
+        if not messagebox.askyesno(
+            "Confirm Undo",
+            f"Undo the bulk edit by {edit['user']} on {edit['created_at']:%Y-%m-%d %H:%M} "
+            f"({edit['product_count']} products)?"
+        ):
+            return
+        
+        result = self.db.undo_bulk_edit(edit['id'])
+        if result is None:
+            messagebox.showerror("Error", "Failed to undo the bulk edit!")
+            return
+        restored, skipped = result
+        message = f"{restored} products restored."
+        if skipped:
+            message += f"\n{skipped} products were changed again since and were left as they are."
+        messagebox.showinfo("Success", message)
+        self.refresh_products()
+    
     def stock_movement_selected(self):
         """Handle stock in/out for selected product"""
         selected = self.products_tree.selection()
@@ -623,6 +1400,17 @@ class InventoryGUI:
         
         self.show_stock_movement_dialog(product_id, product_name)
     
+    def chart_selected_product(self):
+        """Open the movement chart for the selected product"""
+        selected = self.products_tree.selection()
+        if not selected:
+            messagebox.showwarning("Warning", "Please select a product!")
+            return
+        
+        product = self.db.get_product_by_id(self.products_tree.item(selected[0])['values'][0])
+        if product:
+            self.show_charts(product['sku'])
+    
     def show_stock_movement(self, movement_type):
         """Show stock movement dialog"""
         self.show_products()
@@ -632,15 +1420,15 @@ class InventoryGUI:
         """Show dialog for stock in/out"""
         dialog = tk.Toplevel(self.root)
         dialog.title(f"Stock Movement - {product_name}")
-        dialog.geometry("400x300")
+        dialog.geometry("400x380")
         dialog.transient(self.root)
         dialog.grab_set()
         
         # Center
         dialog.update_idletasks()
         x = (dialog.winfo_screenwidth() // 2) - (400 // 2)
-        y = (dialog.winfo_screenheight() // 2) - (300 // 2)
-        dialog.geometry(f"400x300+{x}+{y}")
+        y = (dialog.winfo_screenheight() // 2) - (380 // 2)
+        dialog.geometry(f"400x380+{x}+{y}")
         
         ttk.Label(dialog, text=f"Stock Movement", font=("Helvetica", 16, "bold")).pack(pady=15)
         ttk.Label(dialog, text=f"Product: {product_name}", font=("Helvetica", 12)).pack(pady=5)
@@ -664,6 +1452,19 @@ class InventoryGUI:
         notes_entry = ttk.Entry(form_frame, width=30, font=("Helvetica", 11))
         notes_entry.grid(row=3, column=1, sticky=tk.W, pady=5)
         
+        # Location (optional)
+        ttk.Label(form_frame, text="Location:").grid(row=4, column=0, sticky=tk.W, pady=5)
+        locations = self.db.get_all_locations()
+        location_var = tk.StringVar()
+        ttk.Combobox(
+            form_frame, textvariable=location_var, values=[l['name'] for l in locations], width=28, state="readonly"
+        ).grid(row=4, column=1, sticky=tk.W, pady=5)
+        
+        # Unit cost (stock in only; blank receives at the current average cost)
+        ttk.Label(form_frame, text="Unit Cost:").grid(row=5, column=0, sticky=tk.W, pady=5)
+        cost_entry = ttk.Entry(form_frame, width=20, font=("Helvetica", 11))
+        cost_entry.grid(row=5, column=1, sticky=tk.W, pady=5)
+        
         # Buttons
         btn_frame = ttk.Frame(dialog, padding=20)
         btn_frame.pack(fill=tk.X)
@@ -678,19 +1479,61 @@ class InventoryGUI:
                 return
             
             movement_type = movement_var.get()
+            unit_cost = None
+            if movement_type == "IN" and cost_entry.get().strip():
+                try:
+                    unit_cost = Decimal(cost_entry.get().strip())
+                    if not unit_cost.is_finite() or unit_cost < 0:
+                        raise InvalidOperation
+                except InvalidOperation:
+                    messagebox.showerror("Error", "Please enter a valid unit cost!")
+                    return
             notes = notes_entry.get().strip()
             
-            transaction_id = self.db.add_transaction(
-                product_id=product_id,
-                transaction_type=movement_type,
-                quantity=quantity,
-                notes=notes
-            )
+            location_id = None
+            for loc in locations:
+                if loc['name'] == location_var.get():
+                    location_id = loc['id']
+                    break
+            
+            if self.syncer:
+                key = self.syncer.journal.record(
+                    product_id, movement_type, quantity, notes, self.settings.app.default_user, location_id,
+                    unit_cost
+                )
+                if movement_type == "OUT":
+                    self.low_stock_watch[key] = product_id
+                self.syncer.wake()
+                if self.syncer.online:
+                    messagebox.showinfo("Success", f"Stock {movement_type} recorded successfully!")
+                else:
+                    messagebox.showinfo(
+                        "Recorded Offline",
+                        f"Stock {movement_type} saved locally.\nIt will be sent when the database is reachable."
+                    )
+                dialog.destroy()
+                return
+            
+            try:
+                transaction_id = self.db.add_transaction(
+                    product_id=product_id,
+                    transaction_type=movement_type,
+                    quantity=quantity,
+                    notes=notes,
+                    user=self.settings.app.default_user,
+                    location_id=location_id,
+                    unit_cost=unit_cost
+                )
+            except InsufficientStockError:
+                messagebox.showerror("Error", "Not enough stock for this movement!")
+                return
             
             if transaction_id:
                 messagebox.showinfo("Success", f"Stock {movement_type} recorded successfully!")
                 dialog.destroy()
-                self.load_products()
+                if movement_type == "OUT":
+                    self.warn_if_low_stock(product_id)
+                self.refresh_products()
             else:
                 messagebox.showerror("Error", "Failed to record transaction!")
         
@@ -707,6 +1550,111 @@ class InventoryGUI:
             command=save_movement
         ).pack(side=tk.RIGHT, padx=5)
     
+    def warn_if_low_stock(self, product_id):
+        """Warn that a product is at or below its minimum level, unless the warning is turned off"""
+        if not self.settings.app.show_low_stock_warning:
+            return
+        product = self.db.get_product_by_id(product_id)
+        if product and product['quantity'] <= product['min_stock_level']:
+            messagebox.showwarning(
+                "Low Stock",
+                f"{product['name']} is down to {product['quantity']} "
+                f"(minimum {product['min_stock_level']})."
+            )
+    
+    def transfer_selected_product(self):
+        """Handle a transfer between locations for the selected product"""
+        selected = self.products_tree.selection()
+        if not selected:
+            messagebox.showwarning("Warning", "Please select a product!")
+            return
+        
+        item = self.products_tree.item(selected[0])
+        product_id = item['values'][0]
+        product_name = item['values'][2]
+        
+        locations = self.db.get_all_locations()
+        if len(locations) < 2:
+            messagebox.showwarning("Warning", "At least two locations are needed for a transfer!")
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"Transfer Stock - {product_name}")
+        dialog.geometry("420x320")
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        ttk.Label(dialog, text="Transfer Stock", font=("Helvetica", 16, "bold")).pack(pady=15)
+        ttk.Label(dialog, text=f"Product: {product_name}", font=("Helvetica", 12)).pack(pady=5)
+        
+        # Current stock per location
+        stock = {row['location_id']: row['quantity'] for row in self.db.get_stock_by_location(product_id)}
+        location_names = [f"{l['name']} ({stock.get(l['id'], 0)})" for l in locations]
+        
+        form_frame = ttk.Frame(dialog, padding=20)
+        form_frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Label(form_frame, text="From:").grid(row=0, column=0, sticky=tk.W, pady=5)
+        from_dropdown = ttk.Combobox(form_frame, values=location_names, width=28, state="readonly")
+        from_dropdown.grid(row=0, column=1, sticky=tk.W, pady=5)
+        
+        ttk.Label(form_frame, text="To:").grid(row=1, column=0, sticky=tk.W, pady=5)
+        to_dropdown = ttk.Combobox(form_frame, values=location_names, width=28, state="readonly")
+        to_dropdown.grid(row=1, column=1, sticky=tk.W, pady=5)
+        
+        ttk.Label(form_frame, text="Quantity:").grid(row=2, column=0, sticky=tk.W, pady=5)
+        qty_entry = ttk.Entry(form_frame, width=20, font=("Helvetica", 11))
+        qty_entry.grid(row=2, column=1, sticky=tk.W, pady=5)
+        
+        btn_frame = ttk.Frame(dialog, padding=20)
+        btn_frame.pack(fill=tk.X)
+        
+        def save_transfer():
+            try:
+                quantity = int(qty_entry.get())
+                if quantity <= 0:
+                    raise ValueError("Quantity must be positive")
+            except ValueError:
+                messagebox.showerror("Error", "Please enter a valid quantity!")
+                return
+            
+            from_index = from_dropdown.current()
+            to_index = to_dropdown.current()
+            if from_index < 0 or to_index < 0 or from_index == to_index:
+                messagebox.showerror("Error", "Please choose two different locations!")
+                return
+            
+            try:
+                result = self.db.transfer_stock(
+                    product_id=product_id,
+                    from_location_id=locations[from_index]['id'],
+                    to_location_id=locations[to_index]['id'],
+                    quantity=quantity,
+                    user=self.settings.app.default_user
+                )
+            except InsufficientStockError:
+                messagebox.showerror("Error", "Not enough stock at the source location!")
+                return
+            
+            if result:
+                messagebox.showinfo("Success", "Transfer recorded successfully!")
+                dialog.destroy()
+            else:
+                messagebox.showerror("Error", "Failed to record transfer!")
+        
+        ttk.Button(btn_frame, text="Cancel", command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
+        tk.Button(
+            btn_frame, 
+            text="Transfer", 
+            bg="#9C27B0", 
+            fg="white",
+            padx=20,
+            pady=5,
+            bd=0,
+            cursor="hand2",
+            command=save_transfer
+        ).pack(side=tk.RIGHT, padx=5)
+    
     # ==================== CATEGORIES VIEW ====================
     
     def show_categories(self):
@@ -735,12 +1683,15 @@ class InventoryGUI:
         list_frame = ttk.Frame(self.main_frame)
         list_frame.pack(fill=tk.BOTH, expand=True)
         
-        columns = ("ID", "Name", "Description")
+        columns = ("ID", "Name", "Description", "Products", "Units", "Stock Value", "Low Stock")
         self.categories_tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=20)
         
+        column_widths = {"ID": 50, "Name": 180, "Description": 240}
         for col in columns:
             self.categories_tree.heading(col, text=col)
-            self.categories_tree.column(col, width=200)
+            self.categories_tree.column(col, width=column_widths.get(col, 100))
+        self.categories_table = SortableTable(self.renderer, self.categories_tree, columns,
+                                              self.sort_orders.setdefault("categories", []))
         
         scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.categories_tree.yview)
         self.categories_tree.configure(yscrollcommand=scrollbar.set)
@@ -780,17 +1731,19 @@ class InventoryGUI:
         self.load_categories()
     
     def load_categories(self):
-        """Load categories into treeview"""
-        for item in self.categories_tree.get_children():
-            self.categories_tree.delete(item)
-        
+        """Load categories and their maintained totals into the treeview"""
         categories = self.db.get_all_categories()
-        for cat in categories:
-            self.categories_tree.insert("", tk.END, values=(
-                cat['id'],
-                cat['name'],
-                cat['description'] or ""
-            ))
+        rows = [(None, (
+            cat['id'],
+            cat['name'],
+            cat['description'] or "",
+            cat['product_count'],
+            cat['total_units'],
+            f"${cat['stock_value']:,.2f}",
+            cat['low_stock_count']
+        ), ()) for cat in categories]
+        raw = [row[1][:5] + (cat['stock_value'],) + row[1][6:] for row, cat in zip(rows, categories)]
+        self.categories_table.load(rows, raw)
     
     def show_add_category(self):
         """Show add category dialog"""
@@ -923,45 +1876,187 @@ class InventoryGUI:
             else:
                 messagebox.showerror("Error", "Failed to delete category!")
     
-    # ==================== TRANSACTIONS VIEW ====================
+    # ==================== LOCATIONS VIEW ====================
     
-    def show_transactions(self):
-        """Display transactions history"""
+    def show_locations(self):
+        """Display locations with their stock totals"""
         self.clear_main_content()
-        self.current_view = "transactions"
+        self.current_view = "locations"
         
-        header = ttk.Label(self.main_frame, text="Transaction History", style="Title.TLabel")
+        header = ttk.Label(self.main_frame, text="Locations", style="Title.TLabel")
         header.pack(anchor=tk.W, pady=(0, 20))
         
-        # Transactions table
-        table_frame = ttk.Frame(self.main_frame)
-        table_frame.pack(fill=tk.BOTH, expand=True)
-        
-        columns = ("ID", "Date", "Product", "SKU", "Type", "Quantity", "Notes", "User")
-        self.trans_tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=20)
-        
-        for col in columns:
-            self.trans_tree.heading(col, text=col)
-            self.trans_tree.column(col, width=100)
-        
-        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.trans_tree.yview)
-        self.trans_tree.configure(yscrollcommand=scrollbar.set)
+        add_btn = tk.Button(
+            self.main_frame,
+            text="+ Add Location",
+            bg="#4CAF50",
+            fg="white",
+            padx=15,
+            pady=5,
+            bd=0,
+            cursor="hand2",
+            command=self.show_add_location
+        )
+        add_btn.pack(anchor=tk.W, pady=10)
+        
+        list_frame = ttk.Frame(self.main_frame)
+        list_frame.pack(fill=tk.BOTH, expand=True)
+        
+        columns = ("ID", "Name", "Description", "SKUs", "Units")
+        self.locations_tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=20)
+        
+        column_widths = {"ID": 50, "Name": 200, "Description": 250, "SKUs": 100, "Units": 100}
+        for col in columns:
+            self.locations_tree.heading(col, text=col)
+            self.locations_tree.column(col, width=column_widths.get(col, 100))
+        self.locations_table = SortableTable(self.renderer, self.locations_tree, columns,
+                                             self.sort_orders.setdefault("locations", []))
+        
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.locations_tree.yview)
+        self.locations_tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.locations_tree.pack(fill=tk.BOTH, expand=True)
+        
+        action_frame = ttk.Frame(self.main_frame)
+        action_frame.pack(fill=tk.X, pady=10)
+        
+        delete_btn = tk.Button(
+            action_frame,
+            text="Delete Selected",
+            bg="#F44336",
+            fg="white",
+            padx=20,
+            pady=8,
+            bd=0,
+            cursor="hand2",
+            command=self.delete_selected_location
+        )
+        delete_btn.pack(side=tk.LEFT, padx=5)
+        
+        self.load_locations()
+    
+    def load_locations(self):
+        """Load locations into treeview"""
+        self.locations_table.load([(None, (
+            loc['id'],
+            loc['name'],
+            loc['description'] or "",
+            loc['sku_count'],
+            loc['total_units']
+        ), ()) for loc in self.db.get_all_locations()])
+    
+    def show_add_location(self):
+        """Show add location dialog"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Add Location")
+        dialog.geometry("400x250")
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        ttk.Label(dialog, text="Add New Location", font=("Helvetica", 16, "bold")).pack(pady=20)
+        
+        form_frame = ttk.Frame(dialog, padding=20)
+        form_frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Label(form_frame, text="Name:").grid(row=0, column=0, sticky=tk.W, pady=5)
+        name_entry = ttk.Entry(form_frame, width=30, font=("Helvetica", 11))
+        name_entry.grid(row=0, column=1, sticky=tk.W, pady=5)
+        
+        ttk.Label(form_frame, text="Description:").grid(row=1, column=0, sticky=tk.W, pady=5)
+        desc_entry = ttk.Entry(form_frame, width=30, font=("Helvetica", 11))
+        desc_entry.grid(row=1, column=1, sticky=tk.W, pady=5)
+        
+        btn_frame = ttk.Frame(dialog, padding=20)
+        btn_frame.pack(fill=tk.X)
+        
+        def save_location():
+            name = name_entry.get().strip()
+            if not name:
+                messagebox.showerror("Error", "Location name is required!")
+                return
+            
+            if self.db.add_location(name, desc_entry.get().strip()):
+                messagebox.showinfo("Success", "Location added successfully!")
+                dialog.destroy()
+                self.load_locations()
+            else:
+                messagebox.showerror("Error", "Failed to add location!")
+        
+        ttk.Button(btn_frame, text="Cancel", command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
+        tk.Button(
+            btn_frame, 
+            text="Save", 
+            bg="#4CAF50", 
+            fg="white",
+            padx=20,
+            pady=5,
+            bd=0,
+            cursor="hand2",
+            command=save_location
+        ).pack(side=tk.RIGHT, padx=5)
+    
+    def delete_selected_location(self):
+        """Delete selected location"""
+        selected = self.locations_tree.selection()
+        if not selected:
+            messagebox.showwarning("Warning", "Please select a location to delete!")
+            return
+        
+        item = self.locations_tree.item(selected[0])
+        location_id = item['values'][0]
+        location_name = item['values'][1]
+        
+        if messagebox.askyesno("Confirm Delete", f"Delete location '{location_name}'?"):
+            if self.db.delete_location(location_id):
+                messagebox.showinfo("Success", "Location deleted successfully!")
+                self.load_locations()
+            else:
+                messagebox.showerror("Error", "Failed to delete location! Locations holding stock cannot be deleted.")
+    
+    # ==================== TRANSACTIONS VIEW ====================
+    
+    def show_transactions(self):
+        """Display transactions history"""
+        self.clear_main_content()
+        self.current_view = "transactions"
+        
+        header = ttk.Label(self.main_frame, text="Transaction History", style="Title.TLabel")
+        header.pack(anchor=tk.W, pady=(0, 20))
+        
+        # Transactions table
+        table_frame = ttk.Frame(self.main_frame)
+        table_frame.pack(fill=tk.BOTH, expand=True)
+        
+        columns = ("ID", "Date", "Product", "SKU", "Type", "Quantity", "Location", "Notes", "User")
+        self.trans_tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=20)
+        
+        for col in columns:
+            self.trans_tree.heading(col, text=col)
+            self.trans_tree.column(col, width=100)
+        self.trans_table = SortableTable(self.renderer, self.trans_tree, columns,
+                                         self.sort_orders.setdefault("transactions", []))
+        
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.trans_tree.yview)
+        self.trans_tree.configure(yscrollcommand=scrollbar.set)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.trans_tree.pack(fill=tk.BOTH, expand=True)
         
         # Load transactions
         transactions = self.db.get_transactions(limit=100)
-        for trans in transactions:
-            self.trans_tree.insert("", tk.END, values=(
-                trans['id'],
-                trans['created_at'].strftime("%Y-%m-%d %H:%M"),
-                trans['product_name'],
-                trans['sku'],
-                trans['transaction_type'],
-                trans['quantity'],
-                trans['notes'] or "",
-                trans['user']
-            ))
+        rows = [(None, (
+            trans['id'],
+            trans['created_at'].strftime("%Y-%m-%d %H:%M"),
+            trans['product_name'],
+            trans['sku'],
+            trans['transaction_type'],
+            trans['quantity'],
+            trans['location_name'] or "",
+            trans['notes'] or "",
+            trans['user']
+        ), ()) for trans in transactions]
+        # Dates sort as datetimes, not as formatted text
+        raw = [(row[1][0], trans['created_at']) + row[1][2:] for row, trans in zip(rows, transactions)]
+        self.trans_table.load(rows, raw)
     
     # ==================== LOW STOCK VIEW ====================
     
@@ -986,30 +2081,911 @@ class InventoryGUI:
         table_frame.pack(fill=tk.BOTH, expand=True)
         
         columns = ("ID", "SKU", "Name", "Current Stock", "Min Level", "Needed")
-        tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=20)
+        self.low_stock_tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=20)
         
         for col in columns:
-            tree.heading(col, text=col)
-            tree.column(col, width=120)
+            self.low_stock_tree.heading(col, text=col)
+            self.low_stock_tree.column(col, width=120)
+        self.low_stock_table = SortableTable(self.renderer, self.low_stock_tree, columns,
+                                             self.sort_orders.setdefault("low_stock", []))
         
-        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=tree.yview)
-        tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.low_stock_tree.yview)
+        self.low_stock_tree.configure(yscrollcommand=scrollbar.set)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        tree.pack(fill=tk.BOTH, expand=True)
+        self.low_stock_tree.pack(fill=tk.BOTH, expand=True)
         
-        # Load low stock products
+        self.load_low_stock()
+    
+    def load_low_stock(self):
+        """Load low stock products into the treeview"""
         products = self.db.get_low_stock_products()
+        rows = [(None, (
+            product['id'],
+            product['sku'],
+            product['name'],
+            product['quantity'],
+            product['min_stock_level'],
+            product['min_stock_level'] - product['quantity'] + 10
+        ), ()) for product in products]
+        self.low_stock_table.load(rows)
+    
+    # ==================== VALUATION ====================
+    
+    def show_valuation(self):
+        """Display stock valued at FIFO and weighted average cost"""
+        self.clear_main_content()
+        self.current_view = "valuation"
+        
+        header = ttk.Label(self.main_frame, text="Inventory Valuation", style="Title.TLabel")
+        header.pack(anchor=tk.W, pady=(0, 20))
+        
+        self.valuation_totals = ttk.Frame(self.main_frame)
+        self.valuation_totals.pack(fill=tk.X, pady=(0, 20))
+        
+        # Table
+        table_frame = ttk.Frame(self.main_frame)
+        table_frame.pack(fill=tk.BOTH, expand=True)
+        
+        columns = ("ID", "SKU", "Name", "Category", "On Hand", "Avg Cost", "FIFO Value", "Avg Cost Value",
+                   "Retail Value", "FIFO COGS")
+        self.valuation_tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=20)
+        
+        for col in columns:
+            self.valuation_tree.heading(col, text=col)
+            self.valuation_tree.column(col, width=100)
+        self.valuation_tree.column("Name", width=200)
+        self.valuation_table = SortableTable(self.renderer, self.valuation_tree, columns,
+                                             self.sort_orders.setdefault("valuation", []))
+        
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.valuation_tree.yview)
+        self.valuation_tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.valuation_tree.pack(fill=tk.BOTH, expand=True)
+        
+        self.load_valuation()
+    
+    def load_valuation(self):
+        """Load each product's cost figures and the totals"""
+        products = self.db.get_inventory_valuation()
+        rows, raw = [], []
+        totals = dict.fromkeys(("fifo_value", "average_value", "retail_value", "fifo_cogs", "average_cogs"), 0)
         for product in products:
-            needed = product['min_stock_level'] - product['quantity'] + 10
-            tree.insert("", tk.END, values=(
-                product['id'],
-                product['sku'],
-                product['name'],
-                product['quantity'],
-                product['min_stock_level'],
-                needed
+            figures = (product['average_cost'], product['fifo_value'], product['average_value'],
+                       product['retail_value'], product['fifo_cogs'])
+            values = (product['id'], product['sku'], product['name'], product['category_name'] or "N/A",
+                      product['on_hand'])
+            rows.append((None, values + tuple(f"${figure:,.2f}" for figure in figures), ()))
+            raw.append(values + figures)
+            for key in totals:
+                totals[key] += product[key]
+        self.valuation_table.load(rows, raw)
+        
+        for widget in self.valuation_totals.winfo_children():
+            widget.destroy()
+        for label, key in (("FIFO Value", "fifo_value"), ("Average Cost Value", "average_value"),
+                           ("Retail Value", "retail_value"), ("FIFO COGS", "fifo_cogs"),
+                           ("Average COGS", "average_cogs")):
+            box = ttk.Frame(self.valuation_totals)
+            box.pack(side=tk.LEFT, padx=(0, 30))
+            ttk.Label(box, text=label).pack(anchor=tk.W)
+            tk.Label(box, text=f"${totals[key]:,.2f}", font=("Helvetica", 16, "bold"), fg="#2196F3").pack(anchor=tk.W)
+    
+    # ==================== CHARTS ====================
+    
+    CHART_RANGES = {"7 days": 7, "30 days": 30, "90 days": 90, "1 year": 365, "2 years": 730}
+    
+    def show_charts(self, sku=None):
+        """Display stock level and movement volume over time for a product, a category or everything"""
+        self.clear_main_content()
+        self.current_view = "charts"
+        
+        header = ttk.Label(self.main_frame, text="Movement Charts", style="Title.TLabel")
+        header.pack(anchor=tk.W, pady=(0, 20))
+        
+        controls = ttk.Frame(self.main_frame)
+        controls.pack(fill=tk.X, pady=(0, 10))
+        
+        self.chart_scope = tk.StringVar(value="Product" if sku else "All products")
+        ttk.Label(controls, text="Show:").pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Combobox(controls, textvariable=self.chart_scope, values=["Product", "Category", "All products"],
+                     width=12, state="readonly").pack(side=tk.LEFT)
+        
+        ttk.Label(controls, text="SKU:").pack(side=tk.LEFT, padx=(15, 5))
+        self.chart_sku = ttk.Entry(controls, width=15)
+        self.chart_sku.pack(side=tk.LEFT)
+        if sku:
+            self.chart_sku.insert(0, sku)
+        self.chart_sku.bind("<Return>", lambda event: self.load_chart())
+        
+        ttk.Label(controls, text="Category:").pack(side=tk.LEFT, padx=(15, 5))
+        self.chart_categories = {cat['name']: cat['id'] for cat in self.db.get_all_categories()}
+        self.chart_category = tk.StringVar()
+        ttk.Combobox(controls, textvariable=self.chart_category, values=list(self.chart_categories),
+                     width=18, state="readonly").pack(side=tk.LEFT)
+        
+        ttk.Label(controls, text="Per:").pack(side=tk.LEFT, padx=(15, 5))
+        self.chart_bucket = tk.StringVar(value="day")
+        ttk.Combobox(controls, textvariable=self.chart_bucket, values=["hour", "day", "week"],
+                     width=6, state="readonly").pack(side=tk.LEFT)
+        
+        ttk.Label(controls, text="Range:").pack(side=tk.LEFT, padx=(15, 5))
+        self.chart_range = tk.StringVar(value="90 days")
+        ttk.Combobox(controls, textvariable=self.chart_range, values=list(self.CHART_RANGES),
+                     width=8, state="readonly").pack(side=tk.LEFT)
+        
+        ttk.Button(controls, text="Draw", command=self.load_chart).pack(side=tk.LEFT, padx=15)
+        
+        self.chart_title = ttk.Label(self.main_frame, text="", font=("Helvetica", 12, "bold"))
+        self.chart_title.pack(anchor=tk.W)
+        
+        self.chart = TimeSeriesChart(self.main_frame)
+        self.chart.pack(fill=tk.BOTH, expand=True, pady=10)
+        
+        self.chart_status = tk.Label(self.main_frame, text="", fg="#757575", anchor=tk.W)
+        self.chart_status.pack(fill=tk.X)
+        
+        self.main_frame.update_idletasks()
+        self.load_chart()
+    
+    def load_chart(self):
+        """Fetch the bucketed series for the chosen scope and range and draw it"""
+        started = time.perf_counter()
+        scope, bucket = self.chart_scope.get(), self.chart_bucket.get()
+        product_id = category_id = None
+        if scope == "Product":
+            code = self.chart_sku.get().strip()
+            if not code:
+                messagebox.showwarning("Warning", "Enter a SKU to chart!")
+                return
+            product = self.sku_index.lookup(code)
+            if product is None:
+                messagebox.showerror("Error", f"No product with SKU or barcode '{code}'")
+                return
+            product_id, title = product['id'], f"{product['sku']} - {product['name']}"
+        elif scope == "Category":
+            name = self.chart_category.get()
+            if not name:
+                messagebox.showwarning("Warning", "Choose a category to chart!")
+                return
+            category_id, title = self.chart_categories[name], f"Category: {name}"
+        else:
+            title = "All products"
+        
+        end = datetime.now()
+        start = end - timedelta(days=self.CHART_RANGES[self.chart_range.get()])
+        if bucket == "hour" and end - start > timedelta(days=90):
+            # Over 2,000 points per product would be fetched just to be thinned out again
+            bucket = "day"
+            self.chart_bucket.set(bucket)
+        series = self.db.get_movement_series(bucket, start, end, product_id, category_id)
+        if series is None:
+            messagebox.showerror("Error", "Failed to load the movement series!")
+            return
+        
+        buckets = series['buckets']
+        levels = stock_levels(buckets, series['quantity'], series['net_after'], start, end)
+        volumes = [(row['bucket'], row['in_quantity'], row['out_quantity']) for row in buckets]
+        self.chart.set_data(levels, volumes, start, end)
+        
+        moved = sum(row['movements'] for row in buckets)
+        self.chart_title.config(text=f"{title} - {series['quantity']:,} on hand")
+        self.chart_status.config(
+            text=f"{moved:,} movements in {len(buckets):,} {bucket} buckets, "
+                 f"{self.chart.drawn_points:,} points drawn in {(time.perf_counter() - started) * 1000:.0f} ms"
+        )
+    
+    # ==================== SCAN MODE ====================
+    
+    def show_scan_mode(self):
+        """Display the rapid-scan entry view for keyboard-wedge barcode scanners"""
+        self.clear_main_content()
+        self.current_view = "scan"
+        
+        header = ttk.Label(self.main_frame, text="Scan Mode", style="Title.TLabel")
+        header.pack(anchor=tk.W, pady=(0, 20))
+        
+        if self.scan_stock_take:
+            count_frame = ttk.Frame(self.main_frame)
+            count_frame.pack(fill=tk.X, pady=(0, 10))
+            tk.Label(count_frame, text=f"Counting for stock take: {self.scan_stock_take['name']}",
+                     font=("Helvetica", 12, "bold"), fg="#9C27B0").pack(side=tk.LEFT)
+            ttk.Button(count_frame, text="Stop Counting", command=self.stop_scan_count).pack(side=tk.RIGHT)
+        
+        # Movement settings apply to every scan until changed
+        settings_frame = ttk.Frame(self.main_frame)
+        settings_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        ttk.Radiobutton(settings_frame, text="Stock In", variable=self.scan_type, value="IN").pack(side=tk.LEFT)
+        ttk.Radiobutton(settings_frame, text="Stock Out", variable=self.scan_type, value="OUT").pack(side=tk.LEFT, padx=10)
+        
+        ttk.Label(settings_frame, text="Quantity per scan:").pack(side=tk.LEFT, padx=(20, 5))
+        ttk.Spinbox(settings_frame, from_=1, to=10000, width=6, textvariable=self.scan_quantity).pack(side=tk.LEFT)
+        
+        ttk.Label(settings_frame, text="Location:").pack(side=tk.LEFT, padx=(20, 5))
+        self.scan_locations = {loc['name']: loc['id'] for loc in self.db.get_all_locations()}
+        ttk.Combobox(
+            settings_frame, textvariable=self.scan_location, values=[""] + list(self.scan_locations),
+            width=25, state="readonly"
+        ).pack(side=tk.LEFT)
+        
+        # Scanner input: the scanner types the code followed by Enter
+        self.scan_entry = ttk.Entry(self.main_frame, font=("Helvetica", 20))
+        self.scan_entry.pack(fill=tk.X, pady=10)
+        self.scan_entry.bind("<Return>", self.handle_scan)
+        self.scan_entry.focus_set()
+        
+        self.scan_status = tk.Label(self.main_frame, text=f"Ready - {len(self.sku_index)} SKUs indexed",
+                                    font=("Helvetica", 14, "bold"), fg="#666", anchor=tk.W)
+        self.scan_status.pack(fill=tk.X, pady=(0, 10))
+        
+        # Running tally
+        tally_frame = ttk.LabelFrame(self.main_frame, text="Tally", padding=15)
+        tally_frame.pack(fill=tk.BOTH, expand=True)
+        
+        columns = ("SKU", "Product", "Scans", "Quantity")
+        self.scan_tree = ttk.Treeview(tally_frame, columns=columns, show="headings", height=15)
+        for col in columns:
+            self.scan_tree.heading(col, text=col)
+            self.scan_tree.column(col, width=150)
+        
+        scrollbar = ttk.Scrollbar(tally_frame, orient=tk.VERTICAL, command=self.scan_tree.yview)
+        self.scan_tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.scan_tree.pack(fill=tk.BOTH, expand=True)
+        
+        btn_frame = ttk.Frame(self.main_frame)
+        btn_frame.pack(fill=tk.X, pady=10)
+        self.scan_total_label = ttk.Label(btn_frame, font=("Helvetica", 11))
+        self.scan_total_label.pack(side=tk.LEFT)
+        ttk.Button(btn_frame, text="Clear Tally", command=self.clear_scan_tally).pack(side=tk.RIGHT)
+        
+        for product_id, (product, scans, quantity) in self.scan_tally.items():
+            self.scan_tree.insert("", tk.END, iid=str(product_id),
+                                  values=(product['sku'], product['name'], scans, quantity))
+        self.update_scan_total()
+    
+    def handle_scan(self, event=None):
+        """Resolve a scanned code from the SKU index and queue the movement"""
+        code = self.scan_entry.get()
+        self.scan_entry.delete(0, tk.END)
+        if not code.strip():
+            return "break"
+        
+        product = self.sku_index.lookup(code)
+        if product is None:
+            self.scan_status.config(text=f"Unknown SKU: {code.strip()}", fg="#F44336")
+            self.root.bell()
+            return "break"
+        
+        try:
+            quantity = int(self.scan_quantity.get())
+            if quantity <= 0:
+                raise ValueError("Quantity must be positive")
+        except ValueError:
+            self.scan_status.config(text="Invalid quantity per scan", fg="#F44336")
+            self.root.bell()
+            return "break"
+        
+        movement_type = self.scan_type.get()
+        location_id = self.scan_locations.get(self.scan_location.get())
+        user = self.settings.app.default_user
+        try:
+            if self.scan_stock_take:
+                movement_type = "COUNT"
+                self.pending_counts[product['id']] = self.pending_counts.get(product['id'], 0) + quantity
+                if not self.count_flush_job:
+                    self.count_flush_job = self.root.after(1000, self.flush_scan_counts)
+            elif self.scan_queue:
+                self.scan_queue.put(product['id'], movement_type, quantity, "Scan", user, location_id)
+            elif not self.db.add_transaction(product['id'], movement_type, quantity, "Scan", user, location_id):
+                raise queue.Full
+        except queue.Full:
+            self.scan_status.config(text=f"Not recorded, scan again: {product['sku']}", fg="#F44336")
+            self.root.bell()
+            return "break"
+        except InsufficientStockError:
+            self.scan_status.config(text=f"Not enough stock: {product['sku']}", fg="#F44336")
+            self.root.bell()
+            return "break"
+        
+        # Only the scanned row changes, so each scan costs the same however long the tally is
+        _, scans, total = self.scan_tally.get(product['id'], (product, 0, 0))
+        scans += 1
+        total += -quantity if movement_type == "OUT" else quantity
+        self.scan_tally[product['id']] = (product, scans, total)
+        self.scan_count += 1
+        iid = str(product['id'])
+        values = (product['sku'], product['name'], scans, total)
+        if self.scan_tree.exists(iid):
+            self.scan_tree.item(iid, values=values)
+        else:
+            self.scan_tree.insert("", 0, iid=iid, values=values)
+        
+        self.scan_status.config(text=f"{movement_type} {quantity} x {product['name']}", fg="#4CAF50")
+        self.update_scan_total()
+        return "break"
+    
+    def flush_scan_counts(self):
+        """Send counts scanned since the last flush to the stock take in one call"""
+        self.count_flush_job = None
+        if not self.pending_counts or not self.scan_stock_take:
+            return
+        counts, self.pending_counts = self.pending_counts, {}
+        try:
+            written = self.db.record_stock_counts(self.scan_stock_take['id'], counts, add=True)
+        except StockTakeClosedError:
+            messagebox.showerror("Error", f"Stock take '{self.scan_stock_take['name']}' is no longer open!")
+            self.scan_stock_take = None
+            return
+        if written is None:
+            # Keep them for the next attempt
+            for product_id, quantity in counts.items():
+                self.pending_counts[product_id] = self.pending_counts.get(product_id, 0) + quantity
+            self.count_flush_job = self.root.after(5000, self.flush_scan_counts)
+    
+    def stop_scan_count(self):
+        """Save outstanding counts and go back to the stock take list"""
+        if self.count_flush_job:
+            self.root.after_cancel(self.count_flush_job)
+        self.flush_scan_counts()
+        if self.pending_counts:
+            messagebox.showerror("Error", "Could not save the last counts; try again when the database is reachable.")
+            return
+        self.scan_stock_take = None
+        self.show_stock_takes()
+    
+    def update_scan_total(self):
+        self.scan_total_label.config(text=f"{self.scan_count} scans, {len(self.scan_tally)} products")
+    
+    def clear_scan_tally(self):
+        self.scan_tally = {}
+        self.scan_count = 0
+        self.scan_tree.delete(*self.scan_tree.get_children())
+        self.update_scan_total()
+        self.scan_entry.focus_set()
+    
+    # ==================== STOCK TAKE ====================
+    
+    def show_stock_takes(self):
+        """Display stock takes and their progress"""
+        self.clear_main_content()
+        self.current_view = "stock_takes"
+        
+        header = ttk.Label(self.main_frame, text="Stock Take", style="Title.TLabel")
+        header.pack(anchor=tk.W, pady=(0, 20))
+        
+        add_btn = tk.Button(
+            self.main_frame,
+            text="+ New Stock Take",
+            bg="#4CAF50",
+            fg="white",
+            padx=15,
+            pady=5,
+            bd=0,
+            cursor="hand2",
+            command=self.show_new_stock_take
+        )
+        add_btn.pack(anchor=tk.W, pady=10)
+        
+        list_frame = ttk.Frame(self.main_frame)
+        list_frame.pack(fill=tk.BOTH, expand=True)
+        
+        columns = ("ID", "Name", "Location", "Status", "Lines", "Counted", "Started")
+        self.stock_takes_tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=20)
+        
+        column_widths = {"ID": 50, "Name": 200, "Location": 150, "Status": 90, "Lines": 80, "Counted": 80, "Started": 140}
+        for col in columns:
+            self.stock_takes_tree.heading(col, text=col)
+            self.stock_takes_tree.column(col, width=column_widths.get(col, 100))
+        
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.stock_takes_tree.yview)
+        self.stock_takes_tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.stock_takes_tree.pack(fill=tk.BOTH, expand=True)
+        
+        action_frame = ttk.Frame(self.main_frame)
+        action_frame.pack(fill=tk.X, pady=10)
+        
+        actions = [
+            ("Count by Scan", "#2196F3", self.count_selected_by_scan),
+            ("Import Counts (CSV)", "#2196F3", self.import_stock_counts),
+            ("Variances / Post", "#4CAF50", self.show_stock_take_variances),
+            ("Cancel Stock Take", "#F44336", self.cancel_selected_stock_take),
+        ]
+        for text, color, command in actions:
+            tk.Button(
+                action_frame,
+                text=text,
+                bg=color,
+                fg="white",
+                padx=20,
+                pady=8,
+                bd=0,
+                cursor="hand2",
+                command=command
+            ).pack(side=tk.LEFT, padx=5)
+        
+        self.load_stock_takes()
+    
+    def load_stock_takes(self):
+        """Load stock takes into the treeview"""
+        self.stock_takes_tree.delete(*self.stock_takes_tree.get_children())
+        for take in self.db.get_stock_takes():
+            self.stock_takes_tree.insert("", tk.END, iid=str(take['id']), values=(
+                take['id'],
+                take['name'],
+                take['location_name'] or "All locations",
+                take['status'],
+                take['line_count'],
+                take['counted_count'],
+                take['created_at'].strftime("%Y-%m-%d %H:%M")
             ))
     
+    def selected_stock_take(self):
+        """Return the selected stock take's (id, name, status), or None after telling the user"""
+        selected = self.stock_takes_tree.selection()
+        if not selected:
+            messagebox.showwarning("Warning", "Please select a stock take!")
+            return None
+        values = self.stock_takes_tree.item(selected[0])['values']
+        return {'id': values[0], 'name': values[1], 'status': values[3]}
+    
+    def show_new_stock_take(self):
+        """Show dialog to start a stock take"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("New Stock Take")
+        dialog.geometry("400x250")
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        form_frame = ttk.Frame(dialog, padding=20)
+        form_frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Label(form_frame, text="Name:").grid(row=0, column=0, sticky=tk.W, pady=5)
+        name_entry = ttk.Entry(form_frame, width=30)
+        name_entry.insert(0, f"Stock take {datetime.now():%Y-%m-%d}")
+        name_entry.grid(row=0, column=1, pady=5)
+        
+        ttk.Label(form_frame, text="Location:").grid(row=1, column=0, sticky=tk.W, pady=5)
+        locations = {loc['name']: loc['id'] for loc in self.db.get_all_locations()}
+        location_var = tk.StringVar(value="All locations")
+        ttk.Combobox(
+            form_frame, textvariable=location_var, values=["All locations"] + list(locations),
+            width=28, state="readonly"
+        ).grid(row=1, column=1, pady=5)
+        
+        ttk.Label(form_frame, text="Notes:").grid(row=2, column=0, sticky=tk.W, pady=5)
+        notes_entry = ttk.Entry(form_frame, width=30)
+        notes_entry.grid(row=2, column=1, pady=5)
+        
+        def save():
+            name = name_entry.get().strip()
+            if not name:
+                messagebox.showerror("Error", "Name is required!")
+                return
+            stock_take_id = self.db.start_stock_take(
+                name, locations.get(location_var.get()), user=self.settings.app.default_user,
+                notes=notes_entry.get().strip()
+            )
+            if stock_take_id:
+                dialog.destroy()
+                self.load_stock_takes()
+            else:
+                messagebox.showerror("Error", "Failed to start stock take!")
+        
+        ttk.Button(form_frame, text="Start", command=save).grid(row=3, column=1, sticky=tk.E, pady=15)
+    
+    def count_selected_by_scan(self):
+        """Open scan mode counting into the selected stock take"""
+        take = self.selected_stock_take()
+        if not take:
+            return
+        if take['status'] != "open":
+            messagebox.showerror("Error", "Only open stock takes can be counted!")
+            return
+        self.scan_stock_take = take
+        self.scan_tally = {}
+        self.scan_count = 0
+        self.show_scan_mode()
+    
+    def import_stock_counts(self):
+        """Load counts for the selected stock take from a CSV file (SKU, count)"""
+        take = self.selected_stock_take()
+        if not take:
+            return
+        path = filedialog.askopenfilename(
+            title="Import Counts", filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        try:
+            counts, problems = read_counts_csv(path, self.sku_index)
+        except (OSError, UnicodeDecodeError) as e:
+            messagebox.showerror("Error", f"Could not read file:\n{e}")
+            return
+        
+        try:
+            written = self.db.record_stock_counts(take['id'], counts)
+        except StockTakeClosedError:
+            messagebox.showerror("Error", "Only open stock takes can be counted!")
+            return
+        if written is None:
+            messagebox.showerror("Error", "Failed to record counts!")
+            return
+        
+        message = f"Recorded counts for {written} products."
+        if problems:
+            message += f"\n\n{len(problems)} lines skipped:\n" + "\n".join(problems[:10])
+        messagebox.showinfo("Import Counts", message)
+        self.load_stock_takes()
+    
+    def show_stock_take_variances(self):
+        """Show the variances of the selected stock take and post them"""
+        take = self.selected_stock_take()
+        if not take:
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"Variances - {take['name']}")
+        dialog.geometry("800x500")
+        dialog.transient(self.root)
+        
+        uncounted_var = tk.BooleanVar(value=False)
+        top_frame = ttk.Frame(dialog, padding=10)
+        top_frame.pack(fill=tk.X)
+        summary_label = ttk.Label(top_frame, font=("Helvetica", 11))
+        summary_label.pack(side=tk.LEFT)
+        
+        columns = ("SKU", "Product", "Expected", "Counted", "Variance", "Value")
+        tree = ttk.Treeview(dialog, columns=columns, show="headings", height=18)
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=120)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10)
+        
+        def load():
+            tree.delete(*tree.get_children())
+            variances = self.db.get_stock_take_variances(take['id'], uncounted_var.get())
+            for row in variances:
+                tree.insert("", tk.END, values=(
+                    row['sku'],
+                    row['name'],
+                    row['expected'],
+                    "" if row['counted'] is None else row['counted'],
+                    f"{row['variance']:+d}",
+                    f"${row['value_variance']:,.2f}"
+                ))
+            net = sum(float(row['value_variance']) for row in variances)
+            summary_label.config(text=f"{len(variances)} products differ, net value ${net:,.2f}")
+        
+        def post():
+            if not messagebox.askyesno(
+                "Confirm", "Post these variances as stock adjustments and close the stock take?", parent=dialog
+            ):
+                return
+            try:
+                posted = self.db.post_stock_take(take['id'], user=self.settings.app.default_user,
+                                                 uncounted_as_zero=uncounted_var.get())
+            except StockTakeClosedError:
+                messagebox.showerror("Error", "This stock take is no longer open!", parent=dialog)
+                return
+            if posted is None:
+                messagebox.showerror("Error", "Failed to post stock take!", parent=dialog)
+                return
+            messagebox.showinfo("Success", f"Posted {posted} stock adjustments.", parent=dialog)
+            dialog.destroy()
+            self.load_stock_takes()
+        
+        ttk.Checkbutton(top_frame, text="Treat uncounted as zero", variable=uncounted_var,
+                        command=load).pack(side=tk.RIGHT)
+        
+        btn_frame = ttk.Frame(dialog, padding=10)
+        btn_frame.pack(fill=tk.X)
+        ttk.Button(btn_frame, text="Close", command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
+        if take['status'] == "open":
+            ttk.Button(btn_frame, text="Post Adjustments", command=post).pack(side=tk.RIGHT, padx=5)
+        
+        load()
+    
+    def cancel_selected_stock_take(self):
+        """Cancel the selected stock take without posting"""
+        take = self.selected_stock_take()
+        if not take:
+            return
+        if messagebox.askyesno("Confirm", f"Cancel stock take '{take['name']}'? Its counts will not be posted."):
+            if self.db.cancel_stock_take(take['id']):
+                self.load_stock_takes()
+            else:
+                messagebox.showerror("Error", "Only open stock takes can be cancelled!")
+    
+    # ==================== LIVE UPDATES ====================
+    
+    def poll_changes(self):
+        """Pick up changes from other terminals and reschedule, backing off while polls fail"""
+        try:
+            self.change_feed.poll()
+        except Exception:
+            # Logged once per outage; the title shows it is still going on
+            if not self.poll_failures:
+                logger.exception("Error polling changes")
+            self.poll_failures += 1
+        else:
+            if self.poll_failures:
+                logger.info("Change polling recovered after %d failed polls", self.poll_failures)
+            self.poll_failures = 0
+        self.update_sync_status()
+        self.check_synced_stock_outs()
+        self.root.after(self.poll_delay_ms(), self.poll_changes)
+    
+    def poll_delay_ms(self):
+        if not self.poll_failures:
+            return self.change_poll_ms
+        return max(self.change_poll_ms, min(MAX_POLL_BACKOFF_MS, self.change_poll_ms * 2 ** min(self.poll_failures, 16)))
+
+    def apply_settings(self, settings, changed):
+        """SettingsWatcher listener: take up reloaded timings on the next tick"""
+        self.change_poll_ms = settings.tuning.change_poll_ms
+        self.dashboard_resync_s = settings.tuning.dashboard_resync_s
+        if "tuning.dashboard_refresh_s" in changed:
+            self.dashboard_interval.set(str(settings.tuning.dashboard_refresh_s))
+        self.profiler.heartbeat_ms = settings.tuning.ui_heartbeat_ms
+        self.profiler.stall_ms = settings.tuning.ui_stall_ms
+        self.profiler.profile_dir = settings.app.profile_dir
+
+    def check_synced_stock_outs(self):
+        """Low stock warnings for journaled stock-outs once the syncer has applied them"""
+        if not self.low_stock_watch:
+            return
+        statuses = self.syncer.journal.statuses(self.low_stock_watch)
+        for key in list(self.low_stock_watch):
+            status = statuses.get(key)
+            if status == "pending":
+                continue
+            product_id = self.low_stock_watch.pop(key)
+            if status == "synced":
+                self.warn_if_low_stock(product_id)
+    
+    def update_sync_status(self):
+        """Show movements not yet saved to the database in the title and report rejected ones"""
+        status = []
+        counts = self.syncer.journal.counts() if self.syncer else {}
+        if self.syncer:
+            pending = counts['pending']
+            if not self.syncer.online:
+                status.append(f"Offline ({pending} pending)")
+            elif pending:
+                status.append(f"Syncing ({pending} pending)")
+        if self.scan_queue and self.scan_queue.pending:
+            status.append(f"{self.scan_queue.pending} scans unsaved")
+        if self.poll_failures:
+            status.append(f"Live updates failing (retry in {self.poll_delay_ms() // 1000}s)")
+        self.root.title(" - ".join([self.root.title().split(" - ")[0]] + status))
+        
+        rejected = []
+        if self.syncer and counts['rejected'] != self.rejected_count:
+            self.rejected_count = counts['rejected']
+            rejected = self.syncer.journal.rejected(self.last_rejected_seq)
+            if rejected:
+                self.last_rejected_seq = rejected[-1]['seq']
+        if self.scan_queue:
+            rejected += self.scan_queue.take_rejected()
+        if rejected:
+            lines = [f"{m['created_at']}  {m['transaction_type']} {m['quantity']} of product {m['product_id']}: {m['error']}"
+                     for m in rejected[:10]]
+            if len(rejected) > 10:
+                lines.append(f"... and {len(rejected) - 10} more")
+            messagebox.showwarning("Movements Rejected",
+                                   "These movements could not be applied:\n\n" + "\n".join(lines))
+    
+    def refresh_products(self):
+        """Show a local catalogue write: polling the feed carries it to the catalogue, SKU index and table"""
+        try:
+            self.change_feed.poll()
+        except Exception:
+            logger.exception("Polling for changes after a local write failed")
+            if self.current_view == "products":
+                self.load_products(self.products_search_term)
+    
+    def dispatch_changes(self, events):
+        """Change feed subscriber: re-read changed products once for the catalogue, the view and the SKU index"""
+        upserted, _ = changed_ids(events, "product")
+        products = fetch_products(self.db, upserted)
+        catalogue_events = [e for e in events if e['entity'] in ("product", "category")]
+        if catalogue_events:
+            self.catalogue.apply_changes(catalogue_events, products)
+        self.apply_changes(events, products)
+        product_events = [e for e in events if e['entity'] == "product"]
+        if product_events:
+            self.sku_index.apply_changes(product_events, products)
+    
+    def apply_changes(self, events, products=None):
+        """Apply change feed events to the view that is currently shown"""
+        if self.current_view == "dashboard":
+            # Applied on the dashboard's own timer
+            if self.dashboard_live.get():
+                self.dashboard_pending.extend(events)
+        elif self.current_view == "products":
+            self.apply_product_changes(events, products)
+        elif self.current_view == "categories":
+            # Totals are maintained per category, so a reload is one row per category
+            if any(e['entity'] in ("category", "product") for e in events):
+                self.load_categories()
+        elif self.current_view == "locations":
+            if any(e['entity'] == "location" or e['payload'].get('location_id') or e['op'] == "transfer"
+                   for e in events):
+                self.load_locations()
+        elif self.current_view == "low_stock":
+            if any(e['entity'] == "product" for e in events):
+                self.load_low_stock()
+    
+    def apply_product_changes(self, events, products=None):
+        """Update only the changed rows of the products tree"""
+        upserted, deleted = changed_ids(events, "product")
+        if self.renderer.busy(self.products_tree) and (upserted or deleted):
+            # Rows not yet inserted would come back stale; reload instead
+            self.load_products(self.products_search_term)
+            return
+        if any(e['entity'] == "category" for e in events):
+            # Category names are denormalised into every row
+            self.load_products(self.products_search_term)
+            return
+        
+        if products is None:
+            products = fetch_products(self.db, upserted)
+        changed = {}
+        for product_id in sorted(upserted):
+            if product_id not in products:
+                # Gone by now: deleted by a later event
+                deleted.add(product_id)
+                continue
+            row, raw = self.product_entry(products[product_id])
+            changed[row[0]] = (row, raw)
+        deleted = [str(i) for i in deleted]
+        if self.products_search_term:
+            self.products_table.update(changed, deleted, prepend=False)
+        else:
+            # The catalogue already holds the changes as an overlay; swap in a fresh lazy view of it
+            rows, raw = self.catalogue_rows()
+            self.products_table.update(changed, deleted, rows=rows, raw=raw)
+    
+    # ==================== DIAGNOSTICS ====================
+    
+    def show_diagnostics(self):
+        """Show database timing stats and slow queries"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Diagnostics")
+        dialog.geometry("900x600")
+        dialog.transient(self.root)
+        
+        ttk.Label(dialog, text="Database Diagnostics", font=("Helvetica", 16, "bold")).pack(pady=10)
+        summary_label = ttk.Label(dialog, text="", font=("Helvetica", 10))
+        summary_label.pack()
+        
+        notebook = ttk.Notebook(dialog)
+        notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        def make_tree(title, columns, widths):
+            frame = ttk.Frame(notebook)
+            notebook.add(frame, text=title)
+            tree = ttk.Treeview(frame, columns=columns, show="headings")
+            for col in columns:
+                tree.heading(col, text=col)
+                tree.column(col, width=widths.get(col, 70), anchor=tk.W if col in widths else tk.E)
+            scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
+            tree.configure(yscrollcommand=scrollbar.set)
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            tree.pack(fill=tk.BOTH, expand=True)
+            return tree
+        
+        stat_columns = ("Name", "Calls", "Errors", "Avg ms", "p95 ms", "p99 ms", "Max ms", "Rows", "KB")
+        methods_tree = make_tree("Methods", stat_columns, {"Name": 220})
+        statements_tree = make_tree("Statements", stat_columns, {"Name": 360})
+        slow_tree = make_tree("Slow Queries", ("Time", "Method", "ms", "SQL"), {"Time": 140, "Method": 150, "SQL": 480})
+        prepared_tree = make_tree("Prepared", ("SQL", "Prepares", "Executions", "Reuse %"), {"SQL": 560})
+        ui_tree = make_tree("UI Calls", ("Call", "Calls", "Avg ms", "p95 ms", "Max ms", "DB avg", "Transform avg",
+                                         "Widgets avg"), {"Call": 240})
+        stalls_tree = make_tree("UI Stalls", ("Time", "Lag ms", "After"), {"Time": 140, "After": 560})
+        
+        def refresh():
+            snapshot = self.db.stats.snapshot()
+            ui = self.profiler.snapshot()
+            lag = ui['lag']
+            summary_label.config(
+                text=f"Since {snapshot['started_at']} | slow query threshold {snapshot['slow_query_ms']} ms | "
+                     f"UI lag avg {lag['avg_ms']:.1f} ms, p99 {lag['p99_ms']:.0f} ms, max {lag['max_ms']:.0f} ms"
+            )
+            ui_tree.delete(*ui_tree.get_children())
+            calls = sorted(ui['calls'].items(), key=lambda kv: kv[1]['wall']['total_ms'] if 'wall' in kv[1] else 0,
+                           reverse=True)
+            for name, phases in calls:
+                wall = phases.get('wall')
+                if wall is None:
+                    continue
+                ui_tree.insert("", tk.END, values=(
+                    name, wall['count'], f"{wall['avg_ms']:.2f}", f"{wall['p95_ms']:.0f}", f"{wall['max_ms']:.2f}",
+                    *(f"{phases[phase]['avg_ms']:.2f}" if phase in phases else "" for phase in
+                      ("db", "transform", "widgets"))
+                ))
+            stalls_tree.delete(*stalls_tree.get_children())
+            for entry in reversed(ui['stalls']):
+                stalls_tree.insert("", tk.END, values=(entry['time'], entry['lag_ms'], ", ".join(entry['calls'])))
+            for tree, key in ((methods_tree, 'methods'), (statements_tree, 'statements')):
+                tree.delete(*tree.get_children())
+                rows = sorted(snapshot[key].items(), key=lambda kv: kv[1]['total_ms'], reverse=True)
+                for name, s in rows:
+                    tree.insert("", tk.END, values=(
+                        name, s['count'], s['errors'], f"{s['avg_ms']:.2f}", f"{s['p95_ms']:.0f}",
+                        f"{s['p99_ms']:.0f}", f"{s['max_ms']:.2f}", s['rows'], f"{s['bytes'] / 1024:.1f}"
+                    ))
+            slow_tree.delete(*slow_tree.get_children())
+            for entry in reversed(snapshot['slow_queries']):
+                slow_tree.insert("", tk.END, values=(entry['time'], entry['method'], entry['elapsed_ms'], entry['sql']))
+            prepared_tree.delete(*prepared_tree.get_children())
+            rows = sorted(snapshot['prepared_statements'].items(), key=lambda kv: kv[1]['executions'], reverse=True)
+            for sql, p in rows:
+                prepared_tree.insert("", tk.END, values=(
+                    sql, p['prepares'], p['executions'], f"{p['reuse_ratio'] * 100:.1f}"
+                ))
+        
+        def export():
+            path = filedialog.asksaveasfilename(
+                parent=dialog, defaultextension=".json", filetypes=[("JSON", "*.json")],
+                initialfile=f"db-stats-{datetime.now():%Y%m%d-%H%M%S}.json"
+            )
+            if path:
+                self.db.stats.dump(path)
+                messagebox.showinfo("Success", f"Stats written to {path}", parent=dialog)
+        
+        def export_ui():
+            path = filedialog.asksaveasfilename(
+                parent=dialog, defaultextension=".json", filetypes=[("JSON", "*.json")],
+                initialfile=f"ui-stats-{datetime.now():%Y%m%d-%H%M%S}.json"
+            )
+            if path:
+                self.profiler.dump(path)
+                messagebox.showinfo("Success", f"UI stats written to {path}", parent=dialog)
+        
+        def reset():
+            self.db.stats.reset()
+            self.profiler.reset()
+            refresh()
+        
+        btn_frame = ttk.Frame(dialog, padding=10)
+        btn_frame.pack(fill=tk.X)
+        ttk.Button(btn_frame, text="Close", command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(btn_frame, text="Export UI JSON", command=export_ui).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(btn_frame, text="Export JSON", command=export).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(btn_frame, text="Reset", command=reset).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(btn_frame, text="Refresh", command=refresh).pack(side=tk.RIGHT, padx=5)
+        
+        refresh()
+    
+    def toggle_cpu_profiling(self):
+        """Help menu: start a cProfile capture, or stop it and write it out"""
+        if self.cpu_profiling.get():
+            self.profiler.start_cpu_profile()
+            return
+        try:
+            path = self.profiler.stop_cpu_profile()
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not write the CPU profile:\n{e}")
+            return
+        if path:
+            messagebox.showinfo("CPU Profile", f"Profile written to {path}\n(summary in the matching .txt file)")
+    
+    def toggle_memory_tracing(self):
+        """Help menu: start tracing allocations, or stop and write the snapshot out"""
+        if self.memory_tracing.get():
+            self.profiler.start_memory_trace()
+            return
+        try:
+            path = self.profiler.stop_memory_trace()
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not write the memory trace:\n{e}")
+            return
+        if path:
+            messagebox.showinfo("Memory Trace", f"Snapshot written to {path}\n(summary in the matching .txt file)")
+    
     # ==================== ABOUT ====================
     
     def show_about(self):
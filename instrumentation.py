@@ -0,0 +1,349 @@
+"""
+Instrumentation Module
+Query timing and slow-query logging for the Database class.
+
+Every public Database method and every cursor execution is timed. Stats are
+kept per method and per SQL statement (call counts, latency histogram, rows
+returned, approximate bytes fetched). Statements slower than the threshold are
+logged with their parameters and EXPLAIN plan.
+"""
+
+import functools
+import json
+import logging
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+
+logger = logging.getLogger("inventory.db")
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+
+EXPLAINABLE = ("SELECT", "UPDATE", "DELETE")
+
+
+def normalize_sql(query):
+    """Collapse whitespace so the same statement always maps to the same key"""
+    return re.sub(r"\s+", " ", str(query)).strip()
+
+
+def row_size(row):
+    """Approximate the number of bytes a fetched row carries"""
+    if row is None:
+        return 0
+    values = row.values() if isinstance(row, dict) else row
+    size = 0
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, (bytes, bytearray)):
+            size += len(value)
+        elif isinstance(value, str):
+            size += len(value.encode("utf-8", "ignore"))
+        else:
+            size += 8
+    return size
+
+
+class TimingStats:
+    """Counters and latency histogram for one method or statement"""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.histogram = [0] * len(HISTOGRAM_BUCKETS_MS)
+
+    def add(self, elapsed_ms, rows=0, nbytes=0, error=False):
+        self.count += 1
+        self.errors += int(error)
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.rows += rows
+        self.bytes += nbytes
+        for i, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.histogram[i] += 1
+                break
+
+    def percentile(self, pct):
+        """Estimate a percentile from the histogram (upper bucket bound)"""
+        if not self.count:
+            return 0.0
+        target = self.count * pct / 100.0
+        seen = 0
+        for bound, hits in zip(HISTOGRAM_BUCKETS_MS, self.histogram):
+            seen += hits
+            if seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'total_ms': round(self.total_ms, 3),
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'max_ms': round(self.max_ms, 3),
+            'p50_ms': round(self.percentile(50), 3),
+            'p95_ms': round(self.percentile(95), 3),
+            'p99_ms': round(self.percentile(99), 3),
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'histogram': {
+                ("inf" if bound == float("inf") else str(bound)): hits
+                for bound, hits in zip(HISTOGRAM_BUCKETS_MS, self.histogram)
+            },
+        }
+
+
+class QueryStats:
+    """Thread-safe collection of method, statement and slow-query stats"""
+
+    def __init__(self, slow_query_ms=200, max_slow_queries=100, explain_slow_queries=True):
+        self.slow_query_ms = slow_query_ms
+        self.explain_slow_queries = explain_slow_queries
+        self.lock = threading.Lock()
+        self.started_at = datetime.now()
+        self.methods = {}
+        self.statements = {}
+        self.prepared = {}
+        self.slow_queries = deque(maxlen=max_slow_queries)
+        # Wall time inside outermost Database calls; never reset, callers diff it around their own work
+        self.busy_ms = 0.0
+
+    def record_method(self, name, elapsed_ms, rows=0, nbytes=0, error=False):
+        with self.lock:
+            self.methods.setdefault(name, TimingStats()).add(elapsed_ms, rows, nbytes, error)
+
+    def add_busy(self, elapsed_ms):
+        with self.lock:
+            self.busy_ms += elapsed_ms
+
+    def record_statement(self, sql, elapsed_ms, rows=0, nbytes=0, error=False):
+        with self.lock:
+            self.statements.setdefault(sql, TimingStats()).add(elapsed_ms, rows, nbytes, error)
+
+    def record_prepared(self, sql, prepared):
+        """Count an execution of a prepared statement and whether it had to be prepared first"""
+        with self.lock:
+            counts = self.prepared.setdefault(sql, {'prepares': 0, 'executions': 0})
+            counts['prepares'] += int(prepared)
+            counts['executions'] += 1
+
+    def add_slow_query(self, method, sql, params, elapsed_ms, plan):
+        entry = {
+            'time': datetime.now().isoformat(timespec="seconds"),
+            'method': method,
+            'sql': sql,
+            'params': [repr(p) for p in params] if params else [],
+            'elapsed_ms': round(elapsed_ms, 3),
+            'plan': plan,
+        }
+        with self.lock:
+            self.slow_queries.append(entry)
+        logger.warning(
+            "Slow query (%.1f ms) in %s: %s params=%s plan=%s",
+            elapsed_ms, method, sql, entry['params'], json.dumps(plan, default=str)
+        )
+
+    def reset(self):
+        with self.lock:
+            self.started_at = datetime.now()
+            self.methods.clear()
+            self.statements.clear()
+            self.prepared.clear()
+            self.slow_queries.clear()
+
+    def snapshot(self):
+        """Machine-readable copy of all stats"""
+        with self.lock:
+            return {
+                'started_at': self.started_at.isoformat(timespec="seconds"),
+                'generated_at': datetime.now().isoformat(timespec="seconds"),
+                'slow_query_ms': self.slow_query_ms,
+                'methods': {name: s.to_dict() for name, s in self.methods.items()},
+                'statements': {sql: s.to_dict() for sql, s in self.statements.items()},
+                'prepared_statements': {
+                    sql: dict(counts, reuse_ratio=round(1 - counts['prepares'] / counts['executions'], 3))
+                    for sql, counts in self.prepared.items()
+                },
+                'slow_queries': list(self.slow_queries),
+            }
+
+    def dump(self, path):
+        """Write the stats snapshot to a JSON file"""
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2, default=str)
+        return path
+
+
+class InstrumentedCursor:
+    """Cursor wrapper that times executions and counts fetched rows and bytes"""
+
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+        self._sql = None
+        self._params = None
+        self._elapsed_ms = 0.0
+        self._rows = 0
+        self._bytes = 0
+        self._error = False
+        self.total_rows = 0
+        self.total_bytes = 0
+        self.total_errors = 0
+        self.pending_slow = []
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def _timed(self, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        except Exception:
+            self._error = True
+            self.total_errors += 1
+            raise
+        finally:
+            self._elapsed_ms += (time.perf_counter() - start) * 1000
+
+    def _count(self, rows):
+        nbytes = sum(row_size(row) for row in rows)
+        self._rows += len(rows)
+        self._bytes += nbytes
+        self.total_rows += len(rows)
+        self.total_bytes += nbytes
+
+    def count_external(self, rows, nbytes, error=False):
+        """Add rows, bytes and errors of a statement run outside this cursor to the method totals"""
+        self.total_rows += rows
+        self.total_bytes += nbytes
+        self.total_errors += int(error)
+
+    def finish_statement(self):
+        """Record the statement that is currently open, if any"""
+        if self._sql is None:
+            return
+        self._stats.record_statement(self._sql, self._elapsed_ms, self._rows, self._bytes, self._error)
+        if self._elapsed_ms >= self._stats.slow_query_ms:
+            self.pending_slow.append((self._sql, self._params, self._elapsed_ms))
+        self._sql = None
+
+    def _start_statement(self, query, params):
+        self.finish_statement()
+        self._sql = normalize_sql(query)
+        self._params = params
+        self._elapsed_ms = 0.0
+        self._rows = 0
+        self._bytes = 0
+        self._error = False
+
+    def execute(self, query, params=None, *args, **kwargs):
+        self._start_statement(query, params)
+        return self._timed(lambda: self._cursor.execute(query, params, *args, **kwargs))
+
+    def executemany(self, query, seq_params):
+        seq_params = list(seq_params)
+        self._start_statement(query, seq_params[0] if seq_params else None)
+        return self._timed(self._cursor.executemany, query, seq_params)
+
+    def fetchone(self):
+        row = self._timed(self._cursor.fetchone)
+        if row is not None:
+            self._count([row])
+        return row
+
+    def fetchmany(self, size=1):
+        rows = self._timed(self._cursor.fetchmany, size)
+        self._count(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(self._cursor.fetchall)
+        self._count(rows)
+        return rows
+
+    def close(self):
+        self.finish_statement()
+        return self._cursor.close()
+
+
+def explain_plan(connection, stats, sql, params):
+    """EXPLAIN a statement with its parameters through a plain cursor; None if it is not explained"""
+    if not stats.explain_slow_queries or sql.split(" ", 1)[0].upper() not in EXPLAINABLE:
+        return None
+    explain = None
+    try:
+        explain = connection.cursor(dictionary=True, buffered=True)
+        explain.execute("EXPLAIN " + sql, tuple(params) if params else None)
+        return explain.fetchall()
+    except Exception as e:
+        return f"EXPLAIN failed: {e}"
+    finally:
+        if explain is not None:
+            explain.close()
+
+
+def explain_slow_queries(db, method):
+    """Log the slow statements collected during a method call with their EXPLAIN plans"""
+    cursor = db.cursor
+    pending, cursor.pending_slow = cursor.pending_slow, []
+    for sql, params, elapsed_ms in pending:
+        plan = explain_plan(db.connection, db.stats, sql, params)
+        db.stats.add_slow_query(method, sql, params, elapsed_ms, plan)
+
+
+def instrument_method(name, func):
+    """Wrap a Database method so each call is timed and attributed"""
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        cursor = self.cursor
+        if not isinstance(cursor, InstrumentedCursor):
+            return func(self, *args, **kwargs)
+
+        outermost = getattr(self, "_instrument_depth", 0) == 0
+        self._instrument_depth = getattr(self, "_instrument_depth", 0) + 1
+        rows, nbytes, errors = cursor.total_rows, cursor.total_bytes, cursor.total_errors
+        start = time.perf_counter()
+        failed = False
+        try:
+            return func(self, *args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._instrument_depth -= 1
+            cursor.finish_statement()
+            self.stats.record_method(
+                name, elapsed_ms,
+                cursor.total_rows - rows,
+                cursor.total_bytes - nbytes,
+                failed or cursor.total_errors > errors
+            )
+            if outermost:
+                self.stats.add_busy(elapsed_ms)
+                if cursor.pending_slow:
+                    explain_slow_queries(self, name)
+    return wrapper
+
+
+def instrumented(cls):
+    """Class decorator that instruments every public method except connection handling"""
+    for name, value in list(vars(cls).items()):
+        if name.startswith("_") or name in ("connect", "disconnect") or not callable(value):
+            continue
+        setattr(cls, name, instrument_method(name, value))
+    return cls
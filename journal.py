@@ -0,0 +1,277 @@
+"""
+Offline Journal Module
+Durable local journal for stock movements, synced to MySQL in the background.
+
+Movements are written to a local SQLite file first, so a till keeps working at
+local-disk speed while the link to the central database is down. JournalSyncer
+flushes pending movements in batches from its own thread and connection. Every
+movement carries a unique key that is stored with its ledger row, so a batch
+that is retried after a dropped connection is never applied twice. While the
+database is unreachable the syncer backs off exponentially. A batch the
+database keeps failing (lock conflicts past the retries) is retried up to
+max_attempts times before its movements are rejected, so it cannot hold up
+the journal for good.
+
+    journal = OfflineJournal("inventory_journal.db")
+    syncer = JournalSyncer(journal, lambda: Database(**DB_CONFIG))
+    syncer.start()
+    journal.record(product_id, "OUT", 2)
+    syncer.wake()
+"""
+
+import logging
+import random
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+
+logger = logging.getLogger("inventory.journal")
+
+JOURNAL_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS movements (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        key TEXT NOT NULL UNIQUE,
+        product_id INTEGER NOT NULL,
+        transaction_type TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        notes TEXT,
+        user TEXT,
+        location_id INTEGER,
+        unit_cost TEXT,
+        created_at TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        synced_at TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_movements_status ON movements (status, seq);
+"""
+
+MOVEMENT_FIELDS = (
+    "seq", "key", "product_id", "transaction_type", "quantity", "notes", "user", "location_id", "unit_cost",
+    "created_at"
+)
+
+
+class OfflineJournal:
+    """Append-only local store of stock movements awaiting sync (pending, synced or rejected)"""
+
+    def __init__(self, path="inventory_journal.db"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        # WAL keeps appends cheap; FULL sync makes each record durable once it returns
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=FULL")
+        self.connection.executescript(JOURNAL_SCHEMA)
+        # Journals written before unit costs were recorded
+        columns = {row['name'] for row in self.connection.execute("PRAGMA table_info(movements)")}
+        if "unit_cost" not in columns:
+            self.connection.execute("ALTER TABLE movements ADD COLUMN unit_cost TEXT")
+        # Kept up to date by every write, so status displays never have to count rows
+        self._counts = {'pending': 0, 'synced': 0, 'rejected': 0}
+        rows = self.connection.execute("SELECT status, COUNT(*) FROM movements GROUP BY status").fetchall()
+        self._counts.update({status: count for status, count in rows})
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def record(self, product_id, transaction_type, quantity, notes="", user="Admin", location_id=None,
+               unit_cost=None):
+        """Durably record a movement and return its key"""
+        key = str(uuid.uuid4())
+        with self.lock, self.connection:
+            self.connection.execute("""
+                INSERT INTO movements
+                    (key, product_id, transaction_type, quantity, notes, user, location_id, unit_cost, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (key, product_id, transaction_type, quantity, notes, user, location_id,
+                  None if unit_cost is None else str(unit_cost),
+                  datetime.now().isoformat(sep=" ", timespec="seconds")))
+            self._counts['pending'] += 1
+        return key
+
+    def pending(self, limit=100):
+        """Oldest movements not yet synced, in the order they were recorded"""
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT {', '.join(MOVEMENT_FIELDS)}, attempts FROM movements "
+                "WHERE status = 'pending' ORDER BY seq LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def mark_synced(self, keys):
+        now = datetime.now().isoformat(sep=" ", timespec="seconds")
+        with self.lock, self.connection:
+            cursor = self.connection.executemany(
+                "UPDATE movements SET status = 'synced', synced_at = ?, error = NULL "
+                "WHERE key = ? AND status = 'pending'",
+                [(now, key) for key in keys]
+            )
+            self._move_count("pending", "synced", cursor.rowcount)
+
+    def mark_rejected(self, rejected):
+        """Set aside movements the database refused, with the reason"""
+        with self.lock, self.connection:
+            cursor = self.connection.executemany(
+                "UPDATE movements SET status = 'rejected', error = ? WHERE key = ? AND status = 'pending'",
+                [(reason, key) for key, reason in rejected.items()]
+            )
+            self._move_count("pending", "rejected", cursor.rowcount)
+
+    def _move_count(self, old, new, count):
+        self._counts[old] -= count
+        self._counts[new] += count
+
+    def note_failure(self, keys, error):
+        """Count a failed sync attempt for movements that stay pending"""
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "UPDATE movements SET attempts = attempts + 1, error = ? WHERE key = ?",
+                [(error, key) for key in keys]
+            )
+
+    def statuses(self, keys):
+        """Current status of each of the given movements, by key"""
+        keys = list(keys)
+        if not keys:
+            return {}
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT key, status FROM movements WHERE key IN ({', '.join('?' * len(keys))})", keys
+            ).fetchall()
+        return {row['key']: row['status'] for row in rows}
+
+    def counts(self):
+        """Number of movements in each status, without a query"""
+        with self.lock:
+            return dict(self._counts)
+
+    def rejected(self, after_seq=0):
+        """Rejected movements recorded after the given sequence number"""
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT {', '.join(MOVEMENT_FIELDS)}, error FROM movements "
+                "WHERE status = 'rejected' AND seq > ? ORDER BY seq",
+                (after_seq,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def purge_synced(self, older_than_days=7):
+        """Delete synced movements older than the given age; returns the number removed"""
+        cutoff = (datetime.now() - timedelta(days=older_than_days)).isoformat(sep=" ", timespec="seconds")
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "DELETE FROM movements WHERE status = 'synced' AND synced_at < ?", (cutoff,)
+            )
+            self._counts['synced'] -= cursor.rowcount
+        return cursor.rowcount
+
+
+class JournalSyncer:
+    """Background thread that flushes the journal to the database in keyed batches"""
+
+    def __init__(self, journal, db_factory, batch_size=200, idle_interval=5.0, base_delay=1.0, max_delay=60.0,
+                 max_attempts=20):
+        self.journal = journal
+        self.db_factory = db_factory
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.idle_interval = idle_interval
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.db = None
+        self.online = False
+        self.last_error = None
+        self.thread = None
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="journal-sync", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5.0):
+        """Stop the thread; pending movements stay in the journal for next time"""
+        self.stopping.set()
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join(timeout)
+        if self.db:
+            self.db.disconnect()
+            self.db = None
+
+    def wake(self):
+        """Sync soon instead of waiting for the idle interval"""
+        self.wakeup.set()
+
+    def run(self):
+        self.online = self._connection() is not None
+        delay = 0.0
+        while not self.stopping.is_set():
+            batch = self.journal.pending(self.batch_size)
+            if not batch:
+                self.wakeup.wait(self.idle_interval)
+                self.wakeup.clear()
+                continue
+
+            if self.sync_batch(batch):
+                # Keep going straight away until the backlog is drained
+                delay = 0.0
+                continue
+
+            delay = min(self.max_delay, delay * 2 or self.base_delay)
+            self.stopping.wait(delay * random.uniform(0.5, 1.5))
+
+    def sync_batch(self, batch):
+        """Apply one batch; returns False if the database could not be reached"""
+        db = self._connection()
+        result = db.apply_movements(batch) if db else None
+        if result is None:
+            reachable = db is not None and db.connection.is_connected()
+            self.online = False
+            self.last_error = "Database error" if reachable else "Database unreachable"
+            self.journal.note_failure([m['key'] for m in batch], self.last_error)
+            if reachable:
+                # Only time offline is unlimited; a database that answers but keeps failing is not waited out
+                exhausted = {
+                    m['key']: f"Gave up after {m['attempts'] + 1} failed sync attempts"
+                    for m in batch if m['attempts'] + 1 >= self.max_attempts
+                }
+                if exhausted:
+                    logger.error("Rejecting %d journaled movements that kept failing", len(exhausted))
+                    self.journal.mark_rejected(exhausted)
+            self._drop_connection()
+            return False
+
+        applied, rejected = result
+        self.journal.mark_synced(applied)
+        if rejected:
+            logger.warning("Rejected %d journaled movements: %s", len(rejected), rejected)
+            self.journal.mark_rejected(rejected)
+        self.online = True
+        self.last_error = None
+        return True
+
+    def _connection(self):
+        if self.db is not None and self.db.connection is not None and self.db.connection.is_connected():
+            return self.db
+        self._drop_connection()
+        db = self.db_factory()
+        if not db.connect():
+            return None
+        self.db = db
+        return db
+
+    def _drop_connection(self):
+        if self.db is not None:
+            try:
+                self.db.disconnect()
+            except Exception:
+                pass
+            self.db = None
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Load Test
+Simulates many tills/scanners driving the Database API at the same time and
+reports throughput, latency percentiles and ledger consistency.
+
+Example:
+    python loadtest.py --clients 50 --duration 30 \
+        --mix add_transaction=60,search=20,get_all_products=10,get_dashboard_stats=10
+
+Each client gets its own Database connection, exactly like a separate terminal.
+Run it against a dedicated or quiet database: the consistency check assumes the
+load test is the only writer while it runs.
+"""
+
+import argparse
+import asyncio
+import math
+import multiprocessing
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from api_server import InventoryApi
+from async_database import AsyncDatabase
+from config import DB_CONFIG
+from database import Database, InsufficientStockError
+
+
+DEFAULT_MIX = "add_transaction=60,search=20,get_all_products=10,get_dashboard_stats=10"
+SEARCH_TERMS = ["a", "e", "pro", "item", "1", "sku"]
+
+
+def parse_mix(text):
+    """Parse 'op=weight,op=weight' into a list of (op, weight)"""
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{name}'. Choose from: {', '.join(OPERATIONS)}")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+# ==================== OPERATIONS ====================
+
+def op_add_transaction(db, ctx, rng):
+    product_id = rng.choice(ctx['product_ids'])
+    movement = "IN" if rng.random() < ctx['in_ratio'] else "OUT"
+    location_id = rng.choice(ctx['location_ids']) if ctx['location_ids'] else None
+    return db.add_transaction(product_id, movement, rng.randint(1, 5), "load test", "loadtest", location_id)
+
+
+def op_get_all_products(db, ctx, rng):
+    return db.get_all_products()
+
+
+def op_search(db, ctx, rng):
+    return db.get_all_products(search_term=rng.choice(SEARCH_TERMS))
+
+
+def op_get_dashboard_stats(db, ctx, rng):
+    return db.get_dashboard_stats()
+
+
+def op_get_transactions(db, ctx, rng):
+    return db.get_transactions(limit=100)
+
+
+def op_get_low_stock_products(db, ctx, rng):
+    return db.get_low_stock_products()
+
+
+def op_get_product_by_id(db, ctx, rng):
+    return db.get_product_by_id(rng.choice(ctx['product_ids']))
+
+
+OPERATIONS = {
+    "add_transaction": op_add_transaction,
+    "get_all_products": op_get_all_products,
+    "search": op_search,
+    "get_dashboard_stats": op_get_dashboard_stats,
+    "get_transactions": op_get_transactions,
+    "get_low_stock_products": op_get_low_stock_products,
+    "get_product_by_id": op_get_product_by_id,
+}
+
+
+# ==================== CLIENT ====================
+
+def run_client(client_id, db_config, ctx, mix, deadline, max_ops):
+    """Run one simulated terminal until the deadline or op budget is reached"""
+    rng = random.Random(ctx['seed'] + client_id)
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    results = {name: {'latencies': [], 'errors': 0, 'rejected': 0} for name in names}
+
+    db = Database(**db_config)
+    if not db.connect():
+        return results, f"client {client_id} could not connect"
+
+    try:
+        done = 0
+        while time.time() < deadline and (not max_ops or done < max_ops):
+            name = rng.choices(names, weights)[0]
+            entry = results[name]
+            start = time.perf_counter()
+            try:
+                result = OPERATIONS[name](db, ctx, rng)
+                if result is None or result is False:
+                    entry['errors'] += 1
+            except InsufficientStockError:
+                entry['rejected'] += 1
+            except Exception:
+                entry['errors'] += 1
+            entry['latencies'].append(time.perf_counter() - start)
+            done += 1
+    finally:
+        db.disconnect()
+    return results, None
+
+
+def _run_client_star(args):
+    return run_client(*args)
+
+
+def merge_results(per_client):
+    """Merge per-client results into one dict per operation"""
+    merged = {}
+    failures = []
+    for results, failure in per_client:
+        if failure:
+            failures.append(failure)
+        for name, entry in results.items():
+            target = merged.setdefault(name, {'latencies': [], 'errors': 0, 'rejected': 0})
+            target['latencies'].extend(entry['latencies'])
+            target['errors'] += entry['errors']
+            target['rejected'] += entry['rejected']
+    return merged, failures
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+# ==================== CONSISTENCY ====================
+
+def snapshot(db):
+    """Capture on-hand quantities and the current ledger high-water mark"""
+    db.cursor.execute("SELECT id, quantity FROM products")
+    quantities = {row['id']: row['quantity'] for row in db.cursor.fetchall()}
+    db.cursor.execute("SELECT COALESCE(MAX(id), 0) AS max_id FROM transactions")
+    max_id = db.cursor.fetchone()['max_id']
+    db.connection.commit()
+    return quantities, max_id
+
+
+def check_consistency(db, before, max_id):
+    """Compare on-hand changes with the ledger rows written during the run"""
+    after, _ = snapshot(db)
+    db.cursor.execute("""
+        SELECT product_id,
+               SUM(CASE WHEN transaction_type = 'IN' THEN quantity ELSE -quantity END) AS net
+        FROM transactions
+        WHERE id > %s
+        GROUP BY product_id
+    """, (max_id,))
+    ledger = {row['product_id']: int(row['net']) for row in db.cursor.fetchall()}
+
+    problems = []
+    for product_id, quantity in after.items():
+        expected = before.get(product_id, quantity) + ledger.get(product_id, 0)
+        if quantity != expected:
+            problems.append(f"product {product_id}: on hand {quantity}, ledger implies {expected}")
+
+    # Maintained location totals must match the per-location rows
+    db.cursor.execute("""
+        SELECT l.id, l.total_units, COALESCE(SUM(ps.quantity), 0) AS actual
+        FROM locations l
+        LEFT JOIN product_stock ps ON ps.location_id = l.id
+        GROUP BY l.id, l.total_units
+    """)
+    for row in db.cursor.fetchall():
+        if int(row['total_units']) != int(row['actual']):
+            problems.append(f"location {row['id']}: total_units {row['total_units']}, rows sum to {row['actual']}")
+
+    # Maintained category totals must match the products
+    db.cursor.execute("""
+        SELECT c.id, c.product_count, c.total_units, COUNT(p.id) AS products, COALESCE(SUM(p.quantity), 0) AS units
+        FROM categories c
+        LEFT JOIN products p ON p.category_id = c.id
+        GROUP BY c.id, c.product_count, c.total_units
+    """)
+    for row in db.cursor.fetchall():
+        if (int(row['product_count']), int(row['total_units'])) != (int(row['products']), int(row['units'])):
+            problems.append(f"category {row['id']}: totals {row['product_count']}/{row['total_units']}, "
+                            f"products sum to {row['products']}/{row['units']}")
+    db.connection.commit()
+    return problems
+
+
+async def _check_api_freshness(db, db_config, product_id):
+    # One pooled connection, so both GETs read through the same session
+    pool = AsyncDatabase(1, **db_config)
+    if not await pool.open():
+        return ["api: could not open the connection pool"]
+    api = InventoryApi(pool, version_ttl=0)
+    target = f"/products/{product_id}"
+    try:
+        _, first_headers, first_body = await api.dispatch("GET", target, {}, b"")
+        product = db.get_product_by_id(product_id)
+        db.update_product(product_id, product['name'], product['sku'], product['description'],
+                          product['category_id'], product['quantity'], product['price'] + 1,
+                          product['min_stock_level'], version=product['version'])
+        _, second_headers, second_body = await api.dispatch("GET", target, {}, b"")
+    finally:
+        await pool.close()
+        product = db.get_product_by_id(product_id)
+        db.update_product(product_id, product['name'], product['sku'], product['description'],
+                          product['category_id'], product['quantity'], product['price'] - 1,
+                          product['min_stock_level'], version=product['version'])
+
+    problems = []
+    if first_headers.get("ETag") == second_headers.get("ETag"):
+        problems.append(f"api: {target} kept ETag {first_headers.get('ETag')} after an update")
+    if first_body == second_body:
+        problems.append(f"api: {target} served the same body after an update")
+    return problems
+
+
+def check_api_freshness(db, db_config, product_id):
+    """Check that a product update between two API reads changes both the body and the ETag"""
+    return asyncio.run(_check_api_freshness(db, db_config, product_id))
+
+
+# ==================== REPORT ====================
+
+def print_report(merged, elapsed, clients):
+    """Print throughput and latency percentiles per operation"""
+    total_ops = sum(len(entry['latencies']) for entry in merged.values())
+    print(f"\n{clients} clients, {elapsed:.1f}s, {total_ops} ops, {total_ops / elapsed:.1f} ops/s\n")
+    header = f"{'operation':<24}{'count':>8}{'ops/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'rejected':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, entry in sorted(merged.items()):
+        latencies = sorted(entry['latencies'])
+        if not latencies:
+            continue
+        print(
+            f"{name:<24}{len(latencies):>8}{len(latencies) / elapsed:>9.1f}"
+            f"{percentile(latencies, 50) * 1000:>9.2f}"
+            f"{percentile(latencies, 95) * 1000:>9.2f}"
+            f"{percentile(latencies, 99) * 1000:>9.2f}"
+            f"{entry['errors']:>8}{entry['rejected']:>10}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent load test for the inventory Database API")
+    parser.add_argument("--clients", type=int, default=10, help="number of simulated terminals")
+    parser.add_argument("--mode", choices=["thread", "process"], default="thread")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--ops", type=int, default=0, help="max operations per client (0 = no limit)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="weighted operation mix, e.g. add_transaction=60,search=40")
+    parser.add_argument("--in-ratio", type=float, default=0.6, help="share of IN movements")
+    parser.add_argument("--hot-skus", type=int, default=0, help="restrict movements to the first N products")
+    parser.add_argument("--use-locations", action="store_true", help="spread movements across locations")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--host", default=DB_CONFIG["host"])
+    parser.add_argument("--user", default=DB_CONFIG["user"])
+    parser.add_argument("--password", default=DB_CONFIG["password"])
+    parser.add_argument("--database", default=DB_CONFIG["database"])
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    db_config = {"host": args.host, "user": args.user, "password": args.password, "database": args.database}
+
+    db = Database(**db_config)
+    if not db.connect():
+        print("Could not connect to the database")
+        return 2
+
+    product_ids = sorted(p['id'] for p in db.get_all_products())
+    if not product_ids:
+        print("The database has no products; seed it first")
+        return 2
+    if args.hot_skus:
+        product_ids = product_ids[:args.hot_skus]
+    location_ids = [l['id'] for l in db.get_all_locations()] if args.use_locations else []
+
+    ctx = {
+        'product_ids': product_ids,
+        'location_ids': location_ids,
+        'in_ratio': args.in_ratio,
+        'seed': args.seed,
+    }
+    before, max_id = snapshot(db)
+
+    start = time.time()
+    deadline = start + args.duration
+    jobs = [(i, db_config, ctx, mix, deadline, args.ops) for i in range(args.clients)]
+    if args.mode == "process":
+        with multiprocessing.Pool(args.clients) as pool:
+            per_client = pool.map(_run_client_star, jobs)
+    else:
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            per_client = list(pool.map(_run_client_star, jobs))
+    elapsed = time.time() - start
+
+    merged, failures = merge_results(per_client)
+    for failure in failures:
+        print(failure)
+    print_report(merged, elapsed, args.clients)
+
+    problems = check_consistency(db, before, max_id)
+    problems += check_api_freshness(db, db_config, product_ids[0])
+    db.disconnect()
+    if problems:
+        print(f"\nConsistency check FAILED ({len(problems)} problems):")
+        for problem in problems[:50]:
+            print(f"  {problem}")
+        return 1
+    print("\nConsistency check passed: on-hand quantities match the ledger and API reads are fresh")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,12 +4,24 @@ Inventory Management System
 A desktop application built with Python 3, Tkinter, and MySQL
 """
 
+import logging
+import os
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 import subprocess
 import sys
+import threading
 from database import Database
 from gui import InventoryGUI
+from journal import JournalSyncer, OfflineJournal
+from settings import ENV_PREFIX, SETTINGS_FILE, SettingsError, SettingsWatcher, load_settings
+from write_behind import WriteBehindQueue
+
+
+logger = logging.getLogger("inventory")
+
+# How often the settings file is checked for changes
+SETTINGS_CHECK_MS = 5000
 
 
 def check_dependencies():
@@ -35,15 +47,26 @@ def check_dependencies():
 
 def main():
     """Main entry point"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
+    
     # Check dependencies
     if not check_dependencies():
         return
     
+    try:
+        settings = load_settings()
+    except SettingsError as e:
+        messagebox.showerror("Settings Error", str(e))
+        return
+    
     # Create main window
     root = tk.Tk()
-    root.title("Inventory Management System")
-    root.geometry("1200x700")
-    root.minsize(1000, 600)
+    root.title(settings.app.title)
+    root.geometry(f"{settings.app.width}x{settings.app.height}")
+    root.minsize(settings.app.min_width, settings.app.min_height)
     
     # Set application icon (optional)
     try:
@@ -54,27 +77,98 @@ def main():
     # Initialize database connection
     db = None
     try:
-        db = Database()
+        db = Database.from_settings(settings)
         if not db.connect():
             messagebox.showerror(
                 "Database Error",
                 "Failed to connect to MySQL database.\n\n"
                 "Please ensure:\n"
-                "1. MySQL server is running\n"
-                "2. Database 'inventory_db' exists\n"
-                "3. Credentials are correct (root/password)\n\n"
-                "Run 'python setup_database.py' to setup the database."
+                f"1. MySQL server is running on '{settings.database.host}'\n"
+                f"2. Database '{settings.database.database}' exists\n"
+                f"3. User '{settings.database.user}' and its password are correct\n\n"
+                "Connection settings come from the \"database\" section of "
+                f"{os.environ.get(ENV_PREFIX + 'SETTINGS', SETTINGS_FILE)} "
+                f"or from {ENV_PREFIX}DATABASE_HOST, _USER, _PASSWORD and _DATABASE."
             )
             return
     except Exception as e:
         messagebox.showerror("Error", f"Database connection failed:\n{str(e)}")
         return
     
+    # Stock movements are journaled locally and synced in the background
+    tuning = settings.tuning
+    journal = OfflineJournal()
+    syncer = JournalSyncer(journal, lambda: Database.from_settings(settings), batch_size=tuning.journal_batch_size)
+    syncer.start()
+    
+    # Scanner input is batched through a write-behind queue
+    scan_queue = WriteBehindQueue(
+        lambda: Database.from_settings(settings),
+        window=tuning.scan_window_s,
+        max_rows=tuning.scan_max_rows,
+        max_pending=tuning.scan_max_pending
+    )
+    scan_queue.start()
+    
     # Initialize GUI
-    app = InventoryGUI(root, db)
+    app = InventoryGUI(root, db, syncer, scan_queue, settings)
+    
+    # Safe settings are reloaded from the settings file while running
+    watcher = SettingsWatcher(settings)
+    watcher.subscribe(lambda s, changed: db.apply_settings(s))
+    watcher.subscribe(app.apply_settings)
+    
+    def reload_settings(s, changed):
+        syncer.batch_size = s.tuning.journal_batch_size
+        scan_queue.window = s.tuning.scan_window_s
+        scan_queue.max_rows = s.tuning.scan_max_rows
+        # The connections that write stock take up allow_negative_stock, retries and thresholds too
+        for worker in (syncer, scan_queue):
+            if worker.db is not None:
+                worker.db.apply_settings(s)
+    
+    watcher.subscribe(reload_settings)
+    
+    def check_settings():
+        watcher.check()
+        root.after(SETTINGS_CHECK_MS, check_settings)
+    
+    root.after(SETTINGS_CHECK_MS, check_settings)
+    
+    # Category totals are kept by every write; a periodic rebuild catches writes made outside the app.
+    # Change log events are purged on the same schedule, days after every poller has read them,
+    # as are movements the local journal has long since synced.
+    def run_maintenance():
+        def maintain():
+            journal.purge_synced(settings.tuning.journal_retention_days)
+            worker = Database.from_settings(settings)
+            if worker.connect():
+                worker.rebuild_category_totals()
+                purged = worker.purge_changes(settings.tuning.change_retention_days)
+                if purged:
+                    logger.info("Purged %d change log events", purged)
+                worker.disconnect()
+        
+        threading.Thread(target=maintain, name="maintenance", daemon=True).start()
+        root.after(settings.tuning.category_rebuild_s * 1000, run_maintenance)
+    
+    run_maintenance()
     
     # Handle window close
     def on_closing():
+        # Scans are only durable once committed, so give the queue a chance to drain
+        if not scan_queue.flush(timeout=10) and not messagebox.askyesno(
+            "Unsaved Scans",
+            f"{scan_queue.pending} scanned movements could not be saved to the database.\n\nQuit anyway?"
+        ):
+            return
+        scan_queue.close(timeout=1)
+        # Captures still running are written out rather than lost
+        app.profiler.stop_cpu_profile()
+        app.profiler.stop_memory_trace()
+        app.catalogue.close()
+        syncer.stop()
+        journal.close()
         if db:
             db.disconnect()
         root.destroy()
@@ -0,0 +1,317 @@
+"""
+Schema Module
+Creates the base inventory tables (categories, products, transactions) and the
+tables, columns and indexes added on top of them. Every statement is idempotent
+so it is safe to run on each connect.
+"""
+
+import logging
+from mysql.connector import Error
+
+
+logger = logging.getLogger("inventory.db")
+
+
+# Base tables, matching the schema documented in the README
+BASE_TABLES = [
+    ("categories", """
+        CREATE TABLE IF NOT EXISTS categories (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+    """),
+    ("products", """
+        CREATE TABLE IF NOT EXISTS products (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(200) NOT NULL,
+            sku VARCHAR(100) NOT NULL UNIQUE,
+            description TEXT,
+            category_id INT NULL,
+            quantity INT NOT NULL DEFAULT 0,
+            price DECIMAL(10, 2) NOT NULL DEFAULT 0,
+            min_stock_level INT NOT NULL DEFAULT 10,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE SET NULL
+        ) ENGINE=InnoDB
+    """),
+    ("transactions", """
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            product_id INT NOT NULL,
+            transaction_type ENUM('IN', 'OUT') NOT NULL,
+            quantity INT NOT NULL,
+            notes TEXT,
+            user VARCHAR(100) DEFAULT 'Admin',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB
+    """),
+]
+
+# New tables, created in this order
+TABLES = [
+    ("locations", """
+        CREATE TABLE IF NOT EXISTS locations (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL UNIQUE,
+            description TEXT,
+            total_units BIGINT NOT NULL DEFAULT 0,
+            sku_count INT NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+    """),
+    ("product_stock", """
+        CREATE TABLE IF NOT EXISTS product_stock (
+            product_id INT NOT NULL,
+            location_id INT NOT NULL,
+            quantity INT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (product_id, location_id),
+            KEY idx_product_stock_location (location_id, quantity),
+            FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
+            FOREIGN KEY (location_id) REFERENCES locations(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB
+    """),
+    ("stock_takes", """
+        CREATE TABLE IF NOT EXISTS stock_takes (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            location_id INT NULL,
+            status VARCHAR(10) NOT NULL DEFAULT 'open',
+            user VARCHAR(100) DEFAULT 'Admin',
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            posted_at TIMESTAMP NULL,
+            FOREIGN KEY (location_id) REFERENCES locations(id) ON DELETE SET NULL
+        ) ENGINE=InnoDB
+    """),
+    ("stock_take_lines", """
+        CREATE TABLE IF NOT EXISTS stock_take_lines (
+            stock_take_id INT NOT NULL,
+            product_id INT NOT NULL,
+            expected INT NOT NULL DEFAULT 0,
+            counted INT NULL,
+            PRIMARY KEY (stock_take_id, product_id),
+            FOREIGN KEY (stock_take_id) REFERENCES stock_takes(id) ON DELETE CASCADE,
+            FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB
+    """),
+    ("transaction_summaries", """
+        CREATE TABLE IF NOT EXISTS transaction_summaries (
+            month DATE NOT NULL,
+            product_id INT NOT NULL,
+            location_id INT NOT NULL DEFAULT 0,
+            transaction_type ENUM('IN', 'OUT') NOT NULL,
+            movements INT NOT NULL DEFAULT 0,
+            quantity BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (month, product_id, location_id, transaction_type),
+            KEY idx_summaries_product (product_id, month)
+        ) ENGINE=InnoDB
+    """),
+    ("ledger_archive_runs", """
+        CREATE TABLE IF NOT EXISTS ledger_archive_runs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            cutoff DATETIME NOT NULL,
+            rows_moved BIGINT NOT NULL DEFAULT 0,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP NULL
+        ) ENGINE=InnoDB
+    """),
+    ("change_log", """
+        CREATE TABLE IF NOT EXISTS change_log (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            entity VARCHAR(20) NOT NULL,
+            entity_id INT NOT NULL,
+            op VARCHAR(10) NOT NULL,
+            payload TEXT,
+            created_at TIMESTAMP(3) DEFAULT CURRENT_TIMESTAMP(3),
+            KEY idx_change_log_created (created_at)
+        ) ENGINE=InnoDB
+    """),
+    ("cost_layers", """
+        CREATE TABLE IF NOT EXISTS cost_layers (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            product_id INT NOT NULL,
+            quantity INT NOT NULL,
+            remaining INT NOT NULL,
+            unit_cost DECIMAL(12, 4) NOT NULL,
+            received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            KEY idx_cost_layers_product (product_id, id),
+            FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB
+    """),
+    ("product_costs", """
+        CREATE TABLE IF NOT EXISTS product_costs (
+            product_id INT PRIMARY KEY,
+            on_hand INT NOT NULL DEFAULT 0,
+            average_cost DECIMAL(14, 6) NOT NULL DEFAULT 0,
+            fifo_value DECIMAL(18, 4) NOT NULL DEFAULT 0,
+            fifo_cogs DECIMAL(18, 4) NOT NULL DEFAULT 0,
+            average_cogs DECIMAL(18, 4) NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB
+    """),
+    ("stock_verifications", """
+        CREATE TABLE IF NOT EXISTS stock_verifications (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            mode ENUM('full', 'incremental') NOT NULL,
+            ledger_high INT NOT NULL,
+            products_checked INT NOT NULL DEFAULT 0,
+            mismatches INT NOT NULL DEFAULT 0,
+            repaired INT NOT NULL DEFAULT 0,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP NULL
+        ) ENGINE=InnoDB
+    """),
+    ("stock_baselines", """
+        CREATE TABLE IF NOT EXISTS stock_baselines (
+            product_id INT PRIMARY KEY,
+            opening_quantity INT NOT NULL DEFAULT 0,
+            quantity INT NOT NULL DEFAULT 0,
+            verified_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB
+    """),
+    ("bulk_edits", """
+        CREATE TABLE IF NOT EXISTS bulk_edits (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user VARCHAR(100),
+            selection TEXT,
+            changes TEXT,
+            product_count INT NOT NULL DEFAULT 0,
+            restored_count INT NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            undone_at TIMESTAMP NULL
+        ) ENGINE=InnoDB
+    """),
+    ("bulk_edit_rows", """
+        CREATE TABLE IF NOT EXISTS bulk_edit_rows (
+            bulk_edit_id INT NOT NULL,
+            product_id INT NOT NULL,
+            old_price DECIMAL(10, 2) NOT NULL,
+            new_price DECIMAL(10, 2) NOT NULL,
+            old_category_id INT NULL,
+            new_category_id INT NULL,
+            old_min_stock_level INT NOT NULL,
+            new_min_stock_level INT NOT NULL,
+            edited_version INT NOT NULL,
+            restored TINYINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (bulk_edit_id, product_id),
+            FOREIGN KEY (bulk_edit_id) REFERENCES bulk_edits(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB
+    """),
+]
+
+# Ledger archive: one partition per archived month where the server supports it
+# (the hot transactions table has foreign keys, which MySQL cannot partition).
+# Each entry is (table, preferred statement, fallback statement).
+ARCHIVE_COLUMNS = """
+            id INT NOT NULL,
+            product_id INT NOT NULL,
+            transaction_type ENUM('IN', 'OUT') NOT NULL,
+            quantity INT NOT NULL,
+            notes TEXT,
+            user VARCHAR(100),
+            created_at DATETIME NOT NULL,
+            location_id INT NULL,
+            idempotency_key VARCHAR(36) NULL,
+            PRIMARY KEY (id, created_at),
+            KEY idx_archive_product (product_id, created_at),
+            KEY idx_archive_location (location_id, created_at)
+"""
+PARTITIONED_TABLES = [
+    ("transactions_archive", f"""
+        CREATE TABLE IF NOT EXISTS transactions_archive ({ARCHIVE_COLUMNS}) ENGINE=InnoDB ROW_FORMAT=COMPRESSED
+        PARTITION BY RANGE COLUMNS (created_at) (PARTITION pmax VALUES LESS THAN (MAXVALUE))
+    """, f"""
+        CREATE TABLE IF NOT EXISTS transactions_archive ({ARCHIVE_COLUMNS}) ENGINE=InnoDB
+    """),
+]
+
+# New columns on existing tables: (table, column, definition)
+COLUMNS = [
+    ("transactions", "location_id", "INT NULL"),
+    ("products", "version", "INT NOT NULL DEFAULT 0"),
+    ("transactions", "idempotency_key", "VARCHAR(36) NULL"),
+    ("transactions", "unit_cost", "DECIMAL(12, 4) NULL"),
+    ("categories", "product_count", "INT NOT NULL DEFAULT 0"),
+    ("categories", "total_units", "BIGINT NOT NULL DEFAULT 0"),
+    ("categories", "stock_value", "DECIMAL(18, 2) NOT NULL DEFAULT 0"),
+    ("categories", "low_stock_count", "INT NOT NULL DEFAULT 0"),
+]
+
+# New indexes on existing tables: (table, index name, column list)
+INDEXES = [
+    ("transactions", "idx_transactions_location", "location_id, created_at"),
+    ("transactions", "idx_transactions_created", "created_at"),
+    # Covers the per-product chart aggregates, so they never read ledger rows
+    ("transactions", "idx_transactions_product_series", "product_id, created_at, transaction_type, quantity"),
+]
+
+# Unique indexes on existing tables: (table, index name, column list)
+UNIQUE_INDEXES = [
+    ("transactions", "uq_transactions_idempotency_key", "idempotency_key"),
+]
+
+
+def column_exists(cursor, table, column):
+    """Check whether a column exists in the current database"""
+    cursor.execute("""
+        SELECT COUNT(*) AS count
+        FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (table, column))
+    return cursor.fetchone()['count'] > 0
+
+
+def index_exists(cursor, table, index):
+    """Check whether an index exists in the current database"""
+    cursor.execute("""
+        SELECT COUNT(*) AS count
+        FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+    """, (table, index))
+    return cursor.fetchone()['count'] > 0
+
+
+def ensure_schema(connection):
+    """Create any missing tables, columns and indexes"""
+    cursor = connection.cursor(dictionary=True)
+    try:
+        for name, statement in BASE_TABLES:
+            cursor.execute(statement)
+
+        for table, column, definition in COLUMNS:
+            if not column_exists(cursor, table, column):
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+        for name, statement in TABLES:
+            cursor.execute(statement)
+
+        for name, statement, fallback in PARTITIONED_TABLES:
+            try:
+                cursor.execute(statement)
+            except Error as e:
+                logger.info(f"Creating {name} without partitioning/compression: {e}")
+                cursor.execute(fallback)
+
+        for table, index, columns in INDEXES:
+            if not index_exists(cursor, table, index):
+                cursor.execute(f"CREATE INDEX {index} ON {table} ({columns})")
+
+        for table, index, columns in UNIQUE_INDEXES:
+            if not index_exists(cursor, table, index):
+                cursor.execute(f"CREATE UNIQUE INDEX {index} ON {table} ({columns})")
+
+        connection.commit()
+        return True
+    except Error as e:
+        logger.error(f"Error updating schema: {e}")
+        connection.rollback()
+        return False
+    finally:
+        cursor.close()
@@ -0,0 +1,247 @@
+"""
+Settings Module
+Typed runtime settings for the application, the database layer and the services.
+
+Values come from config.py, then an optional JSON settings file, then
+environment variables, each overriding the one before:
+
+    {"database": {"host": "db1"}, "tuning": {"page_size": 100}}
+    INVENTORY_DATABASE_HOST=db1  INVENTORY_TUNING_PAGE_SIZE=100
+
+The file is INVENTORY_SETTINGS if set, otherwise inventory_settings.json in the
+working directory (if it exists). Every value is converted to its declared type
+and range-checked; all problems are reported together in one SettingsError.
+
+Settings marked reloadable take effect while the application runs: a
+SettingsWatcher notices when the file changes, copies the new reloadable
+values into the live Settings object and tells its listeners which ones
+changed. Changes to other settings are logged and need a restart.
+"""
+
+import json
+import logging
+import os
+from dataclasses import dataclass, field, fields
+
+from config import APP_CONFIG, DB_CONFIG, DEFAULTS, USER_SETTINGS
+
+
+logger = logging.getLogger("inventory.settings")
+
+SETTINGS_FILE = "inventory_settings.json"
+ENV_PREFIX = "INVENTORY_"
+
+
+class SettingsError(ValueError):
+    """Raised when settings cannot be converted or fall outside their allowed range"""
+
+
+def setting(default, minimum=None, maximum=None, reload=False):
+    """Declare a setting with its range and whether it can change at runtime"""
+    return field(default=default, metadata={'min': minimum, 'max': maximum, 'reload': reload})
+
+
+@dataclass
+class DatabaseSettings:
+    host: str = setting(DB_CONFIG["host"])
+    user: str = setting(DB_CONFIG["user"])
+    password: str = setting(DB_CONFIG["password"])
+    database: str = setting(DB_CONFIG["database"])
+    # Connections in the async pool (API server), i.e. database worker threads
+    pool_size: int = setting(8, 1, 256)
+    statement_cache_size: int = setting(64, 1, 4096)
+    max_retries: int = setting(3, 0, 20, reload=True)
+    retry_backoff: float = setting(0.05, 0.0, 10.0, reload=True)
+    slow_query_ms: float = setting(200.0, 1.0, 600000.0, reload=True)
+
+    def connection(self):
+        """Keyword arguments for Database / AsyncDatabase"""
+        return {'host': self.host, 'user': self.user, 'password': self.password, 'database': self.database}
+
+
+@dataclass
+class AppSettings:
+    title: str = setting(APP_CONFIG["title"])
+    width: int = setting(APP_CONFIG["width"], 400, 10000)
+    height: int = setting(APP_CONFIG["height"], 300, 10000)
+    min_width: int = setting(APP_CONFIG["min_width"], 400, 10000)
+    min_height: int = setting(APP_CONFIG["min_height"], 300, 10000)
+    theme: str = setting(APP_CONFIG["theme"])
+    catalogue_snapshot: str = setting("inventory_catalogue.snap")
+    profile_dir: str = setting("profiles", reload=True)
+    default_user: str = setting(USER_SETTINGS["default_user"], reload=True)
+    allow_negative_stock: bool = setting(USER_SETTINGS["allow_negative_stock"], reload=True)
+    show_low_stock_warning: bool = setting(USER_SETTINGS["show_low_stock_warning"], reload=True)
+
+
+@dataclass
+class TuningSettings:
+    # Read once when the API server starts
+    page_size: int = setting(DEFAULTS["items_per_page"], 1, 500)
+    change_poll_ms: int = setting(2000, 200, 600000, reload=True)
+    dashboard_refresh_s: int = setting(5, 1, 3600, reload=True)
+    dashboard_resync_s: int = setting(600, 10, 86400, reload=True)
+    catalogue_ttl_s: float = setting(1.0, 0.0, 3600.0, reload=True)
+    response_cache_size: int = setting(256, 0, 100000)
+    fetch_chunk_size: int = setting(1000, 10, 100000, reload=True)
+    archive_chunk_size: int = setting(5000, 100, 1000000, reload=True)
+    journal_batch_size: int = setting(200, 1, 10000, reload=True)
+    scan_window_s: float = setting(0.25, 0.0, 60.0, reload=True)
+    scan_max_rows: int = setting(200, 1, 10000, reload=True)
+    scan_max_pending: int = setting(2000, 1, 1000000)
+    verify_workers: int = setting(4, 1, 64)
+    verify_range_size: int = setting(1000000, 1000, 100000000)
+    category_rebuild_s: int = setting(3600, 60, 604800, reload=True)
+    # Days of change log kept; a terminal away for longer rebuilds its catalogue snapshot
+    change_retention_days: int = setting(7, 1, 3650, reload=True)
+    # Days synced movements stay in the local journal
+    journal_retention_days: int = setting(7, 1, 3650, reload=True)
+    ui_heartbeat_ms: int = setting(100, 10, 10000, reload=True)
+    ui_stall_ms: int = setting(200, 20, 60000, reload=True)
+
+
+@dataclass
+class Settings:
+    database: DatabaseSettings = field(default_factory=DatabaseSettings)
+    app: AppSettings = field(default_factory=AppSettings)
+    tuning: TuningSettings = field(default_factory=TuningSettings)
+
+    def to_dict(self):
+        return {
+            section.name: {f.name: getattr(getattr(self, section.name), f.name) for f in fields(getattr(self, section.name))}
+            for section in fields(self)
+        }
+
+
+def convert(value, kind):
+    """Convert a file or environment value to the declared type"""
+    if kind is bool:
+        if isinstance(value, bool):
+            return value
+        text = str(value).strip().lower()
+        if text in ("1", "true", "yes", "on"):
+            return True
+        if text in ("0", "false", "no", "off"):
+            return False
+        raise ValueError(f"expected true or false, got {value!r}")
+    if kind is int and isinstance(value, float) and not value.is_integer():
+        raise ValueError(f"expected a whole number, got {value!r}")
+    if kind in (int, float) and isinstance(value, bool):
+        raise ValueError(f"expected a number, got {value!r}")
+    return kind(value)
+
+
+def _overrides(path, environ):
+    """Collect {section: {name: raw value}} from the settings file and the environment"""
+    overrides = {}
+    if path and os.path.exists(path):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise SettingsError(f"Cannot read settings file {path}: {e}")
+        if not isinstance(data, dict):
+            raise SettingsError(f"Settings file {path} must contain a JSON object")
+        for section, values in data.items():
+            if not isinstance(values, dict):
+                raise SettingsError(f"Section '{section}' in {path} must be an object")
+            overrides.setdefault(section, {}).update(values)
+
+    sections = {f.name for f in fields(Settings)}
+    for key, value in environ.items():
+        if not key.startswith(ENV_PREFIX) or key == ENV_PREFIX + "SETTINGS":
+            continue
+        section, _, name = key[len(ENV_PREFIX):].lower().partition("_")
+        if section in sections and name:
+            overrides.setdefault(section, {})[name] = value
+    return overrides
+
+
+def load_settings(path=None, environ=None):
+    """Build validated Settings from config.py, the settings file and the environment"""
+    environ = os.environ if environ is None else environ
+    if path is None:
+        path = environ.get(ENV_PREFIX + "SETTINGS", SETTINGS_FILE)
+
+    settings = Settings()
+    problems = []
+    for section, values in _overrides(path, environ).items():
+        target = getattr(settings, section, None)
+        if target is None:
+            problems.append(f"Unknown section '{section}'")
+            continue
+        declared = {f.name: f for f in fields(target)}
+        for name, raw in values.items():
+            spec = declared.get(name)
+            if spec is None:
+                problems.append(f"Unknown setting '{section}.{name}'")
+                continue
+            kind = type(spec.default)
+            try:
+                value = convert(raw, kind)
+            except (TypeError, ValueError) as e:
+                problems.append(f"{section}.{name}: {e}")
+                continue
+            low, high = spec.metadata['min'], spec.metadata['max']
+            if (low is not None and value < low) or (high is not None and value > high):
+                problems.append(f"{section}.{name}: {value} is outside {low}..{high}")
+                continue
+            setattr(target, name, value)
+
+    if problems:
+        raise SettingsError("Invalid settings:\n  " + "\n  ".join(problems))
+    return settings
+
+
+class SettingsWatcher:
+    """Re-reads the settings file when it changes and applies the reloadable values in place"""
+
+    def __init__(self, settings, path=None, environ=None):
+        self.settings = settings
+        self.environ = os.environ if environ is None else environ
+        self.path = path or self.environ.get(ENV_PREFIX + "SETTINGS", SETTINGS_FILE)
+        self.listeners = []
+        self.mtime = self._mtime()
+
+    def _mtime(self):
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    def subscribe(self, callback):
+        """Call callback(settings, changed) with the set of 'section.name' keys that changed"""
+        self.listeners.append(callback)
+
+    def check(self):
+        """Reload if the file changed; returns the reloadable keys that were applied"""
+        mtime = self._mtime()
+        if mtime == self.mtime:
+            return set()
+        self.mtime = mtime
+        try:
+            fresh = load_settings(self.path, self.environ)
+        except SettingsError as e:
+            logger.error("Keeping current settings: %s", e)
+            return set()
+
+        changed = set()
+        for section in fields(Settings):
+            live = getattr(self.settings, section.name)
+            new = getattr(fresh, section.name)
+            for spec in fields(live):
+                value = getattr(new, spec.name)
+                if value == getattr(live, spec.name):
+                    continue
+                key = f"{section.name}.{spec.name}"
+                if spec.metadata['reload']:
+                    setattr(live, spec.name, value)
+                    changed.add(key)
+                else:
+                    logger.warning("Setting %s changed; restart to apply it", key)
+
+        if changed:
+            logger.info("Reloaded settings: %s", ", ".join(sorted(changed)))
+            for callback in self.listeners:
+                callback(self.settings, changed)
+        return changed
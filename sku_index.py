@@ -0,0 +1,72 @@
+"""
+SKU Index Module
+In-memory hash index from SKU to product for rapid-scan entry.
+
+The index is warmed with one query at startup and then kept current from the
+change feed: product inserts and updates are re-read by id, deletes are
+dropped. Lookups are a single dict access, so a scanner never waits on the
+database to resolve a code.
+"""
+
+from change_feed import changed_ids, fetch_products
+
+
+def normalize_sku(code):
+    """Scanner input and stored SKUs compare case- and whitespace-insensitively"""
+    return code.strip().upper()
+
+
+class SkuIndex:
+    """SKU -> product id and name, with a reverse map so renamed SKUs can be dropped"""
+
+    def __init__(self, db):
+        self.db = db
+        self.by_sku = {}
+        self.sku_by_id = {}
+
+    def __len__(self):
+        return len(self.by_sku)
+
+    def warm(self):
+        """Load every product; returns False if the database could not be read"""
+        rows = self.db.get_sku_index()
+        if rows is None:
+            return False
+        self.by_sku = {}
+        self.sku_by_id = {}
+        for row in rows:
+            self._put(row)
+        return True
+
+    def lookup(self, code):
+        """Return {'id', 'sku', 'name'} for a scanned code, or None if it is unknown"""
+        return self.by_sku.get(normalize_sku(code))
+
+    def apply_changes(self, events, products=None):
+        """Change feed subscriber: refresh products whose SKU or name may have changed
+
+        products, when given, holds the changed products already read by the caller, by id.
+        """
+        # Stock movements never touch the SKU or name
+        events = [e for e in events if e['op'] in ("insert", "update", "delete")]
+        upserted, deleted = changed_ids(events, "product")
+        for product_id in deleted:
+            self._remove(product_id)
+        if products is None:
+            products = fetch_products(self.db, upserted)
+        for product_id in sorted(upserted):
+            if product_id in products:
+                self._put(products[product_id])
+
+    def _put(self, product):
+        self._remove(product['id'])
+        if not product['sku']:
+            return
+        sku = normalize_sku(product['sku'])
+        self.by_sku[sku] = {'id': product['id'], 'sku': product['sku'], 'name': product['name']}
+        self.sku_by_id[product['id']] = sku
+
+    def _remove(self, product_id):
+        sku = self.sku_by_id.pop(product_id, None)
+        if sku is not None:
+            self.by_sku.pop(sku, None)
@@ -0,0 +1,187 @@
+"""
+Statements Module
+Query builder and per-connection prepared statement cache for the Database class.
+
+Query assembles filters in a fixed order with normalised whitespace, so the
+same combination of filters always produces the same statement text. IN lists
+are padded to the next power of two for the same reason. StatementCache keeps
+one server-side prepared statement per statement text on a connection, so hot
+statements are parsed and planned once rather than on every call.
+
+    query = Query("SELECT * FROM products p").where("p.category_id = %s", 3).limit(50)
+    rows = db.statements.fetchall(*query.build())
+"""
+
+import logging
+import time
+from collections import OrderedDict
+
+from mysql.connector import Error
+
+from instrumentation import explain_plan, normalize_sql, row_size
+
+
+logger = logging.getLogger("inventory.db")
+
+
+def padded_placeholders(values):
+    """Placeholders and parameters for an IN list, padded to a power of two by repeating the last value"""
+    values = list(values)
+    size = 1
+    while size < len(values):
+        size *= 2
+    padded = values + values[-1:] * (size - len(values)) if values else [None]
+    return ", ".join(["%s"] * size), padded
+
+
+class Query:
+    """Builds a SELECT in canonical form: base, WHERE conditions, GROUP BY, ORDER BY, LIMIT"""
+
+    def __init__(self, base):
+        self.base = normalize_sql(base)
+        self.conditions = []
+        self.params = []
+        self.group = None
+        self.order = None
+        self.limit_params = None
+
+    def where(self, condition, *params):
+        self.conditions.append(normalize_sql(condition))
+        self.params.extend(params)
+        return self
+
+    def where_in(self, column, values):
+        placeholders, params = padded_placeholders(values)
+        return self.where(f"{column} IN ({placeholders})", *params)
+
+    def group_by(self, clause):
+        self.group = normalize_sql(clause)
+        return self
+
+    def order_by(self, clause):
+        self.order = normalize_sql(clause)
+        return self
+
+    def limit(self, limit, offset=None):
+        # Always both placeholders, so paged and unpaged calls share a statement
+        self.limit_params = (limit, offset or 0)
+        return self
+
+    def build(self):
+        """Return (sql, params)"""
+        parts = [self.base]
+        if self.conditions:
+            parts.append("WHERE " + " AND ".join(self.conditions))
+        if self.group:
+            parts.append("GROUP BY " + self.group)
+        if self.order:
+            parts.append("ORDER BY " + self.order)
+        params = list(self.params)
+        if self.limit_params is not None:
+            parts.append("LIMIT %s OFFSET %s")
+            params.extend(self.limit_params)
+        return " ".join(parts), params
+
+
+class StatementCache:
+    """Server-side prepared statements for one connection, least recently used evicted
+
+    totals is the connection's InstrumentedCursor; rows, bytes and errors are
+    added to it so they count towards the calling method's stats.
+    """
+
+    def __init__(self, connection, stats, size=64, totals=None):
+        self.connection = connection
+        self.stats = stats
+        self.size = size
+        self.totals = totals
+        self.cursors = OrderedDict()
+        # Statements the server refused to prepare run as plain text queries
+        self.unpreparable = set()
+
+    def _cursor(self, sql):
+        cursor = self.cursors.get(sql)
+        if cursor is not None:
+            self.cursors.move_to_end(sql)
+            return cursor, False
+        if len(self.cursors) >= self.size:
+            _, evicted = self.cursors.popitem(last=False)
+            evicted.close()
+        cursor = self.connection.cursor(prepared=True)
+        self.cursors[sql] = cursor
+        return cursor, True
+
+    def execute(self, sql, params=()):
+        """Execute a statement and return (cursor, rows); rows is None for statements without results"""
+        sql = normalize_sql(sql)
+        if sql in self.unpreparable:
+            return self._execute_text(sql, params)
+
+        cursor, new = self._cursor(sql)
+        start = time.perf_counter()
+        rows = None
+        try:
+            cursor.execute(sql, tuple(params))
+            if cursor.with_rows:
+                names = cursor.column_names
+                rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+        except Error as e:
+            # 1295: this statement is not supported in the prepared statement protocol
+            if new and e.errno == 1295:
+                self.cursors.pop(sql).close()
+                self.unpreparable.add(sql)
+                return self._execute_text(sql, params)
+            self._failed(sql, start)
+            raise
+        self._record(sql, params, start, rows, prepared=new, kind="prepared")
+        return cursor, rows
+
+    def _execute_text(self, sql, params):
+        cursor = self.connection.cursor(dictionary=True)
+        start = time.perf_counter()
+        try:
+            cursor.execute(sql, tuple(params))
+            rows = cursor.fetchall() if cursor.with_rows else None
+        except Error:
+            self._failed(sql, start)
+            raise
+        finally:
+            cursor.close()
+        # Parsed on every execution, which shows in its prepared statement stats as no reuse
+        self._record(sql, params, start, rows, prepared=True, kind="text")
+        return cursor, rows
+
+    def _failed(self, sql, start):
+        self.stats.record_statement(sql, (time.perf_counter() - start) * 1000, error=True)
+        if self.totals is not None:
+            self.totals.count_external(0, 0, error=True)
+
+    def _record(self, sql, params, start, rows, prepared, kind):
+        """Record stats for a successful execution and log it if it was slow"""
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        count = len(rows or ())
+        nbytes = sum(row_size(row) for row in rows or ())
+        self.stats.record_statement(sql, elapsed_ms, count, nbytes)
+        self.stats.record_prepared(sql, prepared)
+        if self.totals is not None:
+            self.totals.count_external(count, nbytes)
+        if elapsed_ms >= self.stats.slow_query_ms:
+            # The binary protocol cannot EXPLAIN; the same text with the bound values can
+            plan = explain_plan(self.connection, self.stats, sql, params)
+            self.stats.add_slow_query(kind, sql, params, elapsed_ms, plan)
+
+    def fetchall(self, sql, params=()):
+        return self.execute(sql, params)[1]
+
+    def fetchone(self, sql, params=()):
+        rows = self.execute(sql, params)[1]
+        return rows[0] if rows else None
+
+    def close(self):
+        """Deallocate every cached statement"""
+        for cursor in self.cursors.values():
+            try:
+                cursor.close()
+            except Error:
+                pass
+        self.cursors.clear()
@@ -0,0 +1,56 @@
+"""
+Stock Take Module
+Helpers for bringing counted quantities into a stock take.
+
+Counts arrive as CSV exports from handheld counters or as scans. Both are
+resolved to product ids through the SKU index, and repeated SKUs are summed,
+so the result can go to Database.record_stock_counts in one call.
+"""
+
+import csv
+
+
+SKU_COLUMNS = ("sku", "barcode", "code")
+COUNT_COLUMNS = ("count", "counted", "quantity", "qty")
+
+
+def read_counts_csv(path, sku_index):
+    """Read SKU/count pairs from a CSV file
+
+    The file may have a header naming its SKU and count columns; otherwise the
+    first two columns are used. Returns ({product id: count}, [problems]).
+    """
+    counts = {}
+    problems = []
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        rows = list(csv.reader(f))
+    if not rows:
+        return counts, problems
+
+    header = [cell.strip().lower() for cell in rows[0]]
+    sku_col = next((header.index(name) for name in SKU_COLUMNS if name in header), None)
+    count_col = next((header.index(name) for name in COUNT_COLUMNS if name in header), None)
+    if sku_col is None or count_col is None:
+        sku_col, count_col, first = 0, 1, 1
+    else:
+        first = 2
+
+    for line, row in enumerate(rows[first - 1:], start=first):
+        if not any(cell.strip() for cell in row):
+            continue
+        if len(row) <= max(sku_col, count_col):
+            problems.append(f"Line {line}: missing SKU or count")
+            continue
+        product = sku_index.lookup(row[sku_col])
+        if product is None:
+            problems.append(f"Line {line}: unknown SKU {row[sku_col].strip()}")
+            continue
+        try:
+            quantity = int(row[count_col])
+            if quantity < 0:
+                raise ValueError("Count must not be negative")
+        except ValueError:
+            problems.append(f"Line {line}: invalid count {row[count_col].strip()}")
+            continue
+        counts[product['id']] = counts.get(product['id'], 0) + quantity
+    return counts, problems
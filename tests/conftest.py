@@ -0,0 +1,54 @@
+"""
+Shared fixtures. The modules live at the top of the repository, so it goes on
+sys.path here. Database tests need mysql-connector and a scratch database
+named in INVENTORY_TEST_DATABASE (connection details come from the usual
+settings); without them they are skipped.
+"""
+
+import os
+import sys
+import uuid
+
+import pytest
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db_config():
+    pytest.importorskip("mysql.connector")
+    name = os.environ.get("INVENTORY_TEST_DATABASE")
+    if not name:
+        pytest.skip("INVENTORY_TEST_DATABASE is not set")
+    from settings import load_settings
+    config = load_settings().database.connection()
+    config['database'] = name
+    return config
+
+
+@pytest.fixture
+def db(db_config):
+    from database import Database
+    database = Database(allow_negative_stock=False, **db_config)
+    if not database.connect():
+        pytest.skip("Test database is not reachable")
+    yield database
+    database.disconnect()
+
+
+@pytest.fixture
+def make_product(db):
+    """Create products with unique SKUs and delete them afterwards"""
+    created = []
+
+    def make(quantity=0, price=10, unit_cost=None):
+        sku = f"TEST-{uuid.uuid4().hex[:12]}"
+        product_id = db.add_product(f"Test {sku}", sku, "", None, quantity, price, 0, unit_cost)
+        assert product_id
+        created.append(product_id)
+        return product_id
+
+    yield make
+    for product_id in created:
+        db.delete_product(product_id)
@@ -0,0 +1,37 @@
+from datetime import date, datetime, timedelta
+
+from change_feed import changed_ids, stat_deltas
+
+
+def event(entity_id, op, entity="product", **payload):
+    return {'entity': entity, 'entity_id': entity_id, 'op': op, 'payload': payload}
+
+
+def test_changed_ids_latest_op_wins():
+    events = [event(1, "insert"), event(2, "update"), event(1, "delete"), event(2, "delete"), event(2, "insert"),
+              event(3, "update", entity="category")]
+    assert changed_ids(events, "product") == ({2}, {1})
+
+
+def stock(delta, quantity, **extra):
+    return event(1, "stock", delta=delta, quantity=quantity, price=2, min_stock_level=5, transaction_id=9, **extra)
+
+
+def test_stat_deltas_count_movements_made_today():
+    deltas = stat_deltas([stock(-3, 4), stock(2, 6, created_at=datetime.now().isoformat(sep=" "))])
+    assert deltas['today_transactions'] == 2
+    assert deltas['stock_value'] == -2
+    assert deltas['low_stock_count'] == 0
+
+
+def test_stat_deltas_do_not_count_replayed_movements_from_earlier_days():
+    yesterday = (date.today() - timedelta(days=1)).isoformat() + " 17:30:00"
+    deltas = stat_deltas([stock(-3, 4, created_at=yesterday)])
+    assert deltas['today_transactions'] == 0
+    # The stock itself still changed now
+    assert deltas['stock_value'] == -6
+    assert deltas['low_stock_count'] == 1
+
+
+def test_stat_deltas_need_the_figures():
+    assert stat_deltas([event(1, "stock", delta=1)]) is None
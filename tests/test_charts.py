@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from charts import lttb, stock_levels
+
+
+def test_lttb_returns_short_series_unchanged():
+    points = [(i, i * i) for i in range(10)]
+    assert lttb(points, 10) == points
+    assert lttb(points, 50) == points
+    assert lttb(points, 2) == points
+
+
+def test_lttb_keeps_first_last_and_threshold_points_in_order():
+    points = [(i, (i * 37) % 11) for i in range(1000)]
+    sampled = lttb(points, 100)
+    assert len(sampled) == 100
+    assert sampled[0] == points[0] and sampled[-1] == points[-1]
+    assert [p[0] for p in sampled] == sorted(p[0] for p in sampled)
+    assert set(sampled) <= set(points)
+
+
+def test_lttb_keeps_a_spike_that_averaging_would_flatten():
+    points = [(i, 0) for i in range(1000)]
+    points[500] = (500, 1000)
+    assert (500, 1000) in lttb(points, 20)
+
+
+def test_stock_levels_work_back_from_the_current_quantity():
+    buckets = [
+        {'bucket': 1, 'in_quantity': 10, 'out_quantity': 0},
+        {'bucket': 2, 'in_quantity': 0, 'out_quantity': 4},
+        {'bucket': 3, 'in_quantity': 5, 'out_quantity': 1},
+    ]
+    assert stock_levels(buckets, 10) == [(1, 10), (2, 6), (3, 10)]
+
+
+def test_stock_levels_take_off_movements_after_the_end():
+    buckets = [{'bucket': 1, 'in_quantity': 3, 'out_quantity': 0}]
+    assert stock_levels(buckets, 10, net_after=4) == [(1, 6)]
+
+
+def test_stock_levels_add_opening_and_closing_points():
+    start, end = datetime(2026, 1, 1), datetime(2026, 1, 31)
+    buckets = [{'bucket': datetime(2026, 1, 10), 'in_quantity': 5, 'out_quantity': 2}]
+    assert stock_levels(buckets, 8, start=start, end=end) == [
+        (start, 5), (datetime(2026, 1, 10), 8), (end, 8)
+    ]
+
+
+def test_stock_levels_without_movements():
+    assert stock_levels([], 7) == []
+    assert stock_levels([], 7, start=0, end=1) == [(0, 7), (1, 7)]
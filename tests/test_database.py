@@ -0,0 +1,116 @@
+"""Database-backed tests; skipped unless INVENTORY_TEST_DATABASE names a scratch database"""
+
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+
+def quantity(db, product_id):
+    return db.get_product_by_id(product_id)['quantity']
+
+
+def costs(db, product_id):
+    return next(row for row in db.get_inventory_valuation() if row['id'] == product_id)
+
+
+def movement(product_id, transaction_type, quantity, key=None):
+    return {'key': key or str(uuid.uuid4()), 'product_id': product_id, 'transaction_type': transaction_type,
+            'quantity': quantity, 'notes': "Test", 'user': "Test", 'location_id': None,
+            'created_at': datetime.now().isoformat(sep=" ", timespec="seconds")}
+
+
+def test_oversell_is_refused_and_leaves_stock_alone(db, make_product):
+    from database import InsufficientStockError
+    product_id = make_product(quantity=5)
+    with pytest.raises(InsufficientStockError):
+        db.add_transaction(product_id, "OUT", 6)
+    assert quantity(db, product_id) == 5
+    assert db.add_transaction(product_id, "OUT", 5)
+    assert quantity(db, product_id) == 0
+
+
+def test_fifo_and_average_cost(db, make_product):
+    product_id = make_product()
+    db.add_transaction(product_id, "IN", 10, unit_cost=Decimal("1.00"))
+    db.add_transaction(product_id, "IN", 10, unit_cost=Decimal("2.00"))
+    db.add_transaction(product_id, "OUT", 15)
+    row = costs(db, product_id)
+    assert row['on_hand'] == 5
+    # The oldest layer goes first: 10 at 1.00 and 5 at 2.00
+    assert Decimal(row['fifo_cogs']) == Decimal("20.00")
+    assert Decimal(row['fifo_value']) == Decimal("10.00")
+    assert Decimal(row['average_cost']) == Decimal("1.5")
+    assert Decimal(row['average_cogs']) == Decimal("22.50")
+
+
+def test_apply_movements_skips_keys_already_applied(db, make_product):
+    product_id = make_product(quantity=10)
+    batch = [movement(product_id, "OUT", 3)]
+    assert db.apply_movements(batch) == ([batch[0]['key']], {})
+    # A retried batch that had committed is not applied again
+    assert db.apply_movements(batch) == ([batch[0]['key']], {})
+    assert quantity(db, product_id) == 7
+
+
+def test_apply_movements_rejects_only_what_oversells(db, make_product):
+    product_id = make_product(quantity=5)
+    batch = [movement(product_id, "OUT", 3), movement(product_id, "OUT", 3), movement(product_id, "IN", 1)]
+    applied, rejected = db.apply_movements(batch)
+    assert applied == [batch[0]['key'], batch[2]['key']]
+    assert list(rejected) == [batch[1]['key']]
+    assert quantity(db, product_id) == 3
+
+
+def test_journal_replay(db, db_config, make_product, tmp_path):
+    from database import Database
+    from journal import JournalSyncer, OfflineJournal
+    product_id = make_product(quantity=5)
+    journal = OfflineJournal(str(tmp_path / "journal.db"))
+    first = journal.record(product_id, "OUT", 3)
+    second = journal.record(product_id, "OUT", 3)
+    syncer = JournalSyncer(journal, lambda: Database(allow_negative_stock=False, **db_config))
+    try:
+        assert syncer.sync_batch(journal.pending())
+        assert journal.statuses([first, second]) == {first: "synced", second: "rejected"}
+        assert journal.counts() == {'pending': 0, 'synced': 1, 'rejected': 1}
+    finally:
+        syncer.stop()
+        journal.close()
+    assert quantity(db, product_id) == 2
+
+
+def test_write_behind_replays_a_refused_merged_stock_out(db, db_config, make_product):
+    from database import Database
+    from write_behind import WriteBehindQueue
+    product_id = make_product(quantity=5)
+    scans = WriteBehindQueue(lambda: Database(allow_negative_stock=False, **db_config), window=1.0)
+    for _ in range(4):
+        scans.put(product_id, "OUT", 2, "Scan")
+    scans.start()
+    try:
+        assert scans.flush(timeout=30)
+    finally:
+        scans.close(timeout=5)
+    # The merged OUT of 8 oversells; replayed scan by scan, two fit
+    assert len(scans.take_rejected()) == 2
+    assert quantity(db, product_id) == 1
+
+
+def test_repair_keeps_costs_and_locations_in_step(db, make_product):
+    product_id = make_product()
+    location_id = db.add_location(f"Test {uuid.uuid4().hex[:12]}")
+    try:
+        db.add_transaction(product_id, "IN", 2, unit_cost=Decimal("1.00"))
+        db.add_transaction(product_id, "IN", 4, location_id=location_id, unit_cost=Decimal("1.00"))
+        # Three units more than the ledger says; two are not at any location, so one comes off the location
+        assert db.repair_stock({product_id: -3}) == 1
+        assert quantity(db, product_id) == 3
+        assert costs(db, product_id)['on_hand'] == 3
+        assert [row['quantity'] for row in db.get_stock_by_location(product_id)] == [3]
+        location = next(row for row in db.get_all_locations() if row['id'] == location_id)
+        assert location['total_units'] == 3
+    finally:
+        db.delete_product(product_id)
+        db.delete_location(location_id)
@@ -0,0 +1,87 @@
+import json
+import os
+
+import pytest
+
+from settings import ENV_PREFIX, Settings, SettingsError, SettingsWatcher, load_settings
+
+
+def write(path, data):
+    path.write_text(json.dumps(data))
+    return str(path)
+
+
+def test_defaults_without_file_or_environment(tmp_path):
+    settings = load_settings(str(tmp_path / "missing.json"), environ={})
+    assert settings.to_dict() == Settings().to_dict()
+
+
+def test_file_values_are_converted_and_applied(tmp_path):
+    path = write(tmp_path / "settings.json", {"tuning": {"change_poll_ms": "5000"}, "app": {"theme": "alt"}})
+    settings = load_settings(path, environ={})
+    assert settings.tuning.change_poll_ms == 5000
+    assert settings.app.theme == "alt"
+
+
+def test_environment_overrides_the_file(tmp_path):
+    path = write(tmp_path / "settings.json", {"tuning": {"change_poll_ms": 5000}})
+    environ = {
+        ENV_PREFIX + "TUNING_CHANGE_POLL_MS": "3000",
+        ENV_PREFIX + "APP_ALLOW_NEGATIVE_STOCK": "yes",
+        ENV_PREFIX + "DATABASE_HOST": "db.example",
+        "UNRELATED": "1",
+    }
+    settings = load_settings(path, environ)
+    assert settings.tuning.change_poll_ms == 3000
+    assert settings.app.allow_negative_stock is True
+    assert settings.database.host == "db.example"
+
+
+def test_settings_file_can_come_from_the_environment(tmp_path):
+    path = write(tmp_path / "other.json", {"tuning": {"page_size": 25}})
+    settings = load_settings(environ={ENV_PREFIX + "SETTINGS": path})
+    assert settings.tuning.page_size == 25
+
+
+@pytest.mark.parametrize("data, message", [
+    ({"tuning": {"change_poll_ms": 10}}, "outside"),
+    ({"tuning": {"change_poll_ms": "fast"}}, "tuning.change_poll_ms"),
+    ({"tuning": {"page_size": 2.5}}, "whole number"),
+    ({"app": {"allow_negative_stock": "maybe"}}, "true or false"),
+    ({"tuning": {"no_such_setting": 1}}, "Unknown setting"),
+    ({"nowhere": {}}, "Unknown section"),
+])
+def test_invalid_values_are_reported(tmp_path, data, message):
+    path = write(tmp_path / "settings.json", data)
+    with pytest.raises(SettingsError, match=message):
+        load_settings(path, environ={})
+
+
+def test_every_problem_is_reported_at_once(tmp_path):
+    path = write(tmp_path / "settings.json", {"tuning": {"change_poll_ms": 1, "page_size": 0}})
+    with pytest.raises(SettingsError) as error:
+        load_settings(path, environ={})
+    assert "change_poll_ms" in str(error.value) and "page_size" in str(error.value)
+
+
+def test_unreadable_file_is_an_error(tmp_path):
+    path = tmp_path / "settings.json"
+    path.write_text("{not json")
+    with pytest.raises(SettingsError, match="Cannot read"):
+        load_settings(str(path), environ={})
+
+
+def test_watcher_applies_only_reloadable_values(tmp_path):
+    path = write(tmp_path / "settings.json", {})
+    settings = load_settings(path, environ={})
+    watcher = SettingsWatcher(settings, path, environ={})
+    seen = []
+    watcher.subscribe(lambda s, changed: seen.append(changed))
+
+    write(tmp_path / "settings.json", {"tuning": {"change_poll_ms": 4000, "page_size": 10}})
+    os.utime(path, (0, watcher.mtime + 10))
+    assert watcher.check() == {"tuning.change_poll_ms"}
+    assert settings.tuning.change_poll_ms == 4000
+    assert settings.tuning.page_size == Settings().tuning.page_size
+    assert seen == [{"tuning.change_poll_ms"}]
+    assert watcher.check() == set()
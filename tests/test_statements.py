@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip("mysql.connector")
+
+from statements import Query, padded_placeholders
+
+
+def test_padded_placeholders_rounds_up_to_a_power_of_two():
+    placeholders, params = padded_placeholders([1, 2, 3])
+    assert placeholders == "%s, %s, %s, %s"
+    assert params == [1, 2, 3, 3]
+
+
+def test_padded_placeholders_keeps_exact_powers_of_two():
+    assert padded_placeholders([7]) == ("%s", [7])
+    assert padded_placeholders([1, 2]) == ("%s, %s", [1, 2])
+
+
+def test_padded_placeholders_of_nothing_matches_no_row():
+    assert padded_placeholders([]) == ("%s", [None])
+
+
+def test_query_builds_clauses_in_canonical_order():
+    query = Query("SELECT *\n    FROM products p").order_by("p.name").where("p.category_id = %s", 3)
+    query.limit(50).group_by("p.id").where("p.quantity > %s", 0)
+    sql, params = query.build()
+    assert sql == ("SELECT * FROM products p WHERE p.category_id = %s AND p.quantity > %s "
+                   "GROUP BY p.id ORDER BY p.name LIMIT %s OFFSET %s")
+    assert params == [3, 0, 50, 0]
+
+
+def test_query_paged_and_unpaged_limits_share_a_statement():
+    first = Query("SELECT * FROM products").limit(20).build()
+    later = Query("SELECT * FROM products").limit(20, 40).build()
+    assert first[0] == later[0]
+    assert later[1] == [20, 40]
+
+
+def test_query_where_in_pads_the_list():
+    sql, params = Query("SELECT * FROM products p").where_in("p.id", [5, 6, 7]).build()
+    assert sql == "SELECT * FROM products p WHERE p.id IN (%s, %s, %s, %s)"
+    assert params == [5, 6, 7, 7]
+
+
+def test_query_without_filters_is_just_the_base():
+    assert Query("SELECT 1").build() == ("SELECT 1", [])
@@ -0,0 +1,45 @@
+from datetime import datetime
+
+from write_behind import coalesce
+
+
+def scan(product_id, transaction_type="IN", quantity=1, location_id=None, user="Admin"):
+    return {'product_id': product_id, 'transaction_type': transaction_type, 'quantity': quantity,
+            'notes': "Scan", 'user': user, 'location_id': location_id, 'created_at': datetime.now()}
+
+
+def test_coalesce_merges_scans_of_the_same_movement():
+    batch = [scan(1), scan(1, quantity=2), scan(1)]
+    movements, scans = coalesce(batch)
+    assert len(movements) == 1
+    movement = movements[0]
+    assert movement['quantity'] == 4
+    assert movement['notes'] == "Scan (3 scans)"
+    assert scans[movement['key']] == batch
+
+
+def test_coalesce_keeps_products_locations_directions_and_users_apart():
+    batch = [scan(1), scan(2), scan(1, location_id=5), scan(1, "OUT"), scan(1, user="Till 2"), scan(1)]
+    movements, scans = coalesce(batch)
+    assert len(movements) == 5
+    assert [m['quantity'] for m in movements] == [2, 1, 1, 1, 1]
+    assert sum(len(items) for items in scans.values()) == len(batch)
+
+
+def test_coalesce_gives_every_movement_its_own_key():
+    movements, scans = coalesce([scan(1), scan(2), scan(3)])
+    keys = {m['key'] for m in movements}
+    assert len(keys) == 3
+    assert set(scans) == keys
+
+
+def test_coalesce_leaves_single_scans_as_they_are():
+    item = scan(1, quantity=3)
+    movements, _ = coalesce([item])
+    assert movements[0]['notes'] == "Scan"
+    assert movements[0]['quantity'] == 3
+    assert item['quantity'] == 3 and 'key' not in item
+
+
+def test_coalesce_of_nothing():
+    assert coalesce([]) == ([], {})
@@ -0,0 +1,216 @@
+"""
+UI Profiler Module
+Event-loop lag and hot-path timings for the Tkinter GUI.
+
+A heartbeat scheduled with after() measures how late the main loop runs it.
+Lateness is time the loop spent busy in some callback, so stalls are logged
+with the GUI calls that ran in between.
+
+Every show_*, load_*, refresh_* and apply_* call of the GUI is timed and split
+into database time (from the Database instrumentation) and the rest, which is
+Python turning rows into display values ("transform"). TreeRenderer inserts
+Treeview rows later, in idle time; that widget time is recorded against the
+call that started the render when the render ends.
+
+cProfile and tracemalloc captures can be switched on while the app runs.
+Stopping one writes its results to files for offline analysis: .prof files for
+pstats or snakeviz, .tracemalloc files for tracemalloc.Snapshot.load, and a
+text summary of each.
+"""
+
+import cProfile
+import functools
+import json
+import logging
+import os
+import pstats
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime
+
+from instrumentation import TimingStats
+
+
+logger = logging.getLogger("inventory.ui")
+
+PHASES = ("wall", "db", "transform", "widgets")
+
+# Methods of the GUI that are timed
+PROFILED_PREFIXES = ("show_", "load_", "refresh_", "apply_")
+
+# Frames kept per tracemalloc allocation, and lines in the text summaries
+TRACE_FRAMES = 25
+SUMMARY_LINES = 50
+
+
+class UiProfiler:
+    """Main-loop lag, per-call phase timings and on-demand captures; used from the Tk thread only"""
+
+    def __init__(self, root, db_stats, heartbeat_ms=100, stall_ms=200, profile_dir="profiles", max_stalls=100):
+        self.root = root
+        self.db_stats = db_stats
+        self.heartbeat_ms = heartbeat_ms
+        self.stall_ms = stall_ms
+        self.profile_dir = profile_dir
+        self.started_at = datetime.now()
+        self.lag = TimingStats()
+        self.calls = {}
+        self.stalls = deque(maxlen=max_stalls)
+        # Names of the profiled calls in progress, outermost first
+        self.stack = []
+        # Calls finished since the last heartbeat, blamed for a stall
+        self.recent = []
+        self.heartbeat_job = None
+        self.due = None
+        self.profile = None
+        self.tracing = False
+
+    # ==================== EVENT LOOP LAG ====================
+
+    def start(self):
+        """Start the heartbeat"""
+        if self.heartbeat_job is None:
+            self.due = time.perf_counter() + self.heartbeat_ms / 1000
+            self.heartbeat_job = self.root.after(self.heartbeat_ms, self._heartbeat)
+
+    def stop(self):
+        if self.heartbeat_job is not None:
+            self.root.after_cancel(self.heartbeat_job)
+            self.heartbeat_job = None
+
+    def _heartbeat(self):
+        now = time.perf_counter()
+        lag_ms = max(0.0, (now - self.due) * 1000)
+        self.lag.add(lag_ms)
+        if lag_ms >= self.stall_ms:
+            calls = list(dict.fromkeys(self.recent))
+            self.stalls.append({
+                'time': datetime.now().isoformat(timespec="seconds"),
+                'lag_ms': round(lag_ms, 1),
+                'calls': calls,
+            })
+            logger.warning("UI stalled for %.0f ms after %s", lag_ms, ", ".join(calls) or "no profiled call")
+        self.recent = []
+        self.due = now + self.heartbeat_ms / 1000
+        self.heartbeat_job = self.root.after(self.heartbeat_ms, self._heartbeat)
+
+    # ==================== CALL TIMINGS ====================
+
+    def instrument(self, obj, prefixes=PROFILED_PREFIXES):
+        """Time obj's matching methods; call it before those bound methods are handed to widgets"""
+        for name in dir(type(obj)):
+            if name.startswith(prefixes) and callable(getattr(type(obj), name)):
+                setattr(obj, name, self.timed(name, getattr(obj, name)))
+
+    def timed(self, name, func):
+        """Wrap func so each call records its wall, database and transform time"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            self.stack.append(name)
+            db_start = self.db_stats.busy_ms
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                wall = (time.perf_counter() - start) * 1000
+                self.stack.pop()
+                db = self.db_stats.busy_ms - db_start
+                self._record(name, wall=wall, db=db, transform=max(0.0, wall - db))
+                self.recent.append(name)
+        return wrapper
+
+    def current_call(self):
+        """Name of the innermost profiled call in progress, or None"""
+        return self.stack[-1] if self.stack else None
+
+    def add_widget_time(self, name, elapsed_ms):
+        """Record the Treeview inserts of an ended render against the call that started it"""
+        if name is not None:
+            self._record(name, widgets=elapsed_ms)
+
+    def _record(self, name, **phases):
+        stats = self.calls.setdefault(name, {})
+        for phase, elapsed_ms in phases.items():
+            stats.setdefault(phase, TimingStats()).add(elapsed_ms)
+
+    # ==================== CAPTURES ====================
+
+    def _capture_path(self, kind):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        return os.path.join(self.profile_dir, f"ui-{kind}-{datetime.now():%Y%m%d-%H%M%S}")
+
+    @property
+    def profiling(self):
+        return self.profile is not None
+
+    def start_cpu_profile(self):
+        """Start a cProfile capture of the Tk thread"""
+        if self.profile is None:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def stop_cpu_profile(self):
+        """Stop the cProfile capture and write it with a text summary; returns the .prof path"""
+        profile, self.profile = self.profile, None
+        if profile is None:
+            return None
+        profile.disable()
+        base = self._capture_path("cpu")
+        profile.dump_stats(base + ".prof")
+        with open(base + ".txt", "w") as f:
+            pstats.Stats(profile, stream=f).sort_stats("cumulative").print_stats(SUMMARY_LINES)
+        logger.info("CPU profile written to %s.prof", base)
+        return base + ".prof"
+
+    def start_memory_trace(self):
+        """Start tracing allocations with tracemalloc"""
+        if not self.tracing:
+            tracemalloc.start(TRACE_FRAMES)
+            self.tracing = True
+
+    def stop_memory_trace(self):
+        """Stop tracing and write the snapshot with a text summary; returns the .tracemalloc path"""
+        if not self.tracing:
+            return None
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.tracing = False
+        base = self._capture_path("memory")
+        snapshot.dump(base + ".tracemalloc")
+        with open(base + ".txt", "w") as f:
+            f.write(f"Traced memory: {current / 1024:.1f} KiB current, {peak / 1024:.1f} KiB peak\n\n")
+            for stat in snapshot.statistics("lineno")[:SUMMARY_LINES]:
+                f.write(f"{stat}\n")
+        logger.info("Memory trace written to %s.tracemalloc", base)
+        return base + ".tracemalloc"
+
+    # ==================== REPORTING ====================
+
+    def reset(self):
+        self.started_at = datetime.now()
+        self.lag = TimingStats()
+        self.calls.clear()
+        self.stalls.clear()
+
+    def snapshot(self):
+        """Machine-readable copy of all UI stats"""
+        return {
+            'started_at': self.started_at.isoformat(timespec="seconds"),
+            'generated_at': datetime.now().isoformat(timespec="seconds"),
+            'heartbeat_ms': self.heartbeat_ms,
+            'stall_ms': self.stall_ms,
+            'lag': self.lag.to_dict(),
+            'calls': {
+                name: {phase: stats[phase].to_dict() for phase in PHASES if phase in stats}
+                for name, stats in self.calls.items()
+            },
+            'stalls': list(self.stalls),
+        }
+
+    def dump(self, path):
+        """Write the stats snapshot to a JSON file"""
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2, default=str)
+        return path
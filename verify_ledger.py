@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Ledger Verifier
+Recomputes every product's on-hand quantity from the transactions ledger and
+reports products whose stored quantity has drifted from it, optionally
+repairing them.
+
+Expected quantity is the product's baseline plus the net of its ledger rows.
+A full run starts from each product's opening quantity and the whole ledger
+(archived months through their roll-ups). An incremental run starts from the
+quantities verified by the last run and scans only ledger rows added since its
+high-water mark. The ledger is scanned in id ranges by parallel workers, each
+with its own connection, and each range is aggregated on the server.
+
+Example:
+    python verify_ledger.py --incremental
+    python verify_ledger.py --repair products --report drift.csv
+"""
+
+import argparse
+import csv
+import logging
+import queue
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from database import Database
+from settings import SettingsError, load_settings
+
+
+logger = logging.getLogger("inventory.verify")
+
+# Products compared per page
+PAGE_SIZE = 10000
+
+
+class LedgerScanError(Exception):
+    """Raised when a worker cannot connect or a ledger range cannot be read"""
+
+
+class LedgerVerifier:
+    """Compares products.quantity with the ledger and records verified baselines"""
+
+    def __init__(self, db, db_factory, workers=4, range_size=1000000):
+        self.db = db
+        self.db_factory = db_factory
+        self.workers = workers
+        self.range_size = range_size
+
+    def scan(self, low, high):
+        """Net ledger quantity per product for low < id <= high, scanned in parallel"""
+        ranges = queue.Queue()
+        for start in range(low, high, self.range_size):
+            ranges.put((start, min(start + self.range_size, high)))
+        total = ranges.qsize()
+        if not total:
+            return {}
+        done = []
+
+        def worker():
+            db = self.db_factory()
+            if not db.connect():
+                raise LedgerScanError("A ledger worker could not connect to the database")
+            deltas = {}
+            try:
+                while True:
+                    try:
+                        start, end = ranges.get_nowait()
+                    except queue.Empty:
+                        return deltas
+                    chunk = db.get_ledger_deltas(start, end)
+                    if chunk is None:
+                        raise LedgerScanError(f"Could not read ledger ids {start + 1}-{end}")
+                    for product_id, delta in chunk.items():
+                        deltas[product_id] = deltas.get(product_id, 0) + delta
+                    done.append(end)
+                    logger.info("Scanned ledger range %d/%d", len(done), total)
+            finally:
+                db.disconnect()
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, total), thread_name_prefix="verify") as pool:
+            futures = [pool.submit(worker) for _ in range(min(self.workers, total))]
+            results = [future.result() for future in futures]
+
+        deltas = results[0]
+        for partial in results[1:]:
+            for product_id, delta in partial.items():
+                deltas[product_id] = deltas.get(product_id, 0) + delta
+        return deltas
+
+    def run(self, incremental=False, repair=None):
+        """Verify every product and return a report
+
+        repair is None to only report, "products" to move product quantities to
+        what the ledger says, or "baseline" to accept the current quantities as
+        correct (for stock set before the ledger was complete). Returns None if
+        the run could not complete.
+        """
+        started = time.monotonic()
+        last = self.db.get_last_stock_verification() if incremental else None
+        if incremental and last is None:
+            logger.info("No earlier verification run; verifying the whole ledger")
+        full = last is None
+
+        run = self.db.start_stock_verification("full" if full else "incremental")
+        if run is None:
+            return None
+        if not self.db.wait_for_transactions_before(run['started_at']):
+            logger.warning("Older transactions may still be open; recently written ledger rows can show as drift")
+
+        high = run['ledger_high']
+        try:
+            deltas = self.scan(0 if full else last['ledger_high'], high)
+        except LedgerScanError as e:
+            logger.error(str(e))
+            return None
+        if full:
+            archived = self.db.get_archived_ledger_deltas()
+            if archived is None:
+                return None
+            for product_id, delta in archived.items():
+                deltas[product_id] = deltas.get(product_id, 0) + delta
+
+        expected = {}
+        skus = {}
+        candidates = []
+        checked = 0
+        after_id = 0
+        while True:
+            rows = self.db.get_stock_positions(after_id, PAGE_SIZE)
+            if rows is None:
+                return None
+            for row in rows:
+                product_id = row['id']
+                base = row['opening_quantity'] if full else row['baseline_quantity']
+                quantity = base + deltas.get(product_id, 0)
+                # Incremental runs only rewrite baselines that moved
+                if full or product_id in deltas or not row['has_baseline']:
+                    expected[product_id] = quantity
+                if row['quantity'] != quantity:
+                    expected[product_id] = quantity
+                    skus[product_id] = row['sku']
+                    candidates.append(product_id)
+            checked += len(rows)
+            if len(rows) < PAGE_SIZE:
+                break
+            after_id = rows[-1]['id']
+
+        # Re-read the candidates as of the high-water mark: movements since then are not drift
+        actual = self.db.get_stock_at(candidates, high)
+        if actual is None:
+            return None
+        mismatches = [
+            {'product_id': product_id, 'sku': skus[product_id], 'expected': expected[product_id],
+             'actual': actual[product_id], 'difference': actual[product_id] - expected[product_id]}
+            for product_id in candidates
+            if product_id in actual and actual[product_id] != expected[product_id]
+        ]
+
+        repaired = 0
+        adjustments = {}
+        if mismatches and repair == "products":
+            repaired = self.db.repair_stock({m['product_id']: -m['difference'] for m in mismatches})
+            if repaired is None:
+                return None
+        elif mismatches and repair == "baseline":
+            adjustments = {m['product_id']: m['difference'] for m in mismatches}
+            repaired = len(mismatches)
+
+        baselines = [
+            (product_id, quantity + adjustments.get(product_id, 0), adjustments.get(product_id, 0))
+            for product_id, quantity in expected.items()
+        ]
+        if not self.db.save_stock_baselines(baselines):
+            return None
+        self.db.finish_stock_verification(run['id'], checked, len(mismatches), repaired)
+
+        return {
+            'run_id': run['id'],
+            'mode': "full" if full else "incremental",
+            'ledger_high': high,
+            'checked': checked,
+            'mismatches': mismatches,
+            'repaired': repaired,
+            'elapsed': time.monotonic() - started,
+        }
+
+
+def write_report(path, mismatches):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["product_id", "sku", "expected", "actual", "difference"])
+        writer.writeheader()
+        writer.writerows(mismatches)
+
+
+def main(argv=None):
+    try:
+        settings = load_settings()
+    except SettingsError as e:
+        print(e)
+        return 2
+    database = settings.database
+
+    parser = argparse.ArgumentParser(description="Check product quantities against the inventory ledger")
+    parser.add_argument("--incremental", action="store_true", help="only scan ledger rows since the last run")
+    parser.add_argument("--repair", choices=["products", "baseline"],
+                        help="fix product quantities from the ledger, or accept them as the new baseline")
+    parser.add_argument("--workers", type=int, default=settings.tuning.verify_workers, help="parallel ledger scanners")
+    parser.add_argument("--range-size", type=int, default=settings.tuning.verify_range_size,
+                        help="ledger ids per scanned range")
+    parser.add_argument("--report", help="write mismatches to this CSV file")
+    parser.add_argument("--host", default=database.host)
+    parser.add_argument("--user", default=database.user)
+    parser.add_argument("--password", default=database.password)
+    parser.add_argument("--database", default=database.database)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    database.host, database.user, database.password, database.database = args.host, args.user, args.password, args.database
+    db = Database.from_settings(settings)
+    if not db.connect():
+        print("Could not connect to the database")
+        return 2
+
+    verifier = LedgerVerifier(db, lambda: Database.from_settings(settings), args.workers, args.range_size)
+    report = verifier.run(args.incremental, args.repair)
+    db.disconnect()
+    if report is None:
+        print("Verification failed; see the log for details")
+        return 1
+
+    mismatches = report['mismatches']
+    print(f"{report['mode'].capitalize()} verification up to ledger id {report['ledger_high']}: "
+          f"{report['checked']} products checked, {len(mismatches)} mismatched, "
+          f"{report['repaired']} repaired in {report['elapsed']:.1f}s")
+    for m in mismatches[:20]:
+        print(f"  {m['sku']}: stored {m['actual']}, ledger {m['expected']} ({m['difference']:+d})")
+    if len(mismatches) > 20:
+        print(f"  ... and {len(mismatches) - 20} more")
+    if args.report:
+        write_report(args.report, mismatches)
+    return 1 if mismatches and not args.repair else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
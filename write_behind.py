@@ -0,0 +1,232 @@
+"""
+Write-Behind Module
+Batches high-rate stock movements (barcode scans) into few database transactions.
+
+Each accepted movement waits in memory for up to `window` seconds or until
+`max_rows` movements are waiting, then the batch is coalesced (one ledger row
+per product, location, direction and user) and written in a single transaction
+through Database.apply_movements on the queue's own connection.
+
+Durability: a movement is safe once it is committed, which `committed` counts
+and flush() waits for. Until then it exists only in this process, so a crash
+can lose at most one window of movements. A failed write is retried with the
+same idempotency keys, so it is never applied twice; while the database is
+reachable but keeps failing, only up to `max_attempts` times. A merged OUT
+movement the database refuses is replayed scan by scan, so only the scans
+that oversell are rejected. When `max_pending` movements are waiting, put()
+blocks and then raises queue.Full, slowing the scanner down instead of growing
+without bound.
+"""
+
+import logging
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+
+logger = logging.getLogger("inventory.write_behind")
+
+
+class WriteBehindQueue:
+    """Accepts movements immediately and commits them in coalesced batches"""
+
+    def __init__(self, db_factory, window=0.25, max_rows=200, max_pending=2000, put_timeout=2.0,
+                 base_delay=0.5, max_delay=30.0, max_attempts=10):
+        self.db_factory = db_factory
+        self.max_attempts = max_attempts
+        self.window = window
+        self.max_rows = max_rows
+        self.put_timeout = put_timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.items = queue.Queue(maxsize=max_pending)
+        self.condition = threading.Condition()
+        self.accepted = 0
+        self.committed = 0
+        self.batches = 0
+        self.rejected = deque(maxlen=1000)
+        self.last_error = None
+        self.db = None
+        self.thread = None
+        self.stopping = threading.Event()
+
+    @property
+    def pending(self):
+        """Movements accepted but not yet committed"""
+        with self.condition:
+            return self.accepted - self.committed
+
+    def take_rejected(self):
+        """Remove and return the movements the database refused since the last call"""
+        with self.condition:
+            rejected = list(self.rejected)
+            self.rejected.clear()
+        return rejected
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="write-behind", daemon=True)
+        self.thread.start()
+
+    def put(self, product_id, transaction_type, quantity=1, notes="", user="Admin", location_id=None):
+        """Queue one movement; blocks while the queue is full and raises queue.Full after put_timeout"""
+        self.items.put({
+            'product_id': product_id, 'transaction_type': transaction_type, 'quantity': quantity,
+            'notes': notes, 'user': user, 'location_id': location_id, 'created_at': datetime.now(),
+        }, timeout=self.put_timeout)
+        with self.condition:
+            self.accepted += 1
+            return self.accepted
+
+    def flush(self, timeout=None):
+        """Wait until everything accepted so far is committed; returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            target = self.accepted
+            while self.committed < target:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def close(self, timeout=10.0):
+        """Flush what is queued, then stop; returns False if movements were left unsaved"""
+        flushed = self.flush(timeout)
+        if not flushed:
+            logger.error("Closing write-behind queue with %d unsaved movements", self.pending)
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout)
+        if self.db:
+            self.db.disconnect()
+            self.db = None
+        return flushed
+
+    def run(self):
+        while not self.stopping.is_set():
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+
+    def _collect(self):
+        """Wait for a first movement, then gather more until the window closes or the batch is full"""
+        try:
+            batch = [self.items.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.items.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        """Commit one batch, replaying refused merged movements scan by scan"""
+        movements, scans = coalesce(batch)
+        result = self._apply(movements)
+        if result is None:
+            return
+        applied, rejected = result
+        
+        # A merged OUT can oversell when only its last scans do not fit; keep the scans that do
+        refused = [m for m in movements
+                   if m['key'] in rejected and m['transaction_type'] == "OUT" and len(scans[m['key']]) > 1]
+        if refused:
+            replays = [dict(item, key=str(uuid.uuid4())) for m in refused for item in scans[m['key']]]
+            result = self._apply(replays)
+            if result is None:
+                return
+            for m in refused:
+                del rejected[m['key']]
+            rejected.update(result[1])
+            movements = movements + replays
+        
+        if rejected:
+            logger.warning("Rejected %d queued movements: %s", len(rejected), rejected)
+        with self.condition:
+            for movement in movements:
+                if movement['key'] in rejected:
+                    self.rejected.append(dict(movement, error=rejected[movement['key']]))
+            self.committed += len(batch)
+            self.batches += 1
+            self.last_error = None
+            self.condition.notify_all()
+
+    def _apply(self, movements):
+        """Apply keyed movements, retrying with backoff; returns None only when stopping
+        
+        Unreachable databases are waited out. A database that answers but fails
+        max_attempts times has the movements rejected, so the queue keeps draining.
+        """
+        delay = 0.0
+        attempts = 0
+        while True:
+            db = self._connection()
+            result = db.apply_movements(movements) if db else None
+            if result is not None:
+                return result
+            reachable = db is not None and db.connection.is_connected()
+            self.last_error = "Database error" if reachable else "Database unreachable"
+            self._drop_connection()
+            if reachable:
+                attempts += 1
+                if attempts >= self.max_attempts:
+                    logger.error("Rejecting %d queued movements after %d failed writes", len(movements), attempts)
+                    reason = f"Gave up after {attempts} failed writes"
+                    return [], {m['key']: reason for m in movements}
+            # Retried with the same keys, so a batch that did commit is skipped
+            delay = min(self.max_delay, delay * 2 or self.base_delay)
+            if self.stopping.wait(delay * random.uniform(0.5, 1.5)):
+                return None
+    
+    def _connection(self):
+        if self.db is not None and self.db.connection is not None and self.db.connection.is_connected():
+            return self.db
+        self._drop_connection()
+        db = self.db_factory()
+        if not db.connect():
+            return None
+        self.db = db
+        return db
+
+    def _drop_connection(self):
+        if self.db is not None:
+            try:
+                self.db.disconnect()
+            except Exception:
+                pass
+            self.db = None
+
+
+def coalesce(batch):
+    """Merge movements per product, location, direction and user into keyed movements
+
+    Returns (movements, {key: the scans merged into it, in order}).
+    """
+    groups = {}
+    scans = {}
+    for item in batch:
+        group = (item['product_id'], item['location_id'], item['transaction_type'], item['user'])
+        movement = groups.get(group)
+        if movement is None:
+            movement = groups[group] = dict(item, key=str(uuid.uuid4()))
+            scans[movement['key']] = []
+        else:
+            movement['quantity'] += item['quantity']
+        scans[movement['key']].append(item)
+
+    movements = list(groups.values())
+    for movement in movements:
+        count = len(scans[movement['key']])
+        if count > 1:
+            movement['notes'] = f"{movement['notes']} ({count} scans)".strip()
+    return movements, scans